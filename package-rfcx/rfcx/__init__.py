@@ -9,3 +9,22 @@
 
 from .client import Client
 name = "rfcx"
+
+# Imported on first use, their optional dependencies (aiohttp, watchdog) are slow to load
+_LAZY = {
+    'AsyncClient': '.async_client',
+    'IngestDaemon': '.ingest_daemon',
+}
+
+
+def __getattr__(attr):
+    if attr in _LAZY:
+        import importlib
+        value = getattr(importlib.import_module(_LAZY[attr], __name__), attr)
+        globals()[attr] = value
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {attr!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
@@ -1,19 +1,23 @@
-import httplib2
 import json
 import logging
 import os
 from six.moves import http_client
 from six.moves import urllib
+import rfcx._http as http
 
 logger = logging.getLogger(__name__)
 
 base_url = os.getenv('RFCX_API_URL', 'https://api.rfcx.org')
 
-def stream_segments(token, stream_id, start, end, limit, offset):
+def stream_segments(token, stream_id, start, end, limit, offset, session=None):
+    url = _stream_segments_url(stream_id, start, end, limit, offset)
+    return _request(url, token=token, session=session)
+
+
+def _stream_segments_url(stream_id, start, end, limit, offset):
     data = {'start': start, 'end': end, 'limit': limit, 'offset': offset}
     path = f'/streams/{stream_id}/segments'
-    url = f'{base_url}{path}?{urllib.parse.urlencode(data, True)}'
-    return _request(url, token=token)
+    return f'{base_url}{path}?{urllib.parse.urlencode(data, True)}'
 
 
 def annotations(token,
@@ -22,7 +26,8 @@ def annotations(token,
                 classifications=None,
                 stream_id=None,
                 limit=50,
-                offset=0):
+                offset=0,
+                session=None):
     data = {'start': start, 'end': end, 'limit': limit, 'offset': offset}
     if classifications:
         data['classifications[]'] = classifications
@@ -31,7 +36,7 @@ def annotations(token,
 
     path = '/annotations'
     url = f'{base_url}{path}?{urllib.parse.urlencode(data, True)}'
-    return _request(url, token=token)
+    return _request(url, token=token, session=session)
 
 
 def detections(token,
@@ -42,7 +47,21 @@ def detections(token,
                stream_ids=None,
                min_confidence=None,
                limit=50,
-               offset=0):
+               offset=0,
+               session=None):
+    url = _detections_url(start, end, classifications, classifiers, stream_ids,
+                          min_confidence, limit, offset)
+    return _request(url, token=token, session=session)
+
+
+def _detections_url(start,
+                    end,
+                    classifications=None,
+                    classifiers=None,
+                    stream_ids=None,
+                    min_confidence=None,
+                    limit=50,
+                    offset=0):
     data = {'start': start, 'end': end, 'limit': limit, 'offset': offset}
     if classifications:
         data['classifications[]'] = classifications
@@ -54,25 +73,28 @@ def detections(token,
         data['min_confidence'] = min_confidence
 
     path = '/detections'
-    url = f'{base_url}{path}?{urllib.parse.urlencode(data, True)}'
-    return _request(url, token=token)
+    return f'{base_url}{path}?{urllib.parse.urlencode(data, True)}'
 
 
-def classifications(token, keyword, levels, limit=1000, offset=0):
+def classifications(token, keyword, levels, limit=1000, offset=0, session=None):
     data = {'keyword': keyword, 'limit': limit, 'offset': offset}
     if levels:
         data['levels[]'] = levels
     url = f'{base_url}/classifications?{urllib.parse.urlencode(data, True)}'
-    return _request(url, token=token)
+    return _request(url, token=token, session=session)
 
 
-def stream(token, stream_id=None, fields=None):
+def stream(token, stream_id=None, fields=None, session=None):
+    url = _stream_url(stream_id, fields)
+    return _request(url, token=token, session=session)
+
+
+def _stream_url(stream_id, fields=None):
     data = {}
     if fields is not None:
         data['fields[]'] = fields
     path = f'/streams/{stream_id}'
-    url = f'{base_url}{path}?{urllib.parse.urlencode(data, True)}'
-    return _request(url, token=token)
+    return f'{base_url}{path}?{urllib.parse.urlencode(data, True)}'
 
 
 def streams(token,
@@ -85,7 +107,8 @@ def streams(token,
             only_deleted=None,
             fields=None,
             limit=1000,
-            offset=0):
+            offset=0,
+            session=None):
     data = {'limit': limit, 'offset': offset}
     if organizations:
         data['organizations[]'] = organizations
@@ -106,7 +129,7 @@ def streams(token,
 
     path = '/streams'
     url = f'{base_url}{path}?{urllib.parse.urlencode(data, True)}'
-    return _request(url, token=token)
+    return _request(url, token=token, session=session)
 
 
 def projects(token,
@@ -116,7 +139,8 @@ def projects(token,
              only_deleted=None,
              fields=None,
              limit=1000,
-             offset=0):
+             offset=0,
+             session=None):
     data = {'limit': limit, 'offset': offset}
     if keyword:
         data['keyword'] = keyword
@@ -131,10 +155,10 @@ def projects(token,
 
     path = '/projects'
     url = f'{base_url}{path}?{urllib.parse.urlencode(data, True)}'
-    return _request(url, token=token)
+    return _request(url, token=token, session=session)
 
 
-def _request(url, method='GET', token=None):
+def _request(url, method='GET', token=None, session=None):
     logger.debug('get url: %s', url)
 
     if token is not None:
@@ -142,15 +166,14 @@ def _request(url, method='GET', token=None):
     else:
         headers = {}
 
-    http = httplib2.Http()
-    resp, content = http.request(url, method=method, headers=headers)
+    resp = http.get_session(session).request(method, url, headers=headers, timeout=90)
 
-    if resp.status == http_client.OK:
-        return json.loads(content)
+    if resp.status_code == http_client.OK:
+        return json.loads(resp.content)
 
-    logger.error('HTTP status: %s', resp.status)
+    logger.error('HTTP status: %s', resp.status_code)
 
-    if resp.status == 403:
+    if resp.status_code == 403:
         logger.error('No permission on given parameter(s)')
 
     return None
@@ -0,0 +1,276 @@
+"""RFCx API, audio and ingest requests for asyncio"""
+import asyncio
+import collections
+import contextlib
+import datetime
+import itertools
+import logging
+import os
+
+try:
+    import aiohttp
+    import yarl
+except ImportError:
+    aiohttp = None
+
+import rfcx._api_rfcx as api_rfcx
+import rfcx._audio as audio
+import rfcx._ingest as ingest
+import rfcx._util as util
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+def create_session(pool_size):
+    """Create an aiohttp session backed by a single keep-alive connection pool"""
+    connector = aiohttp.TCPConnector(limit=pool_size, limit_per_host=pool_size)
+    return aiohttp.ClientSession(connector=connector)
+
+
+def _generate_date_in_isoformat(date):
+    if isinstance(date, datetime.datetime):
+        return date.replace(microsecond=0).isoformat() + 'Z'
+    return date
+
+
+def _current_token(token):
+    # Long running calls take the client's `TokenManager`, read its token for every request
+    return token if isinstance(token, str) else token.token
+
+
+@contextlib.asynccontextmanager
+async def _send(session, method, url, token, headers=None, **kwargs):
+    """Send a request with the current bearer token
+
+    A request rejected with 401 refreshes the token once (in a thread, it
+    blocks) and is sent again, like `rfcx._token.BearerAuth` does for
+    `requests` sessions. `token` is a `TokenManager` or a fixed token string.
+    """
+    for replayed in (False, True):
+        sent_token = _current_token(token)
+        request_headers = dict(headers or {}, Authorization='Bearer ' + sent_token)
+        async with getattr(session, method)(url, headers=request_headers, **kwargs) as resp:
+            if resp.status == 401 and not replayed and not isinstance(token, str):
+                loop = asyncio.get_running_loop()
+                if await loop.run_in_executor(None, token.refresh, sent_token) != sent_token:
+                    continue
+            yield resp
+            return
+
+
+async def _request(session, url, token):
+    logger.debug('get url: %s', url)
+
+    timeout = aiohttp.ClientTimeout(total=90)
+    async with _send(session, 'get', url, token, timeout=timeout) as resp:
+        if resp.status == 200:
+            return await resp.json(content_type=None)
+
+        logger.error('HTTP status: %s', resp.status)
+
+        if resp.status == 403:
+            logger.error('No permission on given parameter(s)')
+
+    return None
+
+
+async def stream(session, token, stream_id, fields=None):
+    return await _request(session, api_rfcx._stream_url(stream_id, fields), token)
+
+
+async def stream_segments(session, token, stream_id, start, end, limit, offset):
+    url = api_rfcx._stream_segments_url(stream_id, start, end, limit, offset)
+    return await _request(session, url, token)
+
+
+async def detections(session,
+                     token,
+                     start,
+                     end,
+                     classifications=None,
+                     classifiers=None,
+                     stream_ids=None,
+                     min_confidence=None,
+                     limit=50,
+                     offset=0):
+    url = api_rfcx._detections_url(start, end, classifications, classifiers, stream_ids,
+                                   min_confidence, limit, offset)
+    return await _request(session, url, token)
+
+
+async def _get_shard_segments(session, token, stream_id, shard, start, end, semaphore):
+    """Get the audio segments starting within a single time shard of the `start` and `end` range
+
+    Each page request holds one of the `semaphore` slots shared with the downloads.
+    """
+    lower, upper = shard
+    shard_segments = []
+    offset = 0
+
+    while True:
+        async with semaphore:
+            segments = await stream_segments(session, token, stream_id,
+                                             _generate_date_in_isoformat(lower),
+                                             _generate_date_in_isoformat(upper),
+                                             audio.SEGMENTS_PAGE_SIZE, offset)
+        if not segments:
+            break
+        shard_segments.extend(segments)
+        if len(segments) < audio.SEGMENTS_PAGE_SIZE:
+            break
+        offset = offset + audio.SEGMENTS_PAGE_SIZE
+
+    return audio._segments_in_shard(shard_segments, shard, start, end)
+
+
+async def get_all_segments(session, token, stream_id, start, end, semaphore):
+    """Get all audio segment in the `start` and `end` time range, listing shards concurrently"""
+    start = util.parse_date(start)
+    end = util.parse_date(end)
+    shards = iter(util.time_shards(start, end, audio.SEGMENTS_SHARD))
+
+    def list_shard(shard):
+        return asyncio.ensure_future(
+            _get_shard_segments(session, token, stream_id, shard, start, end, semaphore))
+
+    pending = collections.deque(
+        list_shard(shard) for shard in itertools.islice(shards, audio.SEGMENTS_LISTING_WORKERS))
+    try:
+        while pending:
+            segments = await pending.popleft()
+            for shard in itertools.islice(shards, 1):
+                pending.append(list_shard(shard))
+            for segment in segments:
+                yield segment
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def download_segment(session, token, dest_path, stream_id, start, file_ext):
+    """Download a single audio file (segment), a cancelled download leaves no partial file behind"""
+    start = _generate_date_in_isoformat(start)
+    url = audio._segment_file_url(stream_id, start)
+    local_path = audio._segment_file_path(dest_path, stream_id, start, file_ext)
+    headers = {'Content-Type': 'application/json'}
+
+    async with _send(session, 'get', url, token, headers) as resp:
+        if resp.status == 200:
+            try:
+                with open(local_path, 'wb') as out_file:
+                    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                        out_file.write(chunk)
+            except BaseException:
+                if os.path.exists(local_path):
+                    os.remove(local_path)
+                raise
+            print(f'Saved {local_path}')
+        else:
+            print('Cannot download', url)
+            reason = await resp.json(content_type=None)
+            print('Reason:', resp.status, reason['message'])
+
+    return local_path
+
+
+async def download_segments(session, token, dest_path, stream_id, min_date, max_date, file_ext,
+                            semaphore):
+    """Download a set of audio files (segments) falling within a date range
+
+    At most `semaphore` downloads and listing requests are in flight (and held in memory) at once.
+    Cancelling the call cancels every outstanding download.
+    """
+    async with semaphore:
+        stream_resp = await stream(session, token, stream_id)
+    if stream_resp is None:
+        return
+
+    stream_name = stream_resp['name']
+    min_date = _generate_date_in_isoformat(min_date)
+    max_date = _generate_date_in_isoformat(max_date)
+    save_path = dest_path + '/' + stream_name
+    tasks = set()
+    count = 0
+
+    async def download(start):
+        try:
+            await download_segment(session, token, save_path, stream_id, start, file_ext)
+        except Exception as e:
+            print('Cannot download', start, e)
+        finally:
+            semaphore.release()
+
+    try:
+        async for segment in get_all_segments(session, token, stream_id, min_date, max_date, semaphore):
+            if count == 0:
+                print(f'Downloading audio from {stream_name}')
+                if not os.path.exists(save_path):
+                    os.makedirs(save_path)
+            count = count + 1
+
+            await semaphore.acquire()
+            task = asyncio.ensure_future(download(segment['start']))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+    except BaseException:
+        tasks = list(tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    if count > 0:
+        print(f'Finish download {count} audio on {stream_name}')
+    else:
+        print(f'No data found on {min_date[:10]} - {max_date[:10]} at {stream_name}')
+
+
+async def ingest_file(session, token, stream_id, filepath, timestamp):
+    """Ingest a single audio file, see `rfcx._ingest.ingest_file`"""
+    filename = os.path.basename(filepath)
+
+    data = {'filename': filename, 'timestamp': timestamp, 'stream': stream_id}
+    async with _send(session, 'post', ingest.upload_endpoint, token, data=data,
+                     timeout=aiohttp.ClientTimeout(total=90)) as resp:
+        upload = await resp.json(content_type=None) if resp.status == 200 else None
+    if upload is None:
+        raise Exception('Failed to request upload')
+
+    try:
+        file_ext = filepath.split('.')[-1]
+        headers = {'Content-Type': 'audio/' + file_ext}
+        with open(filepath, 'rb') as data:
+            # Signed urls must be sent exactly as received
+            async with session.put(yarl.URL(upload['url'], encoded=True), data=data, headers=headers,
+                                   timeout=aiohttp.ClientTimeout(sock_read=120)) as resp:
+                resp.raise_for_status()
+    except Exception as e:
+        e.add_note('Failed to upload file')
+        raise
+
+    return upload['uploadId']
+
+
+async def check_ingest(session, token, ingest_id, semaphore, wait_for_completion=False):
+    """Check the status of an ingest, see `rfcx._ingest.check_ingest`
+
+    Each status request holds one of the `semaphore` slots, none is held while waiting between requests.
+    """
+    url = ingest.upload_endpoint + '/' + ingest_id
+    interval = ingest.STATUS_INITIAL_INTERVAL
+    while True:
+        async with semaphore:
+            async with _send(session, 'get', url, token, timeout=aiohttp.ClientTimeout(total=90)) as resp:
+                resp.raise_for_status()
+                resp_json = await resp.json(content_type=None)
+        if not wait_for_completion or ingest._is_terminal(resp_json['status']):
+            break
+        await asyncio.sleep(interval)
+        interval = min(ingest.STATUS_MAX_INTERVAL, interval * ingest.STATUS_BACKOFF)
+
+    return ingest._status_result(resp_json)
@@ -1,29 +1,101 @@
 """RFCx audio segment information and download"""
 import datetime
-import shutil
+import hashlib
 import os
+import threading
 import concurrent.futures
-import requests
 import rfcx._api_rfcx as api_rfcx
+import rfcx._http as http
+import rfcx._paging as paging
+from rfcx._manifest import Manifest
+from rfcx._segment_index import SegmentIndex
+from rfcx._scheduler import (DEFAULT_MAX_CONCURRENCY, RETRY_STATUSES, TRANSIENT_ERRORS, FairQueue,
+                             RetryableStatusError, Scheduler, retry)
+import rfcx._util as util
 
+SEGMENTS_PAGE_SIZE = 1000
+SEGMENTS_SHARD = datetime.timedelta(days=1)
+SEGMENTS_LISTING_WORKERS = 8
+STREAMS_LISTING_WORKERS = 4
+CHUNK_SIZE = 64 * 1024
+PARTIAL_SUFFIX = '.part'
+DOWNLOAD_RETRIES = 5
 
-def __save_file(url, local_path, token):
-    """ Download the file from `url` and save it locally under `local_path` """
+
+def __save_file(url, local_path, token, session=None, resume=False, scheduler=None,
+                retries=DOWNLOAD_RETRIES):
+    """ Download the file from `url` and save it locally under `local_path`
+
+    The file is written next to `local_path` with a `.part` suffix and renamed
+    once complete. With `resume`, an existing partial file is continued using
+    an HTTP Range request. Throttling, server and connection errors are retried
+    with jittered exponential backoff (continuing the partial file).
+
+    Returns:
+        Size and SHA-1 checksum of the saved file, or None if it cannot be downloaded.
+    """
+    if scheduler is None:
+        scheduler = Scheduler()
+
+    def attempt(number):
+        return __save_file_attempt(url, local_path, token, session, resume or number > 0, scheduler)
+
+    try:
+        return retry(attempt, retries)
+    except TRANSIENT_ERRORS as e:
+        print('Cannot download', url)
+        print('Reason:', e)
+        return None
+
+
+def __save_file_attempt(url, local_path, token, session, resume, scheduler):
+    part_path = local_path + PARTIAL_SUFFIX
     headers = {
         'Authorization': 'Bearer ' + token,
         'Content-Type': 'application/json'
     }
-    response = requests.get(url, headers=headers, stream=True)
-
-    if response.status_code == 200:
-        with open(local_path, 'wb') as out_file:
-            response.raw.decode_content = True
-            shutil.copyfileobj(response.raw, out_file)
-            print(f'Saved {local_path}')
-    else:
-        print('Cannot download', url)
-        reason = response.json()
-        print('Reason:', response.status_code, reason['message'])
+    checksum = hashlib.sha1()
+    size = 0
+    if resume and os.path.exists(part_path):
+        with open(part_path, 'rb') as part_file:
+            for block in iter(lambda: part_file.read(CHUNK_SIZE), b''):
+                checksum.update(block)
+                size = size + len(block)
+        if size > 0:
+            headers['Range'] = f'bytes={size}-'
+            headers['Accept-Encoding'] = 'identity'
+
+    with scheduler.slot(url) as slot:
+        response = http.get_session(session).get(url, headers=headers, stream=True, timeout=90)
+        slot.observe(response)
+
+        if response.status_code in RETRY_STATUSES:
+            raise RetryableStatusError(response.status_code, slot.retry_after)
+
+        if response.status_code == 416:
+            # Partial file is not a prefix of the segment anymore, start again
+            os.remove(part_path)
+            raise RetryableStatusError(response.status_code)
+
+        if response.status_code not in (200, 206):
+            print('Cannot download', url)
+            reason = response.json()
+            print('Reason:', response.status_code, reason['message'])
+            return None
+
+        if response.status_code == 200:
+            checksum = hashlib.sha1()
+            size = 0
+
+        with open(part_path, 'ab' if response.status_code == 206 else 'wb') as out_file:
+            for block in response.iter_content(CHUNK_SIZE):
+                out_file.write(block)
+                checksum.update(block)
+                size = size + len(block)
+
+    os.replace(part_path, local_path)
+    print(f'Saved {local_path}')
+    return size, checksum.hexdigest()
 
 
 def __local_audio_file_path(path, audio_name, audio_extension):
@@ -41,34 +113,92 @@ def __iso_to_rfcx_custom_format(time):
     return time.replace('-', '').replace(':', '').replace('.', '')
 
 
-def __get_all_segments(token, stream_id, start, end):
-    """Get all audio segment in the `start` and `end` time range"""
-    all_segments = []
-    empty_segment = False
-    offset = 0
+def __get_shard_segments(token, stream_id, shard, start, end, session=None, strict=False):
+    """Get the audio segments starting within a single time shard of the `start` and `end` range"""
+    lower, upper = shard
 
-    while not empty_segment:
+    def get_page(limit, offset):
         # No data will return empty array from server
-        segments = api_rfcx.stream_segments(token,
+        return api_rfcx.stream_segments(token,
                                    stream_id,
-                                   start,
-                                   end,
-                                   limit=1000,
-                                   offset=offset)
-        if segments:
-            all_segments.extend(segments)
-            offset = offset + 1000
-        else:
-            empty_segment = True
+                                   __generate_date_in_isoformat(lower),
+                                   __generate_date_in_isoformat(upper),
+                                   limit=limit,
+                                   offset=offset,
+                                   session=session)
+
+    shard_segments = paging.iterate(get_page, SEGMENTS_PAGE_SIZE, strict=strict)
+
+    return _segments_in_shard(shard_segments, shard, start, end)
 
-    return all_segments
 
+def _segments_in_shard(segments, shard, start, end):
+    """Segments overlapping a shard boundary are returned for both shards, keep them in the shard they start in"""
+    return util.starts_in_shard(segments, shard, start, end)
 
-def __download_segment(token, save_path, stream_id, start_str, file_ext):
+
+def __get_all_segments(token, stream_id, start, end, session=None, strict=False):
+    """Get all audio segment in the `start` and `end` time range
+
+    The range is split into shards which are listed concurrently, segments are
+    yielded in time order as soon as their shard is listed. With `strict` a
+    failed request raises instead of ending the listing early.
+    """
+    start = util.parse_date(start)
+    end = util.parse_date(end)
+    shards = util.time_shards(start, end, SEGMENTS_SHARD)
+
+    def get_shard_segments(shard):
+        return __get_shard_segments(token, stream_id, shard, start, end, session, strict)
+
+    for segments in util.ordered_map(get_shard_segments, shards, SEGMENTS_LISTING_WORKERS):
+        yield from segments
+
+
+def sync_segments(token, stream_id, start, end, index, session=None):
+    """ Update a local segment index with the segments of a stream in a time range
+        Only the parts of the range that were not listed by earlier syncs are requested.
+
+        Args:
+            token: RFCx client token.
+            stream_id: Identifies a stream/site
+            start: Minimum timestamp of the audio.
+            end: Maximum timestamp of the audio.
+            index: `SegmentIndex` to update.
+            session: (optional, default=None) HTTP session to reuse connections from.
+
+        Returns:
+            List of segments overlapping `start` and starting before `end`, in time order (the same
+            segments as a listing without index).
+    """
+    def list_segments(stream_id, lower, upper):
+        # A partial listing must raise, otherwise the index would mark the unlisted part as covered
+        return __get_all_segments(token, stream_id, lower, upper, session, strict=True)
+
+    index.sync(stream_id, start, end, list_segments)
+    return index.segments(stream_id, start, end)
+
+
+def _segment_file_url(stream_id, start_str):
+    return f'{api_rfcx.base_url}/streams/{stream_id}/segments/{start_str}/file'
+
+
+def _segment_file_path(save_path, stream_id, start_str, file_ext):
     audio_name = stream_id + '_' + start_str.replace('.000Z', '').replace('Z', '').replace(':', '-').replace('.', '-').replace('T', '_')
-    url = f'{api_rfcx.base_url}/streams/{stream_id}/segments/{start_str}/file'
-    local_path = __local_audio_file_path(save_path, audio_name, file_ext)
-    __save_file(url, local_path, token)
+    return __local_audio_file_path(save_path, audio_name, file_ext)
+
+
+def __download_segment(token, save_path, stream_id, start_str, file_ext, session=None, manifest=None,
+                       scheduler=None):
+    url = _segment_file_url(stream_id, start_str)
+    local_path = _segment_file_path(save_path, stream_id, start_str, file_ext)
+    if manifest is not None and manifest.is_complete(stream_id, start_str, local_path):
+        return local_path
+
+    saved = __save_file(url, local_path, token, session, resume=manifest is not None, scheduler=scheduler)
+    if saved is not None and manifest is not None:
+        size, checksum = saved
+        manifest.record(stream_id, start_str, local_path, size, checksum)
     return local_path
 
 
@@ -76,13 +206,15 @@ def download_segment(token,
                         dest_path,
                         stream_id,
                         start,
-                        file_ext):
+                        file_ext,
+                        session=None):
     """ Download a single audio file (segment)
         Args:
             dest_path: Audio save path.
             stream_id: Stream id to get the segment.
             start: Exact start timestamp (string or datetime).
             file_ext: Extension for saving audio files.
+            session: (optional, default=None) HTTP session to reuse connections from.
 
         Returns:
             Path to downloaded file.
@@ -92,7 +224,50 @@ def download_segment(token,
     """
     if isinstance(start, datetime.datetime):
         start = __generate_date_in_isoformat(start)
-    return __download_segment(token, dest_path, stream_id, start, file_ext)
+    return __download_segment(token, dest_path, stream_id, start, file_ext, session)
+
+
+def fetch_segment(token,
+                  stream_id,
+                  start,
+                  session=None,
+                  scheduler=None,
+                  retries=DOWNLOAD_RETRIES):
+    """ Download a single audio file (segment) into memory
+        Args:
+            stream_id: Stream id to get the segment.
+            start: Exact start timestamp (string or datetime).
+            session: (optional, default=None) HTTP session to reuse connections from.
+            scheduler: (optional, default=None) Scheduler limiting concurrent requests.
+
+        Returns:
+            Content of the audio file (bytes).
+
+        Raises:
+            Exception: if the segment cannot be downloaded.
+    """
+    if isinstance(start, datetime.datetime):
+        start = __generate_date_in_isoformat(start)
+    if scheduler is None:
+        scheduler = Scheduler()
+    url = _segment_file_url(stream_id, start)
+    headers = {
+        'Authorization': 'Bearer ' + token,
+        'Content-Type': 'application/json'
+    }
+
+    def attempt(_):
+        with scheduler.slot(url) as slot:
+            response = http.get_session(session).get(url, headers=headers, timeout=90)
+            slot.observe(response)
+            if response.status_code in RETRY_STATUSES:
+                raise RetryableStatusError(response.status_code, slot.retry_after)
+            return response
+
+    response = retry(attempt, retries)
+    if response.status_code != 200:
+        raise Exception(f'Cannot download {url}: {response.status_code} {response.text}')
+    return response.content
 
 
 def download_segments(token,
@@ -101,7 +276,12 @@ def download_segments(token,
                          min_date,
                          max_date,
                          file_ext='wav',
-                         parallel=True):
+                         parallel=True,
+                         session=None,
+                         resume=False,
+                         max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                         max_per_host=None,
+                         index_path=None):
     """ Download a set of audio files (segments) falling within a date range
         Args:
             token: RFCx client token.
@@ -111,6 +291,13 @@ def download_segments(token,
             max_date: Maximum timestamp to get the audio.
             file_ext: (optional, default= 'wav') Extension for saving audio file.
             parallel: (optional, default= True) Enable to parallel download audio from RFCx.
+            session: (optional, default=None) HTTP session to reuse connections from.
+            resume: (optional, default=False) Record completed downloads in a manifest under `dest_path`,
+                skip them on later runs and continue partially downloaded files.
+            max_concurrency: (optional, default=100) Ceiling for parallel downloads. The actual concurrency adapts
+                to the latency, errors and `Retry-After` responses of each host.
+            max_per_host: (optional, default=None) Lower ceilings for specific hosts, as a dict of host to limit.
+            index_path: (optional, default=None) Segment index database, only time ranges not listed by earlier runs are listed.
 
         Returns:
             None.
@@ -118,37 +305,142 @@ def download_segments(token,
         Raises:
             TypeError: if missing required arguments
     """
-    stream_resp = api_rfcx.stream(token, stream_id)
+    stream_resp = api_rfcx.stream(token, stream_id, session=session)
     if stream_resp is None:
         return
 
-    stream_name = stream_resp['name']
+    download_streams_segments(token, dest_path, [stream_resp], min_date, max_date, file_ext, parallel,
+                              session, resume, max_concurrency, max_per_host, index_path)
+
+
+def download_streams_segments(token,
+                              dest_path,
+                              streams,
+                              min_date,
+                              max_date,
+                              file_ext='wav',
+                              parallel=True,
+                              session=None,
+                              resume=False,
+                              max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                              max_per_host=None,
+                              index_path=None):
+    """ Download the audio files (segments) of several streams falling within a date range
+
+    Streams are listed concurrently, a page at a time each in turn, into one
+    work queue which hands segments to a single bounded pool of download
+    workers, taking from each stream in turn.
+
+        Args:
+            token: RFCx client token.
+            dest_path: Audio save path (each stream is saved in a sub-folder named after the stream).
+            streams: List of streams, each a dict with `id` and `name`.
+            min_date: Minimum timestamp to get the audio.
+            max_date: Maximum timestamp to get the audio.
+            file_ext: (optional, default= 'wav') Extension for saving audio file.
+            parallel: (optional, default= True) Enable to parallel download audio from RFCx.
+            session: (optional, default=None) HTTP session to reuse connections from.
+            resume: (optional, default=False) Record completed downloads in a manifest under `dest_path`,
+                skip them on later runs and continue partially downloaded files.
+            max_concurrency: (optional, default=100) Ceiling for parallel downloads shared by all streams.
+            max_per_host: (optional, default=None) Lower ceilings for specific hosts, as a dict of host to limit.
+            index_path: (optional, default=None) Segment index database, only time ranges not listed by earlier runs are listed.
+
+        Returns:
+            None.
+    """
     if isinstance(min_date, datetime.datetime):
         min_date = __generate_date_in_isoformat(min_date)
     if isinstance(max_date, datetime.datetime):
         max_date = __generate_date_in_isoformat(max_date)
 
-    segments = __get_all_segments(token, stream_id, min_date, max_date)
+    stream_names = {stream['id']: stream['name'] for stream in streams}
+    counts = {stream_id: 0 for stream_id in stream_names}
+    queue = FairQueue(stream_names, maxsize=SEGMENTS_PAGE_SIZE)
+    manifest = Manifest(dest_path) if resume else None
+    scheduler = Scheduler(max_concurrency, max_per_host)
+    index = SegmentIndex(index_path) if index_path is not None else None
+    segment_listings = {}
+    listing_errors = []
+
+    def list_stream(stream_id):
+        # A turn lists at most one page of the stream and gives the worker back to the other streams. The next turn
+        # is submitted right away, or once the downloads made room when the stream's backlog is full.
+        try:
+            if stream_id not in segment_listings:
+                if index is not None:
+                    segment_listings[stream_id] = iter(sync_segments(token, stream_id, min_date, max_date, index, session))
+                else:
+                    segment_listings[stream_id] = __get_all_segments(token, stream_id, min_date, max_date, session)
+            segments = segment_listings[stream_id]
+            for _ in range(SEGMENTS_PAGE_SIZE):
+                if queue.full(stream_id):
+                    break
+                segment = next(segments, None)
+                if segment is None or not queue.put(stream_id, segment):
+                    queue.close(stream_id)
+                    return
+            queue.notify_when_room(stream_id, lambda: next_turn(stream_id))
+        except BaseException as e:
+            listing_errors.append(e)
+            queue.close(stream_id)
+
+    def next_turn(stream_id):
+        try:
+            listing_executor.submit(list_stream, stream_id)
+        except RuntimeError:
+            # Downloads were interrupted and the listings shut down
+            queue.close(stream_id)
+
+    listing_executor = concurrent.futures.ThreadPoolExecutor(max_workers=STREAMS_LISTING_WORKERS)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) if parallel else None
+    workers = threading.BoundedSemaphore(max_concurrency)
+    for stream_id in stream_names:
+        listing_executor.submit(list_stream, stream_id)
+
+    try:
+        # Downloads start while later segments are still being listed
+        while True:
+            if parallel:
+                # Only take the next segment once a worker is free, so that streams stay interleaved
+                workers.acquire()
+            item = queue.get()
+            if item is None:
+                break
+            stream_id, segment = item
+            save_path = dest_path + '/' + stream_names[stream_id]
+            if counts[stream_id] == 0:
+                print(f'Downloading audio from {stream_names[stream_id]}')
+                if not os.path.exists(save_path):
+                    os.makedirs(save_path)
+            counts[stream_id] = counts[stream_id] + 1
+
+            if parallel:
+                future = executor.submit(__download_segment, token, save_path, stream_id,
+                                         segment['start'], file_ext, session, manifest, scheduler)
+                future.add_done_callback(lambda _: workers.release())
+            else:
+                __download_segment(token, save_path, stream_id, segment['start'], file_ext, session,
+                                   manifest, scheduler)
 
-    if segments:
-        print(f'Downloading {len(segments)} audio from {stream_name}')
-        save_path = dest_path + '/' + stream_name
-        if not os.path.exists(save_path):
-            os.makedirs(save_path)
+    finally:
+        # Stop the listings early if downloading was interrupted
+        for stream_id in stream_names:
+            queue.close(stream_id)
+        listing_executor.shutdown()
+        for segments in segment_listings.values():
+            if hasattr(segments, 'close'):
+                segments.close()
+        if executor is not None:
+            executor.shutdown()
+        if index is not None:
+            index.close()
 
-        if parallel:
-            with concurrent.futures.ThreadPoolExecutor(
-                    max_workers=100) as executor:
-                futures = []
-                for segment in segments:
-                    futures.append(
-                        executor.submit(__download_segment, token, save_path, stream_id,
-                                        segment['start'], file_ext))
+    if listing_errors:
+        raise listing_errors[0]
 
-                futures, _ = concurrent.futures.wait(futures)
+    for stream_id, stream_name in stream_names.items():
+        if counts[stream_id] > 0:
+            print(f'Finish download {counts[stream_id]} audio on {stream_name}')
         else:
-            for segment in segments:
-                __download_segment(token, save_path, stream_id, segment['start'], file_ext)
-        print(f'Finish download on {stream_name}')
-    else:
-        print(f'No data found on {min_date[:10]} - {max_date[:10]} at {stream_name}')
+            print(f'No data found on {min_date[:10]} - {max_date[:10]} at {stream_name}')
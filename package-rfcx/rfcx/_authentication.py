@@ -55,6 +55,31 @@ class Authentication(object):
 
         self.__generate_new_user_token()
 
+    def refresh(self):
+        """Obtain a new token without user interaction (using the refresh token or the machine credentials)
+
+        Returns:
+            The new credentials.
+
+        Raises:
+            Exception: if the credentials have no refresh token.
+            TokenError: if the refresh is rejected.
+        """
+        if os.getenv('AUTH0_CLIENT_SECRET'):
+            self.__generate_new_machine_token()
+            return self.credentials
+
+        if self.credentials is None or self.credentials.refresh_token is None:
+            raise Exception('Credentials cannot be refreshed, please authenticate again')
+
+        access_token, refresh_token, token_expiry, id_token = api_auth.refresh(
+            self.credentials.refresh_token, self.client_id)
+        self.__setup_credentials(access_token, token_expiry, refresh_token,
+                                 id_token)
+        if self.persist and id_token is not None:
+            self.__persist_credentials()
+        return self.credentials
+
     def __load_token_from_credentials_file(self):
         with open(self.persisted_credentials_path, 'r', encoding='utf-8') as f:
             lines = f.read().splitlines()
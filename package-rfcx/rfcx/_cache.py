@@ -0,0 +1,196 @@
+"""Response cache for metadata requests (streams, projects, classifications)"""
+import base64
+import collections
+import functools
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from six.moves import urllib
+
+DEFAULT_MAX_ENTRIES = 10000
+# Entries not used for this long are dropped when a cache database is opened (e.g. left under an identity no longer used)
+DEFAULT_MAX_AGE = 7 * 24 * 60 * 60
+
+# Time to live in seconds of the responses of each endpoint, by regex on the url path (first match wins).
+# Other requests are never cached.
+DEFAULT_TTLS = (
+    (r'^/streams/[^/]+$', 60 * 60),
+    (r'^/streams$', 5 * 60),
+    (r'^/projects/[^/]+$', 60 * 60),
+    (r'^/projects$', 5 * 60),
+    (r'^/classifications(/[^/]+)?$', 24 * 60 * 60),
+)
+
+CacheEntry = collections.namedtuple('CacheEntry', ['stored_at', 'status_code', 'headers', 'content'])
+
+
+@functools.lru_cache(maxsize=64)
+def _identity(authorization):
+    """Hash of the user a request is sent for, stable across refreshes of the token"""
+    token = authorization[len('Bearer '):] if authorization.startswith('Bearer ') else ''
+    segments = token.split('.')
+    if len(segments) == 3:
+        try:
+            payload = segments[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+            subject = claims.get('sub') if isinstance(claims, dict) else None
+        except ValueError:
+            subject = None
+        if isinstance(subject, str) and subject:
+            return hashlib.sha1(('sub ' + subject).encode('utf-8')).hexdigest()
+    return hashlib.sha1(authorization.encode('utf-8')).hexdigest()
+
+
+class MemoryCache(object):
+    """In-memory cache evicting the least recently used responses beyond `max_entries`"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache(object):
+    """On-disk cache shared across runs, evicting the least recently used responses beyond `max_entries`
+
+    Responses not used for `max_age` seconds are removed when the database is opened.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, max_age=DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, stored_at REAL, '
+                         'status_code INTEGER, headers TEXT, content BLOB, used_at REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_used ON responses (used_at)')
+        self.prune()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute('SELECT stored_at, status_code, headers, content FROM responses WHERE key = ?',
+                                   (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute('UPDATE responses SET used_at = ? WHERE key = ?', (time.time(), key))
+        return CacheEntry(row[0], row[1], json.loads(row[2]), row[3])
+
+    def set(self, key, entry):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                             (key, entry.stored_at, entry.status_code, json.dumps(entry.headers), entry.content,
+                              time.time()))
+            self._db.execute('DELETE FROM responses WHERE key IN (SELECT key FROM responses '
+                             'ORDER BY used_at DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+
+    def prune(self, max_age=None):
+        """Remove the responses not used for `max_age` seconds (default `self.max_age`)"""
+        max_age = self.max_age if max_age is None else max_age
+        with self._lock:
+            self._db.execute('DELETE FROM responses WHERE used_at < ?', (time.time() - max_age,))
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM responses')
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class CachingAdapter(HTTPAdapter):
+    """Transport adapter answering GET requests of cacheable endpoints from a cache
+
+    Fresh responses (younger than the endpoint's TTL) are returned without a
+    request. Stale responses with an ETag are revalidated with
+    `If-None-Match`, a 304 answer refreshes them. Responses are cached per
+    user (the `sub` of a JWT bearer token, otherwise the whole `Authorization`
+    header) so users never see each other's results, and refreshing a token
+    keeps the cache.
+
+    Args:
+        cache: `MemoryCache`, `SQLiteCache` or any object with `get(key)` and `set(key, entry)`.
+        ttls: Sequence of (url path regex, seconds) pairs, the first matching pattern applies.
+    """
+
+    def __init__(self, cache, ttls=DEFAULT_TTLS, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+        self.ttls = [(re.compile(pattern), ttl) for pattern, ttl in ttls]
+
+    def _ttl(self, url):
+        path = urllib.parse.urlparse(url).path
+        for pattern, ttl in self.ttls:
+            if pattern.search(path):
+                return ttl
+        return None
+
+    @staticmethod
+    def _key(request):
+        return _identity(request.headers.get('Authorization', '')) + ' ' + request.url
+
+    def _cached_response(self, request, entry):
+        response = requests.Response()
+        response.status_code = entry.status_code
+        response.headers = CaseInsensitiveDict(entry.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = entry.content
+        response.url = request.url
+        response.request = request
+        response.reason = 'OK'
+        response.connection = self
+        response.from_cache = True
+        return response
+
+    def send(self, request, **kwargs):
+        ttl = self._ttl(request.url) if request.method == 'GET' else None
+        if ttl is None:
+            return super().send(request, **kwargs)
+
+        key = self._key(request)
+        entry = self.cache.get(key)
+        if entry is not None and time.time() - entry.stored_at < ttl:
+            return self._cached_response(request, entry)
+
+        etag = CaseInsensitiveDict(entry.headers).get('ETag') if entry is not None else None
+        if etag is not None:
+            request.headers['If-None-Match'] = etag
+        response = super().send(request, **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            response.close()
+            entry = entry._replace(stored_at=time.time())
+            self.cache.set(key, entry)
+            return self._cached_response(request, entry)
+        if response.status_code == 200 and 'no-store' not in response.headers.get('Cache-Control', ''):
+            headers = {name: value for name, value in response.headers.items()
+                       if name.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')}
+            self.cache.set(key, CacheEntry(time.time(), response.status_code, headers, response.content))
+        return response
@@ -2,23 +2,78 @@ import logging
 import os
 import re
 import requests
-from requests_toolbelt import MultipartEncoder
+import urllib3
+from requests_toolbelt import MultipartEncoder, MultipartEncoderMonitor
+import rfcx._http as http
+from rfcx._scheduler import RetryableStatusError, parse_retry_after, retry
 
 logger = logging.getLogger(__name__)
 
 base_url = os.getenv('RFCX_API_URL', 'https://api.rfcx.org')
 
-def upload(token: str, filepath: str, name: str, version: int, classification_values: list) -> int:
-    headers = {'Authorization': 'Bearer ' + token}
+UPLOAD_RETRIES = 3
+UPLOAD_TIMEOUT = 120
+# Creating a classifier is not idempotent: only retry when the server refused the request before handling it
+UPLOAD_RETRY_STATUSES = (429, 503)
+
+
+class _NotSentError(Exception):
+    """The connection could not be established, the request never reached the server"""
+
+
+def _never_sent(error):
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
+
+def _upload_attempt(token, filepath, name, version, classification_values, session, timeout, progress):
+    # The file is re-opened on each attempt so a retry sends it again from the start
     with open(filepath, 'rb') as data:
         multipart_data = MultipartEncoder([
                 ('file', ('model.tar.gz', data, 'text/plain')),
                 ('name', name),
                 ('version', str(version))] +
                 [('classification_values', cv) for cv in classification_values])
+        if progress is not None:
+            multipart_data = MultipartEncoderMonitor(multipart_data,
+                                                     lambda monitor: progress(monitor.bytes_read, monitor.len))
         headers = {'Authorization': 'Bearer ' + token, 'Content-Type': multipart_data.content_type}
-        resp = requests.post(f'{base_url}/classifiers', headers=headers, data=multipart_data, timeout=120)
+        try:
+            resp = http.get_session(session).post(f'{base_url}/classifiers', headers=headers, data=multipart_data,
+                                                  timeout=timeout)
+        except requests.exceptions.ConnectionError as e:
+            if _never_sent(e):
+                raise _NotSentError() from e
+            raise
+    if resp.status_code in UPLOAD_RETRY_STATUSES:
+        raise RetryableStatusError(resp.status_code, parse_retry_after(resp.headers.get('Retry-After')))
     resp.raise_for_status()
+    return resp
+
+def upload(token: str, filepath: str, name: str, version: int, classification_values: list, session=None,
+           progress=None, timeout=UPLOAD_TIMEOUT, retries=UPLOAD_RETRIES) -> int:
+    """ Upload a classifier, streaming the file from disk
+        Args:
+            token: RFCx client token
+            filepath: Local path of the model (tar.gz)
+            name: Classifier name
+            version: Classifier version
+            classification_values: List of mappings from model class name to classification values
+            session: HTTP session to reuse connections from
+            progress: called with the bytes sent so far and the total size of the request body
+            timeout: seconds without progress (or (connect, read) tuple) before the upload is abandoned
+            retries: number of times the upload is retried when the connection fails or the server answers 429 or 503.
+                Other errors (e.g. a read timeout) are raised: the classifier may have been created.
+
+        Returns:
+            classifier identifier, or None if the location of the created classifier is unknown
+    """
+    try:
+        resp = retry(lambda _: _upload_attempt(token, filepath, name, version, classification_values, session,
+                                               timeout, progress), retries, (RetryableStatusError, _NotSentError))
+    except _NotSentError as e:
+        raise e.__cause__
 
     if resp.status_code != 201 or resp.headers['Location'] is None:
         return None
@@ -0,0 +1,37 @@
+"""Decode audio files in memory into NumPy arrays"""
+import io
+import math
+
+try:
+    import numpy as np
+    import soundfile
+except ImportError:
+    np = None
+
+
+def decode(content, sample_rate=None):
+    """Decode the content of an audio file (wav, flac, ...) into a mono float32 array
+
+    Args:
+        content: Audio file content (bytes).
+        sample_rate: (optional, default=None) Resample to this sample rate. None keeps the file's sample rate.
+
+    Returns:
+        Samples (1-dim float32 numpy array) and sample rate.
+
+    Raises:
+        ImportError: if numpy, soundfile or scipy (for resampling) are not installed.
+    """
+    if np is None:
+        raise ImportError('Decoding audio requires numpy and soundfile, install them with `pip install rfcx[audio]`')
+
+    data, file_sample_rate = soundfile.read(io.BytesIO(content), dtype='float32', always_2d=True)
+    samples = data.mean(axis=1) if data.shape[1] > 1 else data[:, 0]
+
+    if sample_rate is not None and int(sample_rate) != file_sample_rate:
+        from scipy import signal
+        divisor = math.gcd(int(sample_rate), file_sample_rate)
+        samples = signal.resample_poly(samples, int(sample_rate) // divisor, file_sample_rate // divisor)
+        file_sample_rate = int(sample_rate)
+
+    return np.ascontiguousarray(samples, dtype=np.float32), file_sample_rate
@@ -0,0 +1,209 @@
+"""Bulk export of detections to Arrow and Parquet"""
+import datetime
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+import rfcx._api_rfcx as api_rfcx
+import rfcx._paging as paging
+import rfcx._util as util
+
+EXPORT_SHARD = datetime.timedelta(days=1)
+EXPORT_PAGE_SIZE = 1000
+EXPORT_WORKERS = 8
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError('Exporting detections requires pyarrow, install it with `pip install rfcx[parquet]`')
+
+
+def detections_schema():
+    """Arrow schema of exported detections"""
+    _require_pyarrow()
+    return pa.schema([
+        ('stream_id', pa.dictionary(pa.int32(), pa.string())),
+        ('start', pa.timestamp('ms', tz='UTC')),
+        ('end', pa.timestamp('ms', tz='UTC')),
+        ('confidence', pa.float64()),
+        ('classification', pa.dictionary(pa.int32(), pa.string())),
+        ('date', pa.string())
+    ])
+
+
+def detections_batch(detections):
+    """Convert a list of detections (as returned by the API) into an Arrow record batch
+
+    Timestamps are parsed by Arrow in a single pass per column, stream ids and
+    classification values are dictionary encoded. `date` (day of the start, UTC)
+    is added for partitioning.
+    """
+    _require_pyarrow()
+    classifications = [d['classification']['value'] if isinstance(d['classification'], dict) else d['classification']
+                       for d in detections]
+    start = pa.array([d['start'] for d in detections], pa.string()).cast(pa.timestamp('ms', tz='UTC'))
+    end = pa.array([d['end'] for d in detections], pa.string()).cast(pa.timestamp('ms', tz='UTC'))
+    date = pa.array([d['start'][:10] for d in detections], pa.string())
+    return pa.RecordBatch.from_arrays([
+        pa.array([d['stream_id'] for d in detections], pa.string()).dictionary_encode(),
+        start,
+        end,
+        pa.array([d['confidence'] for d in detections], pa.float64()),
+        pa.array(classifications, pa.string()).dictionary_encode(),
+        date
+    ], schema=detections_schema())
+
+
+def _timestamp(date):
+    return pa.scalar(date, pa.timestamp('ms')).cast(pa.timestamp('ms', tz='UTC'))
+
+
+def _starts_in_shard(table, shard, start, end):
+    """Same as `rfcx._util.starts_in_shard` on the parsed `start` column of a table"""
+    lower, upper = shard
+    mask = None
+    if lower != start:
+        mask = pc.greater_equal(table['start'], _timestamp(lower))
+    if upper != end:
+        before = pc.less(table['start'], _timestamp(upper))
+        mask = before if mask is None else pc.and_(mask, before)
+    return table if mask is None else table.filter(mask)
+
+
+def _starts_within(table, lower, upper, include_upper):
+    """Mask of the rows starting within `lower` and `upper`"""
+    before = (pc.less_equal if include_upper else pc.less)(table['start'], _timestamp(upper))
+    return pc.and_(pc.greater_equal(table['start'], _timestamp(lower)), before)
+
+
+def _day_shards(start, end):
+    """Split the `start` to `end` range at UTC midnights, so that each shard holds a single date partition"""
+    shards = []
+    lower = start
+    while True:
+        upper = min(datetime.datetime.combine(lower.date(), datetime.time()) + EXPORT_SHARD, end)
+        shards.append((lower, upper))
+        if upper >= end:
+            return shards
+        lower = upper
+
+
+def _kept_rows(dest_path, table, lower, upper, include_upper):
+    """Rows already exported for the partitions of `table` that start outside of `lower` to `upper`
+
+    Days at the ends of the range are only partly exported, the rest of their
+    rows must survive the rewrite of their partitions.
+    """
+    kept = []
+    for date in pc.unique(table['date']).to_pylist():
+        day_start = datetime.datetime.fromisoformat(date)
+        if lower <= day_start and upper >= day_start + EXPORT_SHARD:
+            continue  # The whole day was exported again
+        for stream_id in pc.unique(table['stream_id']).to_pylist():
+            path = os.path.join(dest_path, f'stream_id={stream_id}', f'date={date}')
+            if not os.path.isdir(path):
+                continue
+            existing = pq.read_table(path)
+            existing = existing.filter(pc.invert(_starts_within(existing, lower, upper, include_upper)))
+            rows = existing.num_rows
+            if rows > 0:
+                kept.append(pa.Table.from_arrays([
+                    pa.array([stream_id] * rows, pa.string()).dictionary_encode(),
+                    existing['start'],
+                    existing['end'],
+                    existing['confidence'],
+                    existing['classification'].cast(pa.dictionary(pa.int32(), pa.string())),
+                    pa.array([date] * rows, pa.string())
+                ], schema=detections_schema()))
+    return kept
+
+
+def iter_detections_tables(token, start, end, classifications=None, classifiers=None, stream_ids=None,
+                           min_confidence=None, session=None, max_workers=EXPORT_WORKERS):
+    """Yield one Arrow table of detections per day of the `start` to `end` range, in time order
+
+    Up to `max_workers` days are paged concurrently, each page is converted to
+    a record batch as soon as it arrives.
+    """
+    for _, table in _iter_shard_tables(token, start, end, classifications, classifiers, stream_ids, min_confidence,
+                                       session, max_workers):
+        yield table
+
+
+def _iter_shard_tables(token, start, end, classifications=None, classifiers=None, stream_ids=None,
+                       min_confidence=None, session=None, max_workers=EXPORT_WORKERS, strict=False):
+    """Yield (shard, table) for each UTC day of the range that has detections
+
+    With `strict` only the detections starting within `start` and `end` are kept
+    (otherwise detections overlapping `start` are included too) and a failed
+    request raises instead of ending the day early.
+    """
+    _require_pyarrow()
+    start = util.parse_date(start)
+    end = util.parse_date(end)
+
+    def fetch_shard(shard):
+        lower, upper = shard
+
+        def fetch(limit, offset):
+            return api_rfcx.detections(token, lower.isoformat() + 'Z', upper.isoformat() + 'Z', classifications,
+                                       classifiers, stream_ids, min_confidence, limit, offset, session)
+
+        batches = []
+        page = []
+        for detection in paging.iterate(fetch, EXPORT_PAGE_SIZE, strict=strict):
+            page.append(detection)
+            if len(page) == EXPORT_PAGE_SIZE:
+                batches.append(detections_batch(page))
+                page = []
+        if page:
+            batches.append(detections_batch(page))
+        table = pa.Table.from_batches(batches, detections_schema())
+        if strict:
+            return shard, table.filter(_starts_within(table, lower, upper, upper == end))
+        return shard, _starts_in_shard(table, shard, start, end)
+
+    shards = _day_shards(start, end)
+    for shard, table in util.ordered_map(fetch_shard, shards, max_workers):
+        if table.num_rows > 0:
+            yield shard, table
+
+
+def export_detections(token, dest_path, start, end, classifications=None, classifiers=None, stream_ids=None,
+                      min_confidence=None, session=None, max_workers=EXPORT_WORKERS):
+    """ Write detections to a Parquet dataset partitioned by stream and day
+        (`dest_path/stream_id=.../date=YYYY-MM-DD/part-N.parquet`)
+
+        Exporting a range again replaces the partitions it writes, so overlapping
+        exports never duplicate rows. For days only partly in the range, the rows
+        exported earlier for the rest of the day are kept. Only the stream and day
+        partitions that have detections in the new export are replaced: rows
+        exported earlier for a stream that no longer has detections on a day
+        are left as they were.
+
+        A day is written once all its detections are fetched. A failed request
+        raises before the partitions of its day are touched, the days written
+        before it hold complete data.
+
+        Returns:
+            Number of detections written
+
+        Raises:
+            Exception: if a page of detections cannot be fetched
+    """
+    start = util.parse_date(start)
+    end = util.parse_date(end)
+    count = 0
+    for (lower, upper), table in _iter_shard_tables(token, start, end, classifications, classifiers, stream_ids,
+                                                    min_confidence, session, max_workers, strict=True):
+        merged = pa.concat_tables(_kept_rows(dest_path, table, lower, upper, upper == end) + [table])
+        pq.write_to_dataset(merged, dest_path, partition_cols=['stream_id', 'date'],
+                            basename_template='part-{i}.parquet',
+                            existing_data_behavior='delete_matching')
+        count += table.num_rows
+    return count
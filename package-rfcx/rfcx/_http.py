@@ -0,0 +1,52 @@
+"""Shared HTTP connection pool"""
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from rfcx._cache import DEFAULT_TTLS, CachingAdapter
+
+DEFAULT_POOL_SIZE = 100
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+def _merge_ttls(ttls):
+    if ttls is None:
+        return DEFAULT_TTLS
+    ttls = dict(ttls)
+    return tuple(ttls.items()) + tuple((pattern, ttl) for pattern, ttl in DEFAULT_TTLS if pattern not in ttls)
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, cache=None, ttls=None):
+    """Create a keep-alive session backed by a thread-safe connection pool
+
+    Args:
+        pool_size: (optional, default=100) Maximum number of connections kept open per host.
+        cache: (optional, default=None) Cache for the responses of metadata endpoints, see `rfcx._cache`.
+        ttls: (optional, default=None) (url path regex, seconds) pairs merged with the default cache TTLs,
+            a pattern equal to a default one replaces its TTL. Listed patterns are matched before the other defaults.
+
+    Returns:
+        A `requests.Session` that reuses HTTP/1.1 connections across calls.
+    """
+    session = requests.Session()
+    if cache is not None:
+        adapter = CachingAdapter(cache, _merge_ttls(ttls), pool_connections=pool_size, pool_maxsize=pool_size)
+    else:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def default_session():
+    """Session shared by module level calls that are not made through a `Client`"""
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = create_session()
+        return _default_session
+
+
+def get_session(session=None):
+    return session if session is not None else default_session()
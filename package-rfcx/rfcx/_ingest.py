@@ -1,41 +1,175 @@
-import requests
+import collections
+import concurrent.futures
+import heapq
+import itertools
+import threading
 import time
 import os
+import requests
+import rfcx._http as http
+import rfcx._util as util
+from rfcx._journal import UPLOADED, REQUESTED
+from rfcx._scheduler import RETRY_STATUSES, RetryableStatusError, parse_retry_after, retry
 
 upload_endpoint = os.getenv('RFCX_INGEST_URL', 'https://ingest.rfcx.org/uploads')
 
 statuses = {0: 'WAITING', 10: 'UPLOADED', 20: 'INGESTED', 30: 'FAILED', 31: 'DUPLICATE', 32: 'CHECKSUM'}
-    
+
+INGEST_RETRIES = 3
+UPLOAD_PART_SIZE = 1024 * 1024
+UPLOAD_TIMEOUT = 120
+# Signed upload urls are only valid for a limited time, don't reuse older ones from the journal
+SIGNED_URL_TTL = 10 * 60
+STATUS_INITIAL_INTERVAL = 1.0
+STATUS_MAX_INTERVAL = 60.0
+STATUS_BACKOFF = 1.5
+
+IngestResult = collections.namedtuple('IngestResult', ['filepath', 'ingest_id', 'error'])
+IngestProgress = collections.namedtuple('IngestProgress', [
+    'completed', 'failed', 'total', 'bytes_uploaded', 'elapsed', 'files_per_second', 'bytes_per_second'])
+
+def _raise_for_retry_status(resp):
+    if resp.status_code in RETRY_STATUSES:
+        raise RetryableStatusError(resp.status_code, parse_retry_after(resp.headers.get('Retry-After')))
+
 # POST
-def _request_upload(token, stream_id, filename, timestamp):
+def _request_upload(token, stream_id, filename, timestamp, session=None, checksum=None):
     headers = {'Authorization': 'Bearer ' + token}
     data = {'filename': filename, 'timestamp': timestamp, 'stream': stream_id}
-    resp = requests.post(upload_endpoint, headers=headers, data=data, timeout=90)
+    if checksum is not None:
+        data['checksum'] = checksum
+    resp = http.get_session(session).post(upload_endpoint, headers=headers, data=data, timeout=90)
+    _raise_for_retry_status(resp)
     return resp.json() if (resp.status_code == 200) else None
 
+class _FileReader(object):
+    """File body sent in `part_size` blocks, reporting the bytes sent so far to `progress(sent, total)`"""
+
+    def __init__(self, f, part_size, progress=None):
+        self._file = f
+        self._part_size = part_size
+        self._progress = progress
+        self._size = os.fstat(f.fileno()).st_size
+        self._sent = 0
+
+    def __len__(self):
+        return self._size
+
+    def read(self, size=-1):
+        block = self._file.read(self._part_size)
+        self._sent += len(block)
+        if block and self._progress is not None:
+            self._progress(self._sent, self._size)
+        return block
+
 # PUT
-def _upload(signed_url, filepath):
+def _upload(signed_url, filepath, session=None, part_size=UPLOAD_PART_SIZE, timeout=UPLOAD_TIMEOUT, progress=None):
     file_ext = filepath.split('.')[-1]
     headers = {'Content-Type': 'audio/' + file_ext}
-    with open(filepath, 'rb') as data:
-        resp = requests.put(signed_url, data=data, headers=headers, timeout=120)
+    with open(filepath, 'rb') as f:
+        data = _FileReader(f, part_size, progress)
+        resp = http.get_session(session).put(signed_url, data=data, headers=headers, timeout=timeout)
+    _raise_for_retry_status(resp)
     resp.raise_for_status()
 
+def _checksum(filepath, journal=None):
+    """SHA-1 checksum of a file, the one recorded in `journal` if the file did not change since"""
+    checksum = journal.checksum(filepath) if journal is not None else None
+    return checksum if checksum is not None else util.file_sha1(filepath)
+
+def _prepare_upload(token, stream_id, filepath, timestamp, session=None, retries=INGEST_RETRIES, journal=None,
+                    checksum=None):
+    """Upload id and signed url for a file, reusing the ones recorded in `journal` while still valid
+
+    The SHA-1 checksum of the file (`checksum` if already known) is sent with
+    the upload request. If `journal` shows the same content was already
+    uploaded to the stream, that upload is returned instead.
+
+    Returns:
+        upload (dict with `uploadId`, `url`, `state` and `sha1`) and whether it came from the journal
+    """
+    if journal is not None:
+        entry = journal.get(stream_id, filepath)
+        if entry is not None and (entry['state'] == UPLOADED or time.time() - entry['requested'] < SIGNED_URL_TTL):
+            return entry, True
+    if checksum is None:
+        checksum = _checksum(filepath, journal)
+    if journal is not None:
+        duplicate = journal.find_uploaded(stream_id, checksum)
+        if duplicate is not None:
+            return duplicate, True
+
+    filename = os.path.basename(filepath)
+    upload = retry(lambda _: _request_upload(token, stream_id, filename, timestamp, session, checksum), retries)
+    if upload is None:
+        raise Exception('Failed to request upload')
+    if journal is not None:
+        return journal.record(stream_id, filepath, timestamp, upload['uploadId'], upload['url'], REQUESTED,
+                              checksum=checksum), False
+    return dict(upload, state=REQUESTED, sha1=checksum), False
+
+def _complete_upload(token, stream_id, filepath, timestamp, upload, reused, session=None, retries=INGEST_RETRIES,
+                     journal=None, part_size=UPLOAD_PART_SIZE, timeout=UPLOAD_TIMEOUT, progress=None):
+    """Upload the file to the signed url unless the journal says it was uploaded already
+
+    Returns:
+        ingest identifier
+    """
+    if upload['state'] == UPLOADED:
+        return upload['uploadId']
+
+    try:
+        retry(lambda _: _upload(upload['url'], filepath, session, part_size, timeout, progress), retries)
+    except requests.HTTPError as e:
+        if not reused or e.response.status_code != 403:
+            e.add_note('Failed to upload file')
+            raise
+        # The signed url from the journal expired, start over with a new upload
+        journal.forget(stream_id, filepath)
+        upload, reused = _prepare_upload(token, stream_id, filepath, timestamp, session, retries, journal)
+        return _complete_upload(token, stream_id, filepath, timestamp, upload, reused, session, retries,
+                                journal, part_size, timeout, progress)
+    except Exception as e:
+        e.add_note('Failed to upload file')
+        raise
+
+    if journal is not None:
+        journal.record(stream_id, filepath, timestamp, upload['uploadId'], upload['url'], UPLOADED,
+                       upload['requested'], upload.get('sha1'))
+    return upload['uploadId']
+
 # GET
-def _get_status(token, upload_id):
+def _get_status(token, upload_id, session=None):
     headers = {'Authorization': 'Bearer ' + token}
     url = upload_endpoint + '/' + upload_id
-    resp = requests.get(url, headers=headers, timeout=90)
+    resp = http.get_session(session).get(url, headers=headers, timeout=90)
+    _raise_for_retry_status(resp)
     resp.raise_for_status()
     return resp.json()
 
-def ingest_file(token, stream_id, filepath, timestamp):
+def _status_result(resp):
+    status = resp['status']
+    status_name = statuses[status] if status in statuses else 'UNKNOWN'
+    failure_message = resp['failureMessage'] if 'failureMessage' in resp else None
+    return status, status_name, failure_message
+
+def _is_terminal(status):
+    return status >= 20
+
+def ingest_file(token, stream_id, filepath, timestamp, session=None, retries=INGEST_RETRIES, journal=None,
+                part_size=UPLOAD_PART_SIZE, timeout=UPLOAD_TIMEOUT, progress=None):
     """ Ingest a single audio file
         Args:
             token: RFCx client token
             stream_id: RFCx stream id
             filepath: Local file path to be ingest
             timestamp: Audio timestamp in iso format
+            session: HTTP session to reuse connections from
+            retries: number of times throttled, server or connection errors are retried
+            journal: `IngestJournal` to resume from and record the upload in
+            part_size: number of bytes read from the file and sent at once
+            timeout: seconds without progress before the upload is abandoned (and retried)
+            progress: called with the bytes sent so far and the file size while uploading
 
         Returns:
             ingest identifier
@@ -43,26 +177,139 @@ def ingest_file(token, stream_id, filepath, timestamp):
         Raises:
             Exception: on failed upload or ingest
     """
-    filename = os.path.basename(filepath)
+    upload, reused = _prepare_upload(token, stream_id, filepath, timestamp, session, retries, journal)
+    return _complete_upload(token, stream_id, filepath, timestamp, upload, reused, session, retries, journal,
+                            part_size, timeout, progress)
 
-    resp = _request_upload(token, stream_id, filename, timestamp)
-    if resp is None:
-        raise Exception('Failed to request upload')
+class _Progress(object):
+
+    def __init__(self, total, callback):
+        self.total = total
+        self.callback = callback
+        self.completed = 0
+        self.failed = 0
+        self.bytes_uploaded = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def update(self, uploaded_bytes=None):
+        """Count a completed file (with its size) or a failed one (without)"""
+        with self._lock:
+            if uploaded_bytes is None:
+                self.failed += 1
+            else:
+                self.completed += 1
+                self.bytes_uploaded += uploaded_bytes
+            elapsed = time.monotonic() - self.started
+            progress = IngestProgress(self.completed, self.failed, self.total, self.bytes_uploaded, elapsed,
+                                      self.completed / elapsed if elapsed > 0 else 0.0,
+                                      self.bytes_uploaded / elapsed if elapsed > 0 else 0.0)
+        if self.callback is not None:
+            self.callback(progress)
+
+def ingest_files(token, stream_id, files, max_workers=8, progress=None, session=None, retries=INGEST_RETRIES,
+                 journal=None, part_size=UPLOAD_PART_SIZE, timeout=UPLOAD_TIMEOUT):
+    """ Ingest many audio files, pipelining upload requests and uploads
+        Args:
+            token: RFCx client token
+            stream_id: RFCx stream id
+            files: list of (filepath, timestamp in iso format) pairs
+            max_workers: number of upload requests and of uploads running in parallel
+            progress: called with an `IngestProgress` each time a file completes or fails
+            session: HTTP session to reuse connections from
+            retries: number of times throttled, server or connection errors are retried
+            journal: `IngestJournal` to resume from and record the uploads in
+            part_size: number of bytes read from a file and sent at once
+            timeout: seconds without progress before an upload is abandoned (and retried)
+
+        Files of `files` with the same content (SHA-1) are uploaded once, the
+        others get the ingest identifier (or the error) of that upload.
+        Only the bytes of files actually sent count in the progress.
+
+        Returns:
+            list of `IngestResult` (filepath, ingest identifier, error) in the order of `files`
+    """
+    files = list(files)
+    results = [None] * len(files)
+    tracker = _Progress(len(files), progress)
+    # Checksum to the future ingest id of the first file with that content
+    first_uploads = {}
+    first_uploads_lock = threading.Lock()
+    # Don't request signed urls far ahead of the uploads, they expire
+    requested_ahead = threading.BoundedSemaphore(2 * max_workers)
+    requests_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    uploads_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    def fail(index, filepath, error):
+        results[index] = IngestResult(filepath, None, error)
+        tracker.update()
+
+    def upload(index, filepath, timestamp, prepared, reused, first_upload):
+        # Uploads completed by an earlier run (or of content already uploaded) send nothing
+        sent_bytes = 0 if prepared['state'] == UPLOADED else os.path.getsize(filepath)
+        try:
+            ingest_id = _complete_upload(token, stream_id, filepath, timestamp, prepared, reused, session,
+                                         retries, journal, part_size, timeout)
+        except Exception as e:
+            fail(index, filepath, e)
+            first_upload.set_exception(e)
+            return
+        finally:
+            requested_ahead.release()
+        results[index] = IngestResult(filepath, ingest_id, None)
+        tracker.update(sent_bytes)
+        first_upload.set_result(ingest_id)
+
+    def duplicate_done(index, filepath, first_upload):
+        error = first_upload.exception()
+        if error is not None:
+            fail(index, filepath, error)
+        else:
+            results[index] = IngestResult(filepath, first_upload.result(), None)
+            tracker.update(0)
+
+    def request_upload(index, filepath, timestamp):
+        try:
+            checksum = _checksum(filepath, journal)
+        except Exception as e:
+            fail(index, filepath, e)
+            return
+        with first_uploads_lock:
+            first_upload = first_uploads.get(checksum)
+            duplicate = first_upload is not None
+            if not duplicate:
+                first_upload = first_uploads[checksum] = concurrent.futures.Future()
+        if duplicate:
+            first_upload.add_done_callback(lambda future: duplicate_done(index, filepath, future))
+            return
+
+        requested_ahead.acquire()
+        try:
+            prepared, reused = _prepare_upload(token, stream_id, filepath, timestamp, session, retries, journal,
+                                               checksum)
+        except Exception as e:
+            requested_ahead.release()
+            fail(index, filepath, e)
+            first_upload.set_exception(e)
+            return
+        uploads_executor.submit(upload, index, filepath, timestamp, prepared, reused, first_upload)
 
     try:
-        _upload(resp['url'], filepath)
-    except Exception as e:
-        e.add_note('Failed to upload file')
-        raise
+        for index, (filepath, timestamp) in enumerate(files):
+            requests_executor.submit(request_upload, index, filepath, timestamp)
+    finally:
+        requests_executor.shutdown()
+        uploads_executor.shutdown()
 
-    return resp['uploadId']
+    return results
 
-def check_ingest(token, ingest_id, wait_for_completion = False):
+def check_ingest(token, ingest_id, wait_for_completion = False, session=None):
     """ Check the status of an ingest
         Args:
             token: RFCx client token
             ingest_id: Ingest identifier (returned from `ingest_file`)
             wait_for_completion: should keep waiting and checking until file is processed
+            session: HTTP session to reuse connections from
 
         Returns:
             status: 10 is waiting (not yet processed), 20 is success, 3x is failure
@@ -72,13 +319,139 @@ def check_ingest(token, ingest_id, wait_for_completion = False):
         Raises:
             Exception: on failed upload or ingest
     """
+    interval = STATUS_INITIAL_INTERVAL
     while True:
-        resp = _get_status(token, ingest_id)
-        status = resp['status']
-        if not wait_for_completion or status >= 20:
+        resp = _get_status(token, ingest_id, session)
+        if not wait_for_completion or _is_terminal(resp['status']):
             break
-        time.sleep(5)
+        time.sleep(interval)
+        interval = min(STATUS_MAX_INTERVAL, interval * STATUS_BACKOFF)
 
-    status_name = statuses[status] if status in statuses else 'UNKNOWN'
-    failure_message = resp['failureMessage'] if 'failureMessage' in resp else None
-    return status, status_name, failure_message
+    return _status_result(resp)
+
+class IngestTracker(object):
+    """Wait on the status of many ingests at once
+
+    A single scheduler thread polls every tracked ingest on a shared worker
+    pool. Each ingest is polled after `initial_interval` seconds, then
+    `backoff` times less often up to every `max_interval` seconds, and is
+    dropped once it reaches a terminal status (20 or above). Tracking an id
+    that is already being tracked returns the same future.
+
+    Args:
+        token: RFCx client token
+        session: HTTP session to reuse connections from
+        max_workers: number of status requests in flight at once
+        initial_interval: delay before the first poll and between the first polls, in seconds
+        max_interval: longest delay between two polls of an ingest, in seconds
+        backoff: factor the delay grows by after each non terminal poll
+    """
+
+    def __init__(self, token, session=None, max_workers=8, initial_interval=STATUS_INITIAL_INTERVAL,
+                 max_interval=STATUS_MAX_INTERVAL, backoff=STATUS_BACKOFF):
+        self.token = token
+        self.session = session
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self._futures = {}
+        self._due = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._polls = threading.BoundedSemaphore(max_workers)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._thread = None
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def track(self, ingest_id, callback=None):
+        """ Start polling an ingest until it is processed
+            Args:
+                ingest_id: Ingest identifier (returned from `ingest_file`)
+                callback: called with the future once the ingest is processed or polling fails
+
+            Returns:
+                `concurrent.futures.Future` resolving to (status, status_name, failure_message)
+        """
+        with self._condition:
+            if self._closed:
+                raise Exception('Tracker is closed')
+            future = self._futures.get(ingest_id)
+            if future is None:
+                future = concurrent.futures.Future()
+                self._futures[ingest_id] = future
+                self._schedule(ingest_id, self.initial_interval)
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+    def wait(self, ingest_ids, timeout=None):
+        """ Track ingests and block until all of them are processed
+            Returns:
+                list of (status, status_name, failure_message) in the order of `ingest_ids`
+        """
+        futures = [self.track(ingest_id) for ingest_id in ingest_ids]
+        concurrent.futures.wait(futures, timeout)
+        return [future.result(0) for future in futures]
+
+    def close(self):
+        """Stop polling, futures of ingests still being processed are cancelled"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        self._executor.shutdown()
+        with self._condition:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+
+    def _schedule(self, ingest_id, interval):
+        heapq.heappush(self._due, (time.monotonic() + interval, next(self._sequence), ingest_id, interval))
+        self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and (not self._due or self._due[0][0] > time.monotonic()):
+                    self._condition.wait(self._due[0][0] - time.monotonic() if self._due else None)
+                if self._closed:
+                    return
+                _, _, ingest_id, interval = heapq.heappop(self._due)
+            self._polls.acquire()
+            self._executor.submit(self._poll, ingest_id, interval)
+
+    def _poll(self, ingest_id, interval):
+        try:
+            resp = retry(lambda _: _get_status(self.token, ingest_id, self.session), INGEST_RETRIES)
+        except Exception as e:
+            self._finish(ingest_id, exception=e)
+            return
+        finally:
+            self._polls.release()
+
+        if _is_terminal(resp['status']):
+            self._finish(ingest_id, result=_status_result(resp))
+            return
+        with self._condition:
+            if not self._closed:
+                self._schedule(ingest_id, min(self.max_interval, interval * self.backoff))
+
+    def _finish(self, ingest_id, result=None, exception=None):
+        with self._condition:
+            future = self._futures.pop(ingest_id, None)
+        if future is None:
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
@@ -0,0 +1,117 @@
+"""Persistent queue of local files waiting to be ingested"""
+import os
+import sqlite3
+import threading
+import time
+
+PENDING = 'pending'
+UPLOADING = 'uploading'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    stream TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    state TEXT NOT NULL,
+    ready_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    size INTEGER,
+    ingest_id TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS files_ready ON files (state, ready_at);
+"""
+
+
+class IngestQueue(object):
+    """SQLite backed queue of files to ingest, surviving restarts of the uploader
+
+    A file becomes available once its `ready_at` time has passed, which lets
+    files that are still being written settle and failed uploads back off.
+    Files taken by an uploader that did not finish (e.g. the process was
+    killed) are made pending again when the queue is opened.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(_SCHEMA)
+        self._db.execute('UPDATE files SET state = ? WHERE state = ?', (PENDING, UPLOADING))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def add(self, entries, delay=0):
+        """Queue (path, stream, timestamp) entries available in `delay` seconds
+
+        A file already queued is only delayed further while it is still pending
+        (it was modified again), files done or failed are left as they are.
+
+        Returns:
+            Number of entries newly queued
+        """
+        ready_at = time.time() + delay
+        rows = [(os.path.abspath(path), stream, timestamp, PENDING, ready_at) for path, stream, timestamp in entries]
+        with self._lock:
+            before = self._db.total_changes
+            self._db.execute('BEGIN')
+            self._db.executemany('INSERT OR IGNORE INTO files (path, stream, timestamp, state, ready_at) '
+                                 'VALUES (?, ?, ?, ?, ?)', rows)
+            added = self._db.total_changes - before
+            self._db.executemany('UPDATE files SET ready_at = ? WHERE path = ? AND state = ?',
+                                 [(ready_at, row[0], PENDING) for row in rows])
+            self._db.execute('COMMIT')
+        return added
+
+    def contains(self, path):
+        with self._lock:
+            row = self._db.execute('SELECT 1 FROM files WHERE path = ?', (os.path.abspath(path),)).fetchone()
+        return row is not None
+
+    def claim(self):
+        """Take the next ready file, marking it as uploading
+
+        Returns:
+            (path, stream, timestamp, attempts) or None if no file is ready
+        """
+        with self._lock:
+            row = self._db.execute('SELECT path, stream, timestamp, attempts FROM files '
+                                   'WHERE state = ? AND ready_at <= ? ORDER BY ready_at LIMIT 1',
+                                   (PENDING, time.time())).fetchone()
+            if row is not None:
+                self._db.execute('UPDATE files SET state = ? WHERE path = ?', (UPLOADING, row[0]))
+        return row
+
+    def next_ready_at(self):
+        """Time the next pending file becomes ready, or None if nothing is pending"""
+        with self._lock:
+            row = self._db.execute('SELECT MIN(ready_at) FROM files WHERE state = ?', (PENDING,)).fetchone()
+        return row[0]
+
+    def complete(self, path, ingest_id, size):
+        with self._lock:
+            self._db.execute('UPDATE files SET state = ?, ingest_id = ?, size = ?, error = NULL, '
+                             'attempts = attempts + 1 WHERE path = ?', (DONE, ingest_id, size, path))
+
+    def fail(self, path, error, retry_in=None):
+        """Record a failed upload, queueing it again in `retry_in` seconds (or giving up if None)"""
+        with self._lock:
+            if retry_in is None:
+                self._db.execute('UPDATE files SET state = ?, error = ?, attempts = attempts + 1 WHERE path = ?',
+                                 (FAILED, error, path))
+            else:
+                self._db.execute('UPDATE files SET state = ?, error = ?, attempts = attempts + 1, ready_at = ? '
+                                 'WHERE path = ?', (PENDING, error, time.time() + retry_in, path))
+
+    def counts(self):
+        """Number of files in each state"""
+        with self._lock:
+            rows = self._db.execute('SELECT state, COUNT(*) FROM files GROUP BY state').fetchall()
+        counts = {PENDING: 0, UPLOADING: 0, DONE: 0, FAILED: 0}
+        counts.update(rows)
+        return counts
@@ -0,0 +1,90 @@
+"""On-disk record of ingest uploads so interrupted runs can resume"""
+import json
+import os
+import threading
+import time
+
+REQUESTED = 'requested'
+UPLOADED = 'uploaded'
+
+
+class IngestJournal(object):
+    """Append-only JSON-lines journal of the uploads requested and completed for local files
+
+    Each line records the stream, file path, size, modification time and
+    SHA-1 checksum of a file together with the upload id and signed url
+    obtained for it, when the upload was requested and whether the file was
+    fully uploaded. The last line for a (stream, file) pair wins.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}
+        self._uploaded = {}
+        self._checksums = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Last line may be incomplete if a previous run was killed while writing it
+                    continue
+                self._add(entry)
+
+    def _add(self, entry):
+        self._entries[(entry['stream'], entry['path'])] = entry
+        if entry.get('sha1') is not None:
+            self._checksums[entry['path']] = entry
+            if entry['state'] == UPLOADED:
+                self._uploaded[(entry['stream'], entry['sha1'])] = entry
+
+    @staticmethod
+    def _matches(entry, filepath):
+        if entry is None or not os.path.exists(filepath):
+            return False
+        stat = os.stat(filepath)
+        return entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime
+
+    def get(self, stream_id, filepath):
+        """Latest entry for the file, or None if the file is unknown or changed since it was recorded"""
+        entry = self._entries.get((stream_id, os.path.abspath(filepath)))
+        return entry if self._matches(entry, filepath) else None
+
+    def checksum(self, filepath):
+        """Recorded checksum of the file, or None if it is unknown or the file changed since"""
+        entry = self._checksums.get(os.path.abspath(filepath))
+        return entry['sha1'] if self._matches(entry, filepath) else None
+
+    def find_uploaded(self, stream_id, checksum):
+        """Entry of a file with the same content already uploaded to the stream, or None"""
+        return self._uploaded.get((stream_id, checksum))
+
+    def record(self, stream_id, filepath, timestamp, upload_id, url, state, requested=None, checksum=None):
+        stat = os.stat(filepath)
+        entry = {
+            'stream': stream_id,
+            'path': os.path.abspath(filepath),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'timestamp': timestamp,
+            'uploadId': upload_id,
+            'url': url,
+            'requested': requested if requested is not None else time.time(),
+            'state': state,
+            'sha1': checksum
+        }
+        line = json.dumps(entry) + '\n'
+        with self._lock:
+            self._add(entry)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        return entry
+
+    def forget(self, stream_id, filepath):
+        with self._lock:
+            self._entries.pop((stream_id, os.path.abspath(filepath)), None)
@@ -0,0 +1,53 @@
+"""On-disk record of completed segment downloads"""
+import json
+import os
+import threading
+
+MANIFEST_FILENAME = '.rfcx_manifest.jsonl'
+
+
+class Manifest(object):
+    """Append-only JSON-lines manifest of the segments downloaded under `dest_path`
+
+    Each line records the stream, segment start, file path (relative to
+    `dest_path`), size and SHA-1 checksum of a completed download.
+    """
+
+    def __init__(self, dest_path):
+        self.dest_path = dest_path
+        self.path = os.path.join(dest_path, MANIFEST_FILENAME)
+        self._entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Last line may be incomplete if a previous run was killed while writing it
+                    continue
+                self._entries[(entry['stream'], entry['start'])] = entry
+
+    def is_complete(self, stream_id, start, local_path):
+        """Whether the segment was downloaded before and the file on disk still matches the recorded size"""
+        entry = self._entries.get((stream_id, start))
+        if entry is None or entry['path'] != os.path.relpath(local_path, self.dest_path):
+            return False
+        return os.path.exists(local_path) and os.path.getsize(local_path) == entry['size']
+
+    def record(self, stream_id, start, local_path, size, checksum):
+        entry = {
+            'stream': stream_id,
+            'start': start,
+            'path': os.path.relpath(local_path, self.dest_path),
+            'size': size,
+            'sha1': checksum
+        }
+        line = json.dumps(entry) + '\n'
+        with self._lock:
+            self._entries[(stream_id, start)] = entry
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
@@ -0,0 +1,30 @@
+"""Lazy iteration over offset paged endpoints"""
+import concurrent.futures
+
+
+def iterate(fetch_page, page_size=1000, offset=0, strict=False):
+    """Yield the items of every page returned by `fetch_page(limit, offset)`
+
+    The next page is requested in the background while the current page is
+    consumed, so at most two pages are held in memory. Paging stops on an
+    empty (or failed) page or on a page shorter than `page_size`. With
+    `strict` a failed page (None) raises instead, for callers that must not
+    mistake a failure for the end of the data.
+    """
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    try:
+        future = executor.submit(fetch_page, page_size, offset)
+        while future is not None:
+            page = future.result()
+            if page is None and strict:
+                raise Exception(f'Failed to get the page at offset {offset}')
+            if not page:
+                return
+            if len(page) < page_size:
+                future = None
+            else:
+                offset = offset + page_size
+                future = executor.submit(fetch_page, page_size, offset)
+            yield from page
+    finally:
+        executor.shutdown(wait=False)
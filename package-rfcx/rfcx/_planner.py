@@ -0,0 +1,62 @@
+"""Parallel queries over time windows that adapt to the density of the results"""
+import collections
+import concurrent.futures
+import datetime
+import rfcx._paging as paging
+import rfcx._util as util
+
+PLANNER_PAGE_SIZE = 1000
+PLANNER_WORKERS = 8
+PLANNER_INITIAL_WINDOW = datetime.timedelta(days=1)
+PLANNER_MIN_WINDOW = datetime.timedelta(minutes=1)
+
+
+def iterate(fetch_page, start, end, page_size=PLANNER_PAGE_SIZE, max_workers=PLANNER_WORKERS,
+            initial_window=PLANNER_INITIAL_WINDOW, min_window=PLANNER_MIN_WINDOW):
+    """Yield the items (with a `start` time) of `start` to `end`, querying time windows in parallel
+
+    `fetch_page(lower, upper, limit, offset)` returns one page of the items of
+    a window. The range is split into `initial_window` long windows, and up to
+    `max_workers` of them are requested ahead of the consumer. A window whose
+    first page is full is split in two halves instead of being paged by
+    offset, until windows are `min_window` long (those are paged). An item is
+    kept in the window it starts in, items are yielded in time order.
+
+    Raises:
+        Exception: if a page of a window cannot be fetched (`fetch_page` returned None).
+    """
+    start = util.parse_date(start)
+    end = util.parse_date(end)
+    windows = collections.deque(util.time_shards(start, end, initial_window))
+    pending = collections.deque()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit(window):
+        return window, executor.submit(fetch_page, window[0], window[1], page_size, 0)
+
+    try:
+        while windows or pending:
+            while windows and len(pending) < max_workers:
+                pending.append(submit(windows.popleft()))
+
+            window, future = pending.popleft()
+            lower, upper = window
+            items = future.result()
+            if items is None:
+                raise Exception(f'Failed to get the items from {lower} to {upper}')
+            if len(items) >= page_size:
+                if upper - lower > min_window:
+                    # Too dense for a single page, query both halves (before any later window)
+                    middle = lower + (upper - lower) / 2
+                    pending.appendleft(submit((middle, upper)))
+                    pending.appendleft(submit((lower, middle)))
+                    continue
+                items = items + list(paging.iterate(lambda limit, offset: fetch_page(lower, upper, limit, offset),
+                                                    page_size, offset=page_size, strict=True))
+
+            items = util.starts_in_shard(items, window, start, end)
+            yield from sorted(items, key=lambda item: util.parse_date(item['start']))
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
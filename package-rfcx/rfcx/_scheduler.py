@@ -0,0 +1,258 @@
+"""Adaptive concurrency, retry backoff and fair queueing for bulk requests"""
+import collections
+import contextlib
+import datetime
+import email.utils
+import random
+import threading
+import time
+import requests
+from six.moves import urllib
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+DEFAULT_MAX_CONCURRENCY = 100
+DEFAULT_INITIAL_CONCURRENCY = 8
+
+
+class RetryableStatusError(Exception):
+    """Response status that is worth retrying (throttled or temporary server error)"""
+
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.retry_after = retry_after
+        super().__init__(f'HTTP status {status_code}')
+
+
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                    RetryableStatusError)
+
+
+def backoff(attempt, base=0.5, cap=60):
+    """Exponential backoff delay with full jitter for a retry `attempt` (starting at 0)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry(fn, retries, errors=TRANSIENT_ERRORS):
+    """Call `fn(attempt)` until it succeeds, sleeping with jittered backoff (or `Retry-After`) between attempts
+
+    The last error is raised once `retries` retries have failed.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return fn(attempt)
+        except errors as e:
+            if attempt == retries:
+                raise
+            retry_after = getattr(e, 'retry_after', None) or 0
+            time.sleep(max(retry_after, backoff(attempt)))
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a `Retry-After` header (delay in seconds or HTTP date)"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class AdaptiveLimiter(object):
+    """AIMD concurrency limit for a single host
+
+    The limit grows by one after a full window of uncongested requests and is
+    halved (at most once per round trip) when a request is throttled, fails
+    with a server or connection error, or takes much longer than the best
+    latency seen. A `Retry-After` pauses new requests for that long.
+    """
+
+    def __init__(self, initial=DEFAULT_INITIAL_CONCURRENCY, minimum=1, maximum=DEFAULT_MAX_CONCURRENCY,
+                 latency_tolerance=3.0):
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._baseline_latency = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause <= 0 and self._in_flight < int(self.limit):
+                    break
+                self._condition.wait(pause if pause > 0 else None)
+            self._in_flight += 1
+
+    def release(self, latency=None, congested=False, retry_after=None):
+        with self._condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if latency is not None and not congested:
+                if self._baseline_latency is None or latency < self._baseline_latency:
+                    self._baseline_latency = latency
+                elif latency > self.latency_tolerance * self._baseline_latency:
+                    congested = True
+                else:
+                    # Let the baseline follow slow drifts of the network
+                    self._baseline_latency = self._baseline_latency * 1.01
+
+            if congested:
+                if now - self._last_decrease > (self._baseline_latency or 1.0):
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            self._condition.notify_all()
+
+
+class _Slot(object):
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latency = None
+        self.congested = False
+        self.retry_after = None
+
+    def observe(self, response):
+        """Record latency (time to response headers), throttling and `Retry-After` of a response"""
+        self.latency = time.monotonic() - self.started
+        self.congested = response.status_code in RETRY_STATUSES
+        self.retry_after = parse_retry_after(response.headers.get('Retry-After'))
+
+
+class Scheduler(object):
+    """Adaptive per-host concurrency limits for bulk requests
+
+    Args:
+        max_concurrency: Ceiling for the number of requests in flight to a single host.
+        max_per_host: (optional) Lower ceiling for specific hosts, as a dict of host to limit.
+        initial_concurrency: Concurrency each host starts with before adapting.
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, max_per_host=None,
+                 initial_concurrency=DEFAULT_INITIAL_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host or {}
+        self.initial_concurrency = initial_concurrency
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, url):
+        host = urllib.parse.urlparse(url).netloc
+        with self._lock:
+            if host not in self._limiters:
+                maximum = min(self.max_concurrency, self.max_per_host.get(host, self.max_concurrency))
+                self._limiters[host] = AdaptiveLimiter(self.initial_concurrency, maximum=maximum)
+            return self._limiters[host]
+
+    @contextlib.contextmanager
+    def slot(self, url):
+        """Wait for a free slot for `url`, call `observe(response)` on the yielded slot once headers arrive
+
+        Exceptions other than `RetryableStatusError` (e.g. connection resets) count as congestion.
+        """
+        limiter = self.limiter(url)
+        limiter.acquire()
+        slot = _Slot()
+        try:
+            yield slot
+        except RetryableStatusError:
+            limiter.release(slot.latency, slot.congested, slot.retry_after)
+            raise
+        except Exception:
+            limiter.release(congested=True)
+            raise
+        except BaseException:
+            limiter.release()
+            raise
+        else:
+            limiter.release(slot.latency, slot.congested, slot.retry_after)
+
+
+class FairQueue(object):
+    """Round-robin work queue across keys (e.g. streams) with a bounded backlog per key
+
+    `get` takes items from each key in turn so that one large key cannot starve
+    the others. Producers `close` their key when done, `get` returns None once
+    every key is closed and drained. Items put after a key is closed are dropped.
+    Producers that must not block on a full backlog check `full` and ask to be
+    called back with `notify_when_room`.
+    """
+
+    def __init__(self, keys, maxsize=1000):
+        self._items = {key: collections.deque() for key in keys}
+        self._open = set(self._items)
+        self._turn = collections.deque(self._items)
+        self._maxsize = maxsize
+        self._waiting = {}
+        self._condition = threading.Condition()
+
+    def put(self, key, item):
+        """Add an item for `key`, waiting while its backlog is full. Returns False if the key was closed"""
+        with self._condition:
+            while len(self._items[key]) >= self._maxsize and key in self._open:
+                self._condition.wait()
+            if key not in self._open:
+                return False
+            self._items[key].append(item)
+            self._condition.notify_all()
+            return True
+
+    def full(self, key):
+        with self._condition:
+            return len(self._items[key]) >= self._maxsize
+
+    def notify_when_room(self, key, callback):
+        """Call `callback()` once the backlog of `key` has room (right away if it has), never if the key is closed"""
+        with self._condition:
+            if key not in self._open:
+                return
+            if len(self._items[key]) >= self._maxsize:
+                self._waiting[key] = callback
+                return
+        callback()
+
+    def close(self, key):
+        with self._condition:
+            self._open.discard(key)
+            self._waiting.pop(key, None)
+            self._condition.notify_all()
+
+    def get(self):
+        """Next (key, item) pair in round-robin order, or None when all keys are exhausted"""
+        callback = None
+        with self._condition:
+            while True:
+                for _ in range(len(self._turn)):
+                    key = self._turn.popleft()
+                    items = self._items[key]
+                    if items:
+                        self._turn.append(key)
+                        self._condition.notify_all()
+                        result = key, items.popleft()
+                        callback = self._waiting.pop(key, None)
+                        break
+                    if key in self._open:
+                        self._turn.append(key)
+                else:
+                    if not self._turn:
+                        return None
+                    self._condition.wait()
+                    continue
+                break
+        # Outside of the lock, the callback may put items
+        if callback is not None:
+            callback()
+        return result
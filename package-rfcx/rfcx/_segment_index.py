@@ -0,0 +1,134 @@
+"""Local index of the segments of streams for incremental listing"""
+import datetime
+import json
+import sqlite3
+import threading
+import rfcx._util as util
+
+# Segments can be ingested a while after they were recorded, the end of the covered range is listed again
+SYNC_OVERLAP = datetime.timedelta(hours=1)
+INSERT_BATCH_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    stream TEXT NOT NULL,
+    start_key TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    PRIMARY KEY (stream, start_key)
+);
+CREATE TABLE IF NOT EXISTS coverage (
+    stream TEXT PRIMARY KEY,
+    low TEXT NOT NULL,
+    high TEXT NOT NULL
+);
+"""
+
+
+def _key(date):
+    return date.isoformat(timespec='milliseconds')
+
+
+class SegmentIndex(object):
+    """SQLite index of known segments per stream, keyed by start time
+
+    For each stream the index records the time range it has fully listed.
+    `sync` only lists the parts of a requested range outside of it (plus
+    `overlap` before its end, to pick up late uploads), so repeated syncs of
+    a growing range cost time proportional to the new data.
+    """
+
+    def __init__(self, path, overlap=SYNC_OVERLAP):
+        self.path = path
+        self.overlap = overlap
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def coverage(self, stream_id):
+        """Fully listed (start, end) range of the stream as naive UTC datetimes, or None"""
+        with self._lock:
+            row = self._db.execute('SELECT low, high FROM coverage WHERE stream = ?', (stream_id,)).fetchone()
+        if row is None:
+            return None
+        return datetime.datetime.fromisoformat(row[0]), datetime.datetime.fromisoformat(row[1])
+
+    def missing_ranges(self, stream_id, start, end):
+        """Ranges of `start` to `end` that have to be listed, and the coverage once they are"""
+        covered = self.coverage(stream_id)
+        if covered is None or end < covered[0] or start > covered[1]:
+            return [(start, end)], (start, end)
+        low, high = covered
+        ranges = []
+        if start < low:
+            ranges.append((start, low))
+        if end > high - self.overlap:
+            ranges.append((max(start, high - self.overlap), end))
+        return ranges, (min(start, low), max(end, high))
+
+    def add(self, stream_id, segments):
+        rows = [(stream_id, _key(util.parse_date(segment['start'])), json.dumps(segment)) for segment in segments]
+        with self._lock:
+            self._db.execute('BEGIN')
+            self._db.executemany('INSERT OR REPLACE INTO segments VALUES (?, ?, ?)', rows)
+            self._db.execute('COMMIT')
+        return len(rows)
+
+    def set_coverage(self, stream_id, start, end):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO coverage VALUES (?, ?, ?)', (stream_id, _key(start), _key(end)))
+
+    def segments(self, stream_id, start, end):
+        """Indexed segments of the stream starting within `start` and `end`, in time order
+
+        Like a listing of the range, the segment starting before `start` is included when it overlaps it.
+        """
+        start = util.parse_date(start)
+        with self._lock:
+            before = self._db.execute('SELECT segment FROM segments WHERE stream = ? AND start_key < ? '
+                                      'ORDER BY start_key DESC LIMIT 1', (stream_id, _key(start))).fetchall()
+            rows = self._db.execute('SELECT segment FROM segments WHERE stream = ? AND start_key >= ? '
+                                    'AND start_key <= ? ORDER BY start_key',
+                                    (stream_id, _key(start), _key(util.parse_date(end)))).fetchall()
+        segments = [json.loads(row[0]) for row in before + rows]
+        if before and util.parse_date(segments[0]['end']) <= start:
+            segments = segments[1:]
+        return segments
+
+    def sync(self, stream_id, start, end, list_segments):
+        """List the segments of `start` to `end` that are not covered by the index yet
+
+        Args:
+            stream_id: Stream to sync.
+            start: Start of the range (datetime or iso string).
+            end: End of the range (datetime or iso string), capped to now.
+            list_segments: Function listing the segments of a stream in a range, `list_segments(stream_id, start, end)`.
+                It must raise if it cannot list the whole range.
+
+        Returns:
+            Number of segments listed.
+
+        Raises:
+            Exception: if a listing fails, the coverage is then left unchanged so that the range is listed again.
+        """
+        start = util.parse_date(start)
+        end = min(util.parse_date(end), datetime.datetime.utcnow())
+        if end <= start:
+            return 0
+        ranges, covered = self.missing_ranges(stream_id, start, end)
+        count = 0
+        for lower, upper in ranges:
+            batch = []
+            for segment in list_segments(stream_id, lower, upper):
+                batch.append(segment)
+                if len(batch) >= INSERT_BATCH_SIZE:
+                    count += self.add(stream_id, batch)
+                    batch = []
+            count += self.add(stream_id, batch)
+        # Only once every missing range was listed in full
+        self.set_coverage(stream_id, *covered)
+        return count
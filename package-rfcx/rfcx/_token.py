@@ -0,0 +1,126 @@
+"""Keep the token of long running clients fresh"""
+import datetime
+import logging
+import threading
+import requests
+
+logger = logging.getLogger(__name__)
+
+REFRESH_MARGIN = datetime.timedelta(minutes=5)
+REFRESH_RETRY_DELAY = 60
+
+BEARER_PREFIX = 'Bearer '
+
+
+class TokenManager(object):
+    """Current credentials of a client, refreshed in the background before they expire
+
+    Reading `token` never does I/O. A timer refreshes the credentials
+    `refresh_margin` before `token_expiry`, and `refresh` can be called when a
+    request is rejected. Refreshes are single-flight: callers that hit an
+    expired token at the same time wait for one refresh instead of each
+    starting their own.
+
+    Args:
+        credentials: Current `Credentials`.
+        authentication: (optional) `Authentication` able to `refresh` them. If None the credentials are never refreshed.
+        refresh_margin: (optional, default=5 minutes) How long before expiry the credentials are refreshed.
+    """
+
+    def __init__(self, credentials, authentication=None, refresh_margin=REFRESH_MARGIN):
+        self.credentials = credentials
+        self.authentication = authentication
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._timer = None
+        self._closed = False
+        self._schedule()
+
+    @property
+    def token(self):
+        return self.credentials.token
+
+    def close(self):
+        """Stop refreshing in the background"""
+        with self._lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def refresh(self, stale_token=None):
+        """Refresh the credentials, unless they changed since `stale_token` was read (someone else refreshed)
+
+        Returns:
+            The current token.
+        """
+        if self.authentication is None:
+            return self.token
+        with self._lock:
+            if stale_token is None or stale_token == self.credentials.token:
+                self.credentials = self.authentication.refresh()
+                logger.info('Token refreshed, expires at %s', self.credentials.token_expiry)
+        self._schedule()
+        return self.token
+
+    def _schedule(self, delay=None):
+        expiry = self.credentials.token_expiry
+        if self.authentication is None or (expiry is None and delay is None):
+            return
+        if delay is None:
+            delay = (expiry - self.refresh_margin - datetime.datetime.utcnow()).total_seconds()
+        with self._lock:
+            if self._closed:
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(max(0.0, delay), self._refresh_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh(self.token)
+        except Exception as e:
+            logger.error('Token refresh failed: %s', e)
+            self._schedule(REFRESH_RETRY_DELAY)
+
+
+class BearerAuth(requests.auth.AuthBase):
+    """Session auth that puts the current token in requests sent with a `Bearer` authorization header
+
+    Requests without one, like uploads to signed urls, are left untouched. A
+    request rejected with 401 refreshes the token once and is sent again.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    def __call__(self, request):
+        if request.headers.get('Authorization', '').startswith(BEARER_PREFIX):
+            request.headers['Authorization'] = BEARER_PREFIX + self.tokens.token
+            request.register_hook('response', self._handle_401)
+        return request
+
+    def _handle_401(self, response, **kwargs):
+        request = response.request
+        replayable = request.body is None or isinstance(request.body, (bytes, str))
+        if response.status_code != 401 or getattr(request, '_token_replayed', False) or not replayable:
+            return response
+
+        stale_token = request.headers['Authorization'][len(BEARER_PREFIX):]
+        token = self.tokens.refresh(stale_token)
+        if token == stale_token:
+            return response
+
+        # Release the connection before sending the request again
+        response.content
+        response.close()
+        replay = request.copy()
+        replay.headers['Authorization'] = BEARER_PREFIX + token
+        replay._token_replayed = True
+        replay.hooks['response'] = []
+        new_response = response.connection.send(replay, **kwargs)
+        new_response.history.append(response)
+        new_response.request = replay
+        return new_response
@@ -1,4 +1,18 @@
+import collections
+import concurrent.futures
 import datetime
+import hashlib
+import itertools
+import os
+import re
+
+CHECKSUM_BLOCK_SIZE = 1024 * 1024
+
+_DIRECTIVE_PATTERNS = {
+    'Y': r'\d{4}', 'y': r'\d{2}', 'm': r'\d{2}', 'd': r'\d{2}', 'H': r'\d{2}', 'I': r'\d{2}',
+    'M': r'\d{2}', 'S': r'\d{2}', 'f': r'\d{1,6}', 'j': r'\d{3}', 'p': r'[AaPp][Mm]',
+    'b': r'[A-Za-z]{3}', 'z': r'(?:[+-]\d{4}|Z)', '%': '%'
+}
 
 
 def date_before(days=30):
@@ -13,3 +27,90 @@ def date_now():
 def date_after(seconds):
     delta = datetime.timedelta(seconds=seconds)
     return delta + datetime.datetime.utcnow()
+
+
+def parse_date(value):
+    """Parse a datetime or RFCx iso string (e.g. `2021-04-01T00:00:00.000Z`) into a naive UTC datetime"""
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def time_shards(start, end, step):
+    """Split the `start` to `end` datetime range into consecutive (start, end) pairs of at most `step` long"""
+    shards = []
+    lower = start
+    while True:
+        upper = min(lower + step, end)
+        shards.append((lower, upper))
+        if upper >= end:
+            return shards
+        lower = upper
+
+
+def starts_in_shard(items, shard, start, end):
+    """Items (with a `start` time) returned for a shard that start within it
+
+    Queries return items overlapping a shard boundary for both shards, each is
+    kept in the shard it starts in (except at the `start` and `end` of the range).
+    """
+    lower, upper = shard
+    return [item for item in items
+            if (lower == start or parse_date(item['start']) >= lower)
+            and (upper == end or parse_date(item['start']) < upper)]
+
+
+def ordered_map(fn, items, max_workers):
+    """Like `map` but calls `fn` in a thread pool, computing at most `max_workers` results ahead of the consumer"""
+    items = iter(items)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = collections.deque(
+            executor.submit(fn, item) for item in itertools.islice(items, max_workers))
+        try:
+            while pending:
+                result = pending.popleft().result()
+                for item in itertools.islice(items, 1):
+                    pending.append(executor.submit(fn, item))
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def file_sha1(filepath, block_size=CHECKSUM_BLOCK_SIZE):
+    """SHA-1 hex digest of a file, read in `block_size` blocks"""
+    checksum = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+def timestamp_regex(date_format):
+    """Compile a `strptime` format (e.g. `%Y%m%d_%H%M%S`) into a regex finding such a timestamp within a string"""
+    pattern = ''
+    parts = re.split(r'(%.)', date_format)
+    for part in parts:
+        if len(part) == 2 and part[0] == '%':
+            if part[1] not in _DIRECTIVE_PATTERNS:
+                raise ValueError(f'Unsupported directive {part} in {date_format}')
+            pattern += _DIRECTIVE_PATTERNS[part[1]]
+        else:
+            pattern += re.escape(part)
+    return re.compile(r'(?<!\d)' + pattern + r'(?!\d)')
+
+
+def parse_filename_timestamp(filepath, date_formats):
+    """Find a timestamp in the file name matching one of `date_formats`, as a naive UTC datetime (or None)"""
+    filename = os.path.basename(filepath)
+    for date_format in date_formats:
+        match = timestamp_regex(date_format).search(filename)
+        if match is None:
+            continue
+        try:
+            return parse_date(datetime.datetime.strptime(match.group(0), date_format))
+        except ValueError:
+            continue
+    return None
@@ -0,0 +1,271 @@
+"""RFCx asyncio client"""
+import asyncio
+import datetime
+import os
+import rfcx._async as async_api
+import rfcx._http as http
+import rfcx._util as util
+from rfcx._authentication import Authentication
+from rfcx._token import TokenManager
+
+DEFAULT_MAX_CONCURRENCY = 100
+
+
+class AsyncClient(object):
+    """Authenticate and perform non-blocking requests against the RFCx/Arbimon platform
+
+    All requests share one aiohttp connection pool and at most `max_concurrency`
+    of them are in flight at once. Use it as an async context manager (or call
+    `close`) to release the connections. Requires `pip install rfcx[async]`.
+    """
+
+    def __init__(self, pool_size=http.DEFAULT_POOL_SIZE, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """Create a client
+
+        Args:
+            pool_size: (optional, default=100) Maximum number of keep-alive connections shared by all requests from this client.
+            max_concurrency: (optional, default=100) Maximum number of requests in flight at once.
+        """
+        if async_api.aiohttp is None:
+            raise ImportError('AsyncClient requires aiohttp, install it with `pip install rfcx[async]`')
+        self.tokens = None
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """Close all pooled connections held by the client and stop refreshing its token"""
+        if self.tokens is not None:
+            self.tokens.close()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def authenticate(self,
+                     persist=True,
+                     persisted_credentials_path='.rfcx_credentials'):
+        """Authenticate an RFCx/Arbimon user to obtain a token (blocking, call it once at startup)
+
+        The token is refreshed in the background before it expires, and a request rejected
+        with 401 refreshes it and is sent again, so long running clients keep working.
+
+        Args:
+            persist: (optional, default= True) Should save the user token to the filesystem.
+            persisted_credentials_path: (optional, default= '.rfcx_credentials') File path for saving user token.
+
+        Returns:
+            None.
+        """
+        auth = Authentication(persist, persisted_credentials_path)
+        auth.authenticate()
+        self.credentials = None
+        self.tokens = TokenManager(auth.credentials, auth)
+
+    @property
+    def credentials(self):
+        return self.tokens.credentials if self.tokens is not None else None
+
+    @credentials.setter
+    def credentials(self, credentials):
+        if self.tokens is not None:
+            self.tokens.close()
+        self.tokens = TokenManager(credentials) if credentials is not None else None
+
+    def _get_session(self):
+        # aiohttp sessions and semaphores belong to the running event loop, so create them on first use
+        if self._session is None:
+            self._session = async_api.create_session(self.pool_size)
+            self._semaphore = asyncio.BoundedSemaphore(self.max_concurrency)
+        return self._session
+
+    async def stream_segments(self,
+                              stream,
+                              start=None,
+                              end=None,
+                              limit=50,
+                              offset=0):
+        """Retrieve audio information about a specific stream
+
+        Args:
+            stream: (required) Identifies a stream/site.
+            start: (optional, default=None) Minimum timestamp of the audio. If None then defaults to exactly 30 days ago.
+            end: (optional, default=None) Maximum timestamp of the audio. If None then defaults to now.
+            limit: (optional, default=50) Maximum results to return. Defaults to 50.
+            offset: (optional, default=0) Offset of the audio group.
+
+        Returns:
+            List of audio files contains id, start, end, and file extensions (meta data showing audio id and recorded timestamp).
+        """
+        if self.credentials is None:
+            print('Not authenticated')
+            return
+
+        if stream is None:
+            print('Require stream id')
+            return
+
+        if start is None:
+            start = util.date_before()
+        if end is None:
+            end = util.date_now()
+
+        session = self._get_session()
+        async with self._semaphore:
+            return await async_api.stream_segments(session, self.tokens, stream,
+                                                   async_api._generate_date_in_isoformat(start),
+                                                   async_api._generate_date_in_isoformat(end),
+                                                   limit, offset)
+
+    async def detections(self,
+                         min_date=None,
+                         max_date=None,
+                         classifications=None,
+                         classifiers=None,
+                         streams=None,
+                         min_confidence=None,
+                         limit=50,
+                         offset=0):
+        """Retrieve a list of detections
+
+        Args:
+            min_date: (optional, default=None) Minimum timestamp of the audio. If None then defaults to exactly 30 days ago.
+            max_date: (optional, default=None) Maximum timestamp of the audio. If None then defaults to now.
+            classifications: (optional, default=None) List of classification names e.g. orca, chainsaw.
+            classifiers: (optional, default=None) List of classifier ids (integer) e.g. 93, 94.
+            streams: (optional, default=None) List of stream ids.
+            min_confidence (optional, default=None): Return the detection which equal or greater than given value. If None, it will use default in event strategy.
+            limit: (optional, default=50) Maximum number of results to be return. The maximum value is 1000.
+            offset: (optional, default=0) Number of results to skip.
+
+        Returns:
+            List of detections contains stream_id, start, end, confidence, and classification.
+        """
+
+        if limit > 1000:
+            raise Exception("Please give the value <= 1000")
+
+        if min_date is None:
+            min_date = util.date_before()
+        if max_date is None:
+            max_date = util.date_now()
+
+        session = self._get_session()
+        async with self._semaphore:
+            return await async_api.detections(session, self.tokens,
+                                              async_api._generate_date_in_isoformat(min_date),
+                                              async_api._generate_date_in_isoformat(max_date),
+                                              classifications, classifiers, streams,
+                                              min_confidence, limit, offset)
+
+    async def download_segment(self,
+                               stream,
+                               dest_path,
+                               start_time,
+                               file_ext):
+        """ Download single audio file (stream segment).
+        Args:
+            stream: (required) Identifier for stream/site
+            dest_path: (required) Directory/folder path to save the file
+            start_time: (required) Exact start timestamp (string or datetime) of the segment
+            file_ext: (optional, default='wav') Audio file extension. Default to `wav`
+        Returns:
+            Path to downloaded file.
+        """
+        if not os.path.exists(dest_path):
+            os.makedirs(dest_path)
+
+        session = self._get_session()
+        async with self._semaphore:
+            return await async_api.download_segment(session, self.tokens, dest_path,
+                                                    stream, start_time, file_ext)
+
+    async def download_segments(self,
+                                stream,
+                                dest_path='./audios',
+                                min_date=None,
+                                max_date=None,
+                                file_ext='wav'):
+        """Download multiple audio in giving time range.
+
+        Segments are downloaded concurrently as soon as they are listed, sharing
+        the client's `max_concurrency` limit. Cancelling the task cancels all
+        outstanding downloads.
+
+        Args:
+            stream: (required) Identifies a stream/site
+            dest_path: (optional, default= './audios') Directory/folder path to save the files
+            min_date: (optional, default=None) Minimum timestamp to get the audio. If None then defaults to 30 days ago.
+            max_date: (optional, default=None) Maximum timestamp to get the audio. If None then defaults to now.
+            file_ext: (optional, default='wav') Audio file extension. Default to `wav`
+
+        Returns:
+            None.
+        """
+        if self.credentials is None:
+            print('Not authenticated')
+            return
+
+        if stream is None:
+            print("stream cannot be None")
+            return
+
+        if min_date is None:
+            min_date = datetime.datetime.utcnow() - datetime.timedelta(days=30)
+
+        if max_date is None:
+            max_date = datetime.datetime.utcnow()
+
+        if not os.path.exists(dest_path):
+            os.makedirs(dest_path)
+
+        session = self._get_session()
+        return await async_api.download_segments(session, self.tokens, dest_path,
+                                                 stream, min_date, max_date, file_ext,
+                                                 self._semaphore)
+
+    async def ingest_file(self, stream, filepath, timestamp):
+        """ Ingest a single audio file
+
+        Args:
+            stream: (required) Identifies a stream/site.
+            filepath: (required) Local file path to be ingest.
+            timestamp: (required) Audio timestamp in datetime type.
+
+        Returns:
+            Ingest identifier
+        """
+
+        if not isinstance(timestamp, datetime.datetime):
+            raise Exception("timestamp is not type datetime")
+
+        iso_timestamp = timestamp.replace(microsecond=0).isoformat() + 'Z'
+
+        session = self._get_session()
+        async with self._semaphore:
+            return await async_api.ingest_file(session, self.tokens, stream, filepath,
+                                               iso_timestamp)
+
+    async def check_ingest(self, ingest_id, wait_for_completion=False):
+        """ Check the status of an ingest
+            Args:
+                ingest_id: (required) Ingest identifier (returned from `ingest_file`)
+                wait_for_completion: (optional, default=False) Keep waiting and checking until file is processed
+
+            Returns:
+                status: 10 is waiting (not yet processed), 20 is success, 3x is failure
+                status_name
+                failure_message
+
+            Raises:
+                Exception: on failed upload or ingest
+        """
+        session = self._get_session()
+        return await async_api.check_ingest(session, self.tokens, ingest_id, self._semaphore,
+                                            wait_for_completion)
@@ -6,20 +6,72 @@ import rfcx._classifiers as classifiers
 import rfcx._ingest as ingest
 import rfcx._util as util
 import rfcx._api_rfcx as api_rfcx
+import rfcx._http as http
+import rfcx._paging as paging
+import rfcx._planner as planner
 from rfcx._authentication import Authentication
+from rfcx._cache import MemoryCache, SQLiteCache
+from rfcx._journal import IngestJournal
+from rfcx._scheduler import Scheduler
+from rfcx._segment_index import SegmentIndex
+from rfcx._token import BearerAuth, TokenManager
 
 
 class Client(object):
     """Authenticate and perform requests against the RFCx/Arbimon platform"""
 
-    def __init__(self):
-        self.credentials = None
+    def __init__(self, pool_size=http.DEFAULT_POOL_SIZE, cache=None, cache_ttls=None):
+        """Create a client
+
+        Args:
+            pool_size: (optional, default=100) Maximum number of keep-alive connections shared by all requests from this client.
+            cache: (optional, default=None) Cache the responses of metadata requests (stream, streams, projects, classifications):
+                True to cache in memory, a file path to cache in a SQLite database shared across runs, or a cache object.
+                If None then nothing is cached.
+            cache_ttls: (optional, default=None) List of (url path regex, seconds) pairs setting how long responses are fresh,
+                merged with the defaults: single streams and projects are fresh for 1 hour, lists for 5 minutes and
+                classifications for 1 day.
+        """
+        # Caches created here are closed with the client, cache objects are left to the caller
+        self._owns_cache = cache is True or isinstance(cache, str)
+        if cache is True:
+            cache = MemoryCache()
+        elif isinstance(cache, str):
+            cache = SQLiteCache(cache)
+        self.tokens = None
+        self.cache = cache
+        self.session = http.create_session(pool_size, cache, cache_ttls)
+
+    def close(self):
+        """Close all pooled connections and the cache database held by the client and stop refreshing its token"""
+        if self.tokens is not None:
+            self.tokens.close()
+        self.session.close()
+        if self._owns_cache and hasattr(self.cache, 'close'):
+            self.cache.close()
+
+    @property
+    def credentials(self):
+        return self.tokens.credentials if self.tokens is not None else None
+
+    @credentials.setter
+    def credentials(self, credentials):
+        self._set_tokens(TokenManager(credentials) if credentials is not None else None)
+
+    def _set_tokens(self, tokens):
+        # The session auth reads the token from the manager, it must follow every change of manager
+        if self.tokens is not None:
+            self.tokens.close()
+        self.tokens = tokens
+        self.session.auth = BearerAuth(tokens) if tokens is not None else None
 
     def authenticate(self,
                      persist=True,
                      persisted_credentials_path='.rfcx_credentials'):
         """Authenticate an RFCx/Arbimon user to obtain a token
 
+        The token is refreshed in the background before it expires, and a request rejected
+        with 401 refreshes it and is sent again, so long running clients keep working.
         If you want to persist/load the credentials to/from a custom path then set `persisted_credentials_path`
         Args:
             persist: (optional, default= True) Should save the user token to the filesystem.
@@ -30,7 +82,7 @@ class Client(object):
         """
         auth = Authentication(persist, persisted_credentials_path)
         auth.authenticate()
-        self.credentials = auth.credentials
+        self._set_tokens(TokenManager(auth.credentials, auth))
 
     def download_segment(self,
                             stream,
@@ -53,7 +105,51 @@ class Client(object):
             os.makedirs(dest_path)
 
         return audio.download_segment(self.credentials.token, dest_path,
-                                         stream, start_time, file_ext)
+                                         stream, start_time, file_ext, self.session)
+
+    def fetch_segment_array(self, stream, start_time, sample_rate=None):
+        """ Download single audio file (stream segment) and decode it in memory, without writing to disk.
+
+        Requires `pip install rfcx[audio]`.
+
+        Args:
+            stream: (required) Identifier for stream/site
+            start_time: (required) Exact start timestamp (string or datetime) of the segment
+            sample_rate: (optional, default=None) Resample the audio to this sample rate. If None then keep the original sample rate.
+
+        Returns:
+            Samples (1-dim float32 numpy array, multi-channel audio is mixed down) and sample rate.
+        """
+        import rfcx._decode as decode  # NumPy loads on first use
+        content = audio.fetch_segment(self.credentials.token, stream, start_time, self.session)
+        return decode.decode(content, sample_rate)
+
+    def fetch_segment_arrays(self, stream, start_times, sample_rate=None, max_workers=8):
+        """ Download and decode audio files (stream segments) in memory, yielding them in order.
+
+        Up to `max_workers` segments are downloaded and decoded ahead of the consumer. Requires `pip install rfcx[audio]`.
+
+        Args:
+            stream: (required) Identifier for stream/site
+            start_times: (required) Exact start timestamps (string or datetime) of the segments, or segments as returned by `stream_segments`
+            sample_rate: (optional, default=None) Resample the audio to this sample rate. If None then keep the original sample rate.
+            max_workers: (optional, default=8) Number of segments fetched in parallel.
+
+        Returns:
+            Generator of (start_time, samples, sample_rate) for each segment.
+        """
+        import rfcx._decode as decode  # NumPy loads on first use
+        scheduler = Scheduler(max_workers)
+
+        def fetch(start_time):
+            if isinstance(start_time, dict):
+                start_time = start_time['start']
+            content = audio.fetch_segment(self.credentials.token, stream, start_time, self.session,
+                                          scheduler)
+            samples, rate = decode.decode(content, sample_rate)
+            return start_time, samples, rate
+
+        return util.ordered_map(fetch, start_times, max_workers)
 
     def download_segments(self,
                              stream,
@@ -61,7 +157,11 @@ class Client(object):
                              min_date=None,
                              max_date=None,
                              file_ext='wav',
-                             parallel=True):
+                             parallel=True,
+                             resume=False,
+                             max_concurrency=100,
+                             max_per_host=None,
+                             index_path=None):
         """Download multiple audio in giving time range.
 
         Args:
@@ -71,6 +171,13 @@ class Client(object):
             max_date: (optional, default=None) Maximum timestamp to get the audio. If None then defaults to now.
             file_ext: (optional, default='wav') Audio file extension. Default to `wav`
             parallel: (optional, default=True) Parallel download audio. Defaults to True.
+            resume: (optional, default=False) Keep a manifest of completed downloads under `dest_path`, so that re-running skips
+                files already downloaded and continues partially downloaded ones.
+            max_concurrency: (optional, default=100) Ceiling for parallel downloads. The actual concurrency adapts to the
+                latency, errors and `Retry-After` responses of the server.
+            max_per_host: (optional, default=None) Lower ceilings for specific hosts, as a dict of host to limit.
+            index_path: (optional, default=None) File path of a segment index (SQLite). Segments are listed from the index and
+                only the time ranges not listed by earlier runs are requested from the server.
 
         Returns:
             None.
@@ -93,7 +200,99 @@ class Client(object):
             os.makedirs(dest_path)
 
         return audio.download_segments(self.credentials.token, dest_path,
-                                          stream, min_date, max_date, file_ext, parallel)
+                                          stream, min_date, max_date, file_ext, parallel,
+                                          self.session, resume, max_concurrency, max_per_host, index_path)
+
+    def download_project_segments(self,
+                                  project,
+                                  dest_path='./audios',
+                                  min_date=None,
+                                  max_date=None,
+                                  file_ext='wav',
+                                  parallel=True,
+                                  resume=False,
+                                  max_concurrency=100,
+                                  max_per_host=None,
+                                  index_path=None):
+        """Download the audio of every stream in a project in giving time range.
+
+        All streams are listed concurrently and feed one shared pool of download workers,
+        which takes segments from each stream in turn.
+
+        Args:
+            project: (required) Identifies a project
+            dest_path: (optional, default= './audios') Directory/folder path to save the files (one folder per stream)
+            min_date: (optional, default=None) Minimum timestamp to get the audio. If None then defaults to 30 days ago.
+            max_date: (optional, default=None) Maximum timestamp to get the audio. If None then defaults to now.
+            file_ext: (optional, default='wav') Audio file extension. Default to `wav`
+            parallel: (optional, default=True) Parallel download audio. Defaults to True.
+            resume: (optional, default=False) Keep a manifest of completed downloads under `dest_path`, so that re-running skips
+                files already downloaded and continues partially downloaded ones.
+            max_concurrency: (optional, default=100) Ceiling for parallel downloads across all streams. The actual concurrency
+                adapts to the latency, errors and `Retry-After` responses of the server.
+            max_per_host: (optional, default=None) Lower ceilings for specific hosts, as a dict of host to limit.
+            index_path: (optional, default=None) File path of a segment index (SQLite). Segments are listed from the index and
+                only the time ranges not listed by earlier runs are requested from the server.
+
+        Returns:
+            None.
+        """
+        if self.credentials is None:
+            print('Not authenticated')
+            return
+
+        if project is None:
+            print("project cannot be None")
+            return
+
+        streams = list(self.iter_streams(projects=[project], fields=['id', 'name']))
+        if len(streams) == 0:
+            print(f'No streams found in project {project}')
+            return
+
+        if min_date is None:
+            min_date = datetime.datetime.utcnow() - datetime.timedelta(days=30)
+
+        if max_date is None:
+            max_date = datetime.datetime.utcnow()
+
+        if not os.path.exists(dest_path):
+            os.makedirs(dest_path)
+
+        return audio.download_streams_segments(self.credentials.token, dest_path, streams,
+                                               min_date, max_date, file_ext, parallel,
+                                               self.session, resume, max_concurrency, max_per_host,
+                                               index_path)
+
+    def sync_segments(self, stream, index_path, min_date=None, max_date=None):
+        """Update a local segment index (SQLite) with the audio of a stream in giving time range.
+
+        The index remembers which time range of each stream it has listed, so only the rest of the range (and the last
+        hour before it, for late uploads) is requested from the server.
+
+        Args:
+            stream: (required) Identifies a stream/site
+            index_path: (required) File path of the segment index, created if missing
+            min_date: (optional, default=None) Minimum timestamp of the audio. If None then defaults to 30 days ago.
+            max_date: (optional, default=None) Maximum timestamp of the audio. If None then defaults to now.
+
+        Returns:
+            List of audio files (segments) starting in the time range, in time order.
+
+        Raises:
+            Exception: if listing the segments fails, the range is then listed again by the next sync.
+        """
+        if min_date is None:
+            min_date = datetime.datetime.utcnow() - datetime.timedelta(days=30)
+
+        if max_date is None:
+            max_date = datetime.datetime.utcnow()
+
+        index = SegmentIndex(index_path)
+        try:
+            return audio.sync_segments(self.credentials.token, stream, min_date, max_date, index, self.session)
+        finally:
+            index.close()
 
     def projects(self,
                  keyword=None,
@@ -118,7 +317,35 @@ class Client(object):
             List of projects contains id, name, is_public, and external_id as default.
         """
         return api_rfcx.projects(self.credentials.token, keyword, created_by,
-                                 only_public, only_deleted, fields, limit, offset)
+                                 only_public, only_deleted, fields, limit, offset,
+                                 self.session)
+
+    def iter_projects(self,
+                      keyword=None,
+                      created_by=None,
+                      only_public=None,
+                      only_deleted=None,
+                      fields=None,
+                      page_size=1000):
+        """Iterate over all projects, fetching pages lazily
+
+        Args:
+            keyword: (optional, default=None) Match project name with keyword
+            created_by: (optional, default=None) The project owner. Have 3 options: None, me, or collaborator id
+            only_public: (optional, default=None) Return only public projects
+            only_deleted: (optional, default=None) Return only deleted projects
+            fields: (optional, default=None) Return only specific fields
+            page_size: (optional, default=1000) Number of results to request per page
+
+        Returns:
+            Generator of projects (see `projects`). The next page is read ahead in the background.
+        """
+        def fetch(limit, offset):
+            return api_rfcx.projects(self.credentials.token, keyword, created_by,
+                                     only_public, only_deleted, fields, limit, offset,
+                                     self.session)
+
+        return paging.iterate(fetch, page_size)
 
     def stream(self, stream_id=None, fields=None):
         """ Retrieve a stream information
@@ -140,7 +367,7 @@ class Client(object):
             print('Require stream id')
             return
 
-        return api_rfcx.stream(self.credentials, stream_id, fields)
+        return api_rfcx.stream(self.credentials.token, stream_id, fields, self.session)
 
     def streams(self,
                 organizations=None,
@@ -181,7 +408,48 @@ class Client(object):
 
         return api_rfcx.streams(self.credentials.token, organizations,
                                 projects, created_by, name, keyword,
-                                include_public, include_deleted, fields, limit, offset)
+                                include_public, include_deleted, fields, limit, offset,
+                                self.session)
+
+    def iter_streams(self,
+                     organizations=None,
+                     projects=None,
+                     created_by=None,
+                     name=None,
+                     keyword=None,
+                     include_public=False,
+                     include_deleted=False,
+                     fields=None,
+                     page_size=1000):
+        """Iterate over all streams, fetching pages lazily
+
+        Args:
+            organizations: (optional, default=None) List of organization ids
+            projects: (optional, default=None) List of project ids
+            created_by: (optional, default=None) The stream owner. Have 3 options: None, me, or collaborators
+            name: (optional, default=None) Match exact streams with name (support *)
+            keyword: (optional, default=None) Match stream name with keyword
+            include_public: (optional, default=None) Include streams from public projects (that you aren't a member of)
+            include_deleted: (optional, default=None) Include deleted streams
+            fields: (optional, default=None) Specify fields to return (None will choose API default fields)
+            page_size: (optional, default=1000) Number of results to request per page
+
+        Returns:
+            Generator of streams (see `streams`). The next page is read ahead in the background.
+        """
+        if created_by is not None and created_by not in [
+                "me", "collaborators"
+        ]:
+            print("created_by can be only None, me, or collaborators")
+            return
+
+        def fetch(limit, offset):
+            return api_rfcx.streams(self.credentials.token, organizations,
+                                    projects, created_by, name, keyword,
+                                    include_public, include_deleted, fields, limit, offset,
+                                    self.session)
+
+        return paging.iterate(fetch, page_size)
 
     def stream_segments(self,
                         stream,
@@ -215,15 +483,56 @@ class Client(object):
             end = util.date_now()
 
         return api_rfcx.stream_segments(self.credentials.token, stream, start,
-                                        end, limit, offset)
+                                        end, limit, offset, self.session)
+
+    def iter_stream_segments(self,
+                             stream,
+                             start=None,
+                             end=None,
+                             page_size=1000):
+        """Iterate over all audio information about a specific stream, fetching pages lazily
 
-    def ingest_file(self, stream, filepath, timestamp):
+        Args:
+            stream: (required) Identifies a stream/site.
+            start: (optional, default=None) Minimum timestamp of the audio. If None then defaults to exactly 30 days ago.
+            end: (optional, default=None) Maximum timestamp of the audio. If None then defaults to now.
+            page_size: (optional, default=1000) Number of results to request per page
+
+        Returns:
+            Generator of audio files (see `stream_segments`). The next page is read ahead in the background.
+        """
+        if self.credentials is None:
+            print('Not authenticated')
+            return
+
+        if stream is None:
+            print('Require stream id')
+            return
+
+        if start is None:
+            start = util.date_before()
+        if end is None:
+            end = util.date_now()
+
+        def fetch(limit, offset):
+            return api_rfcx.stream_segments(self.credentials.token, stream, start,
+                                            end, limit, offset, self.session)
+
+        return paging.iterate(fetch, page_size)
+
+    def ingest_file(self, stream, filepath, timestamp, journal_path=None, progress=None,
+                    timeout=ingest.UPLOAD_TIMEOUT):
         """ Ingest a single audio file
 
         Args:
             stream: (required) Identifies a stream/site.
             filepath: (required) Local file path to be ingest.
             timestamp: (required) Audio timestamp in datetime type.
+            journal_path: (optional, default=None) File recording the upload. Ingesting the same file again reuses
+                the upload, or skips it if it completed. A file with the same content (SHA-1) as a file already uploaded
+                to the stream is skipped too.
+            progress: (optional, default=None) Function called with the bytes sent so far and the file size.
+            timeout: (optional, default=120) Seconds without progress before the upload is retried.
 
         Returns:
             Ingest identifier
@@ -234,8 +543,43 @@ class Client(object):
 
         iso_timestamp = timestamp.replace(microsecond=0).isoformat() + 'Z'
 
+        journal = IngestJournal(journal_path) if journal_path is not None else None
         return ingest.ingest_file(self.credentials.token, stream, filepath,
-                                  iso_timestamp)
+                                  iso_timestamp, self.session, journal=journal,
+                                  timeout=timeout, progress=progress)
+
+    def ingest_files(self, stream, files, max_workers=8, progress=None, journal_path=None,
+                     timeout=ingest.UPLOAD_TIMEOUT):
+        """ Ingest many audio files, requesting uploads and uploading in parallel
+
+        Transient failures (throttling, server and connection errors) are retried.
+        A failed file does not stop the others, its error is returned instead.
+        Files with the same content (SHA-1) are uploaded once and share its ingest identifier.
+
+        Args:
+            stream: (required) Identifies a stream/site.
+            files: (required) List of (filepath, timestamp in datetime type) pairs.
+            max_workers: (optional, default=8) Number of upload requests and uploads running in parallel.
+            progress: (optional, default=None) Function called with an `IngestProgress` (completed, failed, total,
+                bytes_uploaded, elapsed, files_per_second, bytes_per_second) each time a file is done. Skipped
+                duplicates and files uploaded by an earlier run count as completed but add no bytes.
+            journal_path: (optional, default=None) File recording the uploads. Running again after an interruption
+                reuses the pending uploads and skips the completed ones, as well as files with the same content (SHA-1)
+                as a file already uploaded to the stream.
+            timeout: (optional, default=120) Seconds without progress before an upload is retried.
+
+        Returns:
+            List of `IngestResult` (filepath, ingest_id, error) in the same order as `files`
+        """
+        iso_files = []
+        for filepath, timestamp in files:
+            if not isinstance(timestamp, datetime.datetime):
+                raise Exception("timestamp is not type datetime")
+            iso_files.append((filepath, timestamp.replace(microsecond=0).isoformat() + 'Z'))
+
+        journal = IngestJournal(journal_path) if journal_path is not None else None
+        return ingest.ingest_files(self.credentials.token, stream, iso_files, max_workers,
+                                   progress, self.session, journal=journal, timeout=timeout)
 
     def check_ingest(self, ingest_id, wait_for_completion = False):
         """ Check the status of an ingest
@@ -251,7 +595,38 @@ class Client(object):
             Raises:
                 Exception: on failed upload or ingest
         """
-        return ingest.check_ingest(self.credentials.token, ingest_id, wait_for_completion)
+        return ingest.check_ingest(self.credentials.token, ingest_id, wait_for_completion,
+                                   self.session)
+
+    def ingest_tracker(self, max_workers=8):
+        """ Create a tracker that waits on many ingests concurrently
+
+            Call `track(ingest_id, callback)` on the tracker to get a future of the ingest status,
+            and `close` it (or use it as a context manager) when done.
+
+            Args:
+                max_workers: (optional, default=8) Number of status checks in flight at once
+
+            Returns:
+                `IngestTracker`
+        """
+        return ingest.IngestTracker(self.credentials.token, self.session, max_workers)
+
+    def wait_for_ingests(self, ingest_ids, max_workers=8):
+        """ Wait until all ingests are processed
+
+            Args:
+                ingest_ids: (required) List of ingest identifiers (returned from `ingest_file` or `ingest_files`)
+                max_workers: (optional, default=8) Number of status checks in flight at once
+
+            Returns:
+                List of (status, status_name, failure_message) in the same order as `ingest_ids`
+
+            Raises:
+                Exception: on failed status check
+        """
+        with self.ingest_tracker(max_workers) as tracker:
+            return tracker.wait(ingest_ids)
 
     def annotations(self,
                     start=None,
@@ -283,7 +658,55 @@ class Client(object):
             end = util.date_now()
 
         return api_rfcx.annotations(self.credentials.token, start, end,
-                                    classifications, stream, limit, offset)
+                                    classifications, stream, limit, offset, self.session)
+
+    def iter_annotations(self,
+                         start=None,
+                         end=None,
+                         classifications=None,
+                         stream=None,
+                         page_size=1000,
+                         parallel=False,
+                         max_workers=8):
+        """Iterate over all annotations, fetching pages lazily
+
+        Args:
+            start: (optional, default=None) Minimum timestamp of the audio. If None then defaults to exactly 30 days ago.
+            end: (optional, default=None) Maximum timestamp of the audio. If None then defaults to now.
+            classifications: (optional, default=None) List of classification names e.g. orca, chainsaw.
+            stream: (optional, default=None) Limit results to a given stream id.
+            page_size: (optional, default=1000) Number of results to request per page. The maximum value is 1000.
+            parallel: (optional, default=False) Split the time range into windows queried in parallel instead of paging
+                by offset. Windows returning a full page are split further. Results are in time order.
+            max_workers: (optional, default=8) Number of windows queried in parallel when `parallel` is True.
+
+        Returns:
+            Generator of annotations (see `annotations`). The next page is read ahead in the background.
+
+        Raises:
+            Exception: when `parallel` is True, if a window cannot be fetched.
+        """
+
+        if page_size > 1000:
+            raise Exception("Please give the value <= 1000")
+
+        if start is None:
+            start = util.date_before()
+        if end is None:
+            end = util.date_now()
+
+        if parallel:
+            def fetch_window(lower, upper, limit, offset):
+                return api_rfcx.annotations(self.credentials.token, lower.isoformat() + 'Z', upper.isoformat() + 'Z',
+                                            classifications, stream, limit, offset, self.session)
+
+            return planner.iterate(fetch_window, start, end, page_size, max_workers)
+
+        def fetch(limit, offset):
+            return api_rfcx.annotations(self.credentials.token, start, end,
+                                        classifications, stream, limit, offset, self.session)
+
+        return paging.iterate(fetch, page_size)
 
     def detections(self,
                    min_date=None,
@@ -320,7 +743,103 @@ class Client(object):
 
         return api_rfcx.detections(self.credentials.token, min_date, max_date,
                                    classifications, classifiers, streams,
-                                   min_confidence, limit, offset)
+                                   min_confidence, limit, offset, self.session)
+
+    def iter_detections(self,
+                        min_date=None,
+                        max_date=None,
+                        classifications=None,
+                        classifiers=None,
+                        streams=None,
+                        min_confidence=None,
+                        page_size=1000,
+                        parallel=False,
+                        max_workers=8):
+        """Iterate over all detections, fetching pages lazily
+
+        Args:
+            min_date: (optional, default=None) Minimum timestamp of the audio. If None then defaults to exactly 30 days ago.
+            max_date: (optional, default=None) Maximum timestamp of the audio. If None then defaults to now.
+            classifications: (optional, default=None) List of classification names e.g. orca, chainsaw.
+            classifiers: (optional, default=None) List of classifier ids (integer) e.g. 93, 94.
+            streams: (optional, default=None) List of stream ids.
+            min_confidence (optional, default=None): Return the detection which equal or greater than given value. If None, it will use default in event strategy.
+            page_size: (optional, default=1000) Number of results to request per page. The maximum value is 1000.
+            parallel: (optional, default=False) Split the time range into windows queried in parallel instead of paging
+                by offset. Windows returning a full page are split further. Results are in time order.
+            max_workers: (optional, default=8) Number of windows queried in parallel when `parallel` is True.
+
+        Returns:
+            Generator of detections (see `detections`). The next page is read ahead in the background.
+
+        Raises:
+            Exception: when `parallel` is True, if a window cannot be fetched.
+        """
+
+        if page_size > 1000:
+            raise Exception("Please give the value <= 1000")
+
+        if min_date is None:
+            min_date = util.date_before()
+        if max_date is None:
+            max_date = util.date_now()
+
+        if parallel:
+            def fetch_window(lower, upper, limit, offset):
+                return api_rfcx.detections(self.credentials.token, lower.isoformat() + 'Z', upper.isoformat() + 'Z',
+                                           classifications, classifiers, streams,
+                                           min_confidence, limit, offset, self.session)
+
+            return planner.iterate(fetch_window, min_date, max_date, page_size, max_workers)
+
+        def fetch(limit, offset):
+            return api_rfcx.detections(self.credentials.token, min_date, max_date,
+                                       classifications, classifiers, streams,
+                                       min_confidence, limit, offset, self.session)
+
+        return paging.iterate(fetch, page_size)
+
+    def export_detections(self,
+                          dest_path,
+                          min_date=None,
+                          max_date=None,
+                          classifications=None,
+                          classifiers=None,
+                          streams=None,
+                          min_confidence=None,
+                          max_workers=8):
+        """Export all detections of a time range to a Parquet dataset partitioned by stream and day
+
+        Each day of the range is paged concurrently and converted to Arrow as pages arrive. Timestamps are stored as
+        UTC millisecond timestamps, stream ids and classification values are dictionary encoded. Exporting an
+        overlapping range again replaces the detections of that range instead of duplicating them, for the streams
+        and days that still have detections (older partitions of other streams are kept). Requires
+        `pip install rfcx[parquet]`.
+
+        Args:
+            dest_path: (required) Directory of the dataset (`dest_path/stream_id=.../date=YYYY-MM-DD/*.parquet`)
+            min_date: (optional, default=None) Minimum timestamp of the audio. If None then defaults to exactly 30 days ago.
+            max_date: (optional, default=None) Maximum timestamp of the audio. If None then defaults to now.
+            classifications: (optional, default=None) List of classification names e.g. orca, chainsaw.
+            classifiers: (optional, default=None) List of classifier ids (integer) e.g. 93, 94.
+            streams: (optional, default=None) List of stream ids.
+            min_confidence (optional, default=None): Return the detection which equal or greater than given value. If None, it will use default in event strategy.
+            max_workers: (optional, default=8) Number of days requested in parallel.
+
+        Returns:
+            Number of detections written.
+
+        Raises:
+            Exception: if a page of detections cannot be fetched, before the partitions of its day are rewritten.
+        """
+        if min_date is None:
+            min_date = util.date_before()
+        if max_date is None:
+            max_date = util.date_now()
+
+        import rfcx._export as export  # pyarrow loads on first use
+        return export.export_detections(self.credentials.token, dest_path, min_date, max_date, classifications,
+                                        classifiers, streams, min_confidence, self.session, max_workers)
 
     def classifications(self, keyword, levels=None, limit=1000, offset=0):
         """Get a list of classifications
@@ -334,9 +853,28 @@ class Client(object):
         Returns:
             List of classifications containing value, title, image
         """
-        return api_rfcx.classifications(self.credentials.token, keyword, levels, limit, offset)
+        return api_rfcx.classifications(self.credentials.token, keyword, levels, limit, offset,
+                                        self.session)
+
+    def iter_classifications(self, keyword, levels=None, page_size=1000):
+        """Iterate over all classifications, fetching pages lazily
+
+        Args:
+            keyword: (required) Match classification title or alternative names with keyword
+            levels: (option, default=None) List of classification types e.g. 'species' (None -> all types)
+            page_size: (optional, default=1000) Number of results to request per page
+
+        Returns:
+            Generator of classifications (see `classifications`). The next page is read ahead in the background.
+        """
+        def fetch(limit, offset):
+            return api_rfcx.classifications(self.credentials.token, keyword, levels, limit, offset,
+                                            self.session)
+
+        return paging.iterate(fetch, page_size)
 
-    def upload_classifier(self, filepath, name, version, classification_values) -> int:
+    def upload_classifier(self, filepath, name, version, classification_values, progress=None,
+                          timeout=classifiers.UPLOAD_TIMEOUT, retries=classifiers.UPLOAD_RETRIES) -> int:
         """Upload a classifier (a.k.a. model, CNN)
         
         Args:
@@ -344,8 +882,13 @@ class Client(object):
             name: (required) Classifier name
             version: (required) Classifier version
             classification_values: (required) List of mappings from model class name to classification values to ignore threshold (from_model_class_name[:to_classification_value][:ignore_threshold])
+            progress: (optional, default=None) Function called with the bytes sent so far and the total size while uploading
+            timeout: (optional, default=120) Seconds without progress before the upload is retried
+            retries: (optional, default=3) Number of times the upload is retried when the connection fails or the server
+                answers 429 or 503. Other errors are raised without retrying since the classifier may have been created.
 
         Returns:
             Identifier for created classifier (int)
         """
-        return classifiers.upload(self.credentials.token, filepath, name, version, classification_values)
+        return classifiers.upload(self.credentials.token, filepath, name, version, classification_values,
+                                  self.session, progress, timeout, retries)
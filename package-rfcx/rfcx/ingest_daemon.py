@@ -0,0 +1,237 @@
+"""Watch directories and ingest new audio files as they are recorded"""
+import argparse
+import collections
+import os
+import threading
+import time
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+import rfcx._util as util
+from rfcx._ingest_queue import IngestQueue
+from rfcx._scheduler import backoff
+
+DEFAULT_QUEUE_PATH = '.rfcx_ingest.sqlite'
+DEFAULT_EXTENSIONS = ('wav', 'flac', 'opus', 'mp3')
+DEFAULT_FILENAME_FORMATS = ('%Y%m%d_%H%M%S', '%Y%m%dT%H%M%S', '%Y-%m-%dT%H-%M-%S', '%Y-%m-%d_%H-%M-%S')
+SCAN_BATCH_SIZE = 1000
+
+IngestStats = collections.namedtuple('IngestStats', [
+    'pending', 'uploading', 'done', 'failed', 'uploaded', 'bytes_uploaded', 'elapsed', 'files_per_second',
+    'bytes_per_second'])
+
+
+class _EventHandler(FileSystemEventHandler):
+
+    def __init__(self, daemon, stream_id):
+        super().__init__()
+        self.daemon = daemon
+        self.stream_id = stream_id
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.daemon._enqueue([event.src_path], self.stream_id, self.daemon.settle_time)
+
+    def on_modified(self, event):
+        self.on_created(event)
+
+    def on_closed(self, event):
+        # Closed after writing (inotify only), the file is complete
+        if not event.is_directory:
+            self.daemon._enqueue([event.src_path], self.stream_id, 0)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.daemon._enqueue([event.dest_path], self.stream_id, 0)
+
+
+class IngestDaemon(object):
+    """Ingest audio files into RFCx streams as they appear in local directories
+
+    The directories are scanned once when the daemon starts, after that new
+    and modified files are picked up from file system events (inotify on
+    Linux) instead of rescanning. The timestamp of each file is taken from
+    its name. Files are queued in a SQLite database so that a restarted
+    daemon carries on where it stopped, and uploaded by `max_workers`
+    threads. Failed uploads are retried with backoff up to `max_attempts`
+    times. Requires `pip install rfcx[watch]`.
+
+    Args:
+        client: Authenticated `rfcx.Client` used for uploading.
+        directories: Dict of directory path to the stream id its files are ingested into.
+        queue_path: (optional, default='.rfcx_ingest.sqlite') Database file of the persistent queue.
+        filename_formats: (optional) `strptime` formats of the timestamp in the file names, tried in order.
+        max_workers: (optional, default=4) Number of files uploaded in parallel.
+        extensions: (optional, default=('wav', 'flac', 'opus', 'mp3')) File extensions to ingest.
+        settle_time: (optional, default=5) Seconds without changes before a new file is uploaded.
+        max_attempts: (optional, default=5) Number of upload attempts before a file is marked as failed.
+        recursive: (optional, default=True) Also watch sub-directories.
+    """
+
+    def __init__(self, client, directories, queue_path=DEFAULT_QUEUE_PATH, filename_formats=DEFAULT_FILENAME_FORMATS,
+                 max_workers=4, extensions=DEFAULT_EXTENSIONS, settle_time=5, max_attempts=5, recursive=True):
+        if Observer is None:
+            raise ImportError('IngestDaemon requires watchdog, install it with `pip install rfcx[watch]`')
+        self.client = client
+        self.directories = directories
+        self.queue = IngestQueue(queue_path)
+        self.filename_formats = filename_formats
+        self.max_workers = max_workers
+        self.extensions = tuple('.' + extension.lower().lstrip('.') for extension in extensions)
+        self.settle_time = settle_time
+        self.max_attempts = max_attempts
+        self.recursive = recursive
+        self._observer = None
+        self._workers = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._started = None
+        self._uploaded = 0
+        self._bytes_uploaded = 0
+
+    def start(self):
+        """Start watching and uploading, then scan the directories for files missed while not running"""
+        self._started = time.monotonic()
+        self._stopping.clear()
+        self._observer = Observer()
+        for directory, stream_id in self.directories.items():
+            self._observer.schedule(_EventHandler(self, stream_id), directory, recursive=self.recursive)
+        self._observer.start()
+        for _ in range(self.max_workers):
+            worker = threading.Thread(target=self._work, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        self.scan()
+
+    def stop(self):
+        """Stop watching and wait for the uploads in progress to finish"""
+        self._stopping.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def close(self):
+        self.stop()
+        self.queue.close()
+
+    def run(self, report_interval=60):
+        """Start the daemon and print its counters every `report_interval` seconds until interrupted"""
+        self.start()
+        try:
+            while not self._stopping.wait(report_interval):
+                print(self._report())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+        print(self._report())
+
+    def scan(self):
+        """Queue the files of the watched directories that are not queued yet"""
+        for directory, stream_id in self.directories.items():
+            batch = []
+            for root, dirs, files in os.walk(directory):
+                if not self.recursive:
+                    dirs[:] = []
+                batch.extend(os.path.join(root, filename) for filename in files)
+                if len(batch) >= SCAN_BATCH_SIZE:
+                    self._enqueue(batch, stream_id, 0, only_new=True)
+                    batch = []
+            self._enqueue(batch, stream_id, 0, only_new=True)
+
+    def stats(self):
+        """Backlog (files pending, uploading, done and failed) and throughput since the daemon started"""
+        counts = self.queue.counts()
+        with self._lock:
+            uploaded = self._uploaded
+            bytes_uploaded = self._bytes_uploaded
+        elapsed = time.monotonic() - self._started if self._started is not None else 0.0
+        return IngestStats(counts['pending'], counts['uploading'], counts['done'], counts['failed'], uploaded,
+                           bytes_uploaded, elapsed, uploaded / elapsed if elapsed > 0 else 0.0,
+                           bytes_uploaded / elapsed if elapsed > 0 else 0.0)
+
+    def _report(self):
+        stats = self.stats()
+        return (f'Pending {stats.pending}, uploading {stats.uploading}, done {stats.done}, failed {stats.failed}, '
+                f'{stats.files_per_second:.2f} files/s, {stats.bytes_per_second / 1024 / 1024:.2f} MB/s')
+
+    def _enqueue(self, paths, stream_id, delay, only_new=False):
+        entries = []
+        for path in paths:
+            if not path.lower().endswith(self.extensions) or os.path.basename(path).startswith('.'):
+                continue
+            if only_new and self.queue.contains(path):
+                continue
+            timestamp = util.parse_filename_timestamp(path, self.filename_formats)
+            if timestamp is None:
+                print('No timestamp found in file name', path)
+                continue
+            entries.append((path, stream_id, timestamp.isoformat() + 'Z'))
+        if entries:
+            self.queue.add(entries, delay)
+
+    def _work(self):
+        while not self._stopping.is_set():
+            item = self.queue.claim()
+            if item is None:
+                ready_at = self.queue.next_ready_at()
+                self._stopping.wait(1.0 if ready_at is None else min(1.0, max(0.01, ready_at - time.time())))
+                continue
+
+            path, stream_id, timestamp, attempts = item
+            if not os.path.exists(path):
+                self.queue.fail(path, 'File no longer exists')
+                continue
+            try:
+                size = os.path.getsize(path)
+                ingest_id = self.client.ingest_file(stream_id, path, util.parse_date(timestamp))
+            except Exception as e:
+                print('Cannot ingest', path, e)
+                retry_in = backoff(attempts, base=5, cap=600) if attempts + 1 < self.max_attempts else None
+                self.queue.fail(path, str(e), retry_in)
+                continue
+            self.queue.complete(path, ingest_id, size)
+            with self._lock:
+                self._uploaded += 1
+                self._bytes_uploaded += size
+
+
+def main(argv=None):
+    """Command line entry point: `rfcx-ingest --stream STREAM_ID DIRECTORY [DIRECTORY ...]`"""
+    from rfcx.client import Client
+
+    parser = argparse.ArgumentParser(prog='rfcx-ingest',
+                                     description='Watch directories and ingest new audio files into an RFCx stream')
+    parser.add_argument('directories', nargs='+', help='Directories to watch')
+    parser.add_argument('--stream', required=True, help='Stream id the files are ingested into')
+    parser.add_argument('--format', dest='formats', action='append',
+                        help='strptime format of the timestamp in the file names (repeatable), '
+                             'defaults to ' + ', '.join(DEFAULT_FILENAME_FORMATS).replace('%', '%%'))
+    parser.add_argument('--extension', dest='extensions', action='append',
+                        help='File extension to ingest (repeatable), defaults to ' + ', '.join(DEFAULT_EXTENSIONS))
+    parser.add_argument('--queue', default=DEFAULT_QUEUE_PATH, help='Queue database file')
+    parser.add_argument('--workers', type=int, default=4, help='Number of parallel uploads')
+    parser.add_argument('--settle', type=float, default=5, help='Seconds without changes before uploading a file')
+    parser.add_argument('--report-interval', type=float, default=60, help='Seconds between progress reports')
+    parser.add_argument('--credentials', default='.rfcx_credentials', help='File path of the persisted user token')
+    args = parser.parse_args(argv)
+
+    client = Client()
+    client.authenticate(persisted_credentials_path=args.credentials)
+    daemon = IngestDaemon(client, {directory: args.stream for directory in args.directories}, args.queue,
+                          args.formats or DEFAULT_FILENAME_FORMATS, args.workers,
+                          args.extensions or DEFAULT_EXTENSIONS, args.settle)
+    daemon.run(args.report_interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 from setuptools import setup, find_packages
 
 REQUIRED_PACKAGES = ['httplib2', 'six', 'requests', 'requests-toolbelt']
+EXTRA_PACKAGES = {'async': ['aiohttp'], 'audio': ['numpy', 'soundfile', 'scipy'], 'watch': ['watchdog'],
+                  'parquet': ['pyarrow']}
 
 setup(name='rfcx',
       version='0.3.1',
@@ -9,10 +11,12 @@ setup(name='rfcx',
       author='Rainforest Connection',
       author_email='antony@rfcx.org',
       install_requires=REQUIRED_PACKAGES,
+      extras_require=EXTRA_PACKAGES,
       description='Client SDK for the Rainforest Connection and Arbimon platforms',
       long_description="[See the documentation](https://rfcx.github.io/rfcx-sdk-python/) and [try the examples](https://github.com/rfcx/rfcx-sdk-python/tree/master/package-rfcx)",
       long_description_content_type="text/markdown",
       packages=find_packages(exclude=['tests']),
+      entry_points={'console_scripts': ['rfcx-ingest=rfcx.ingest_daemon:main']},
       classifiers=[
           'Development Status :: 1 - Planning',
           'Intended Audience :: Science/Research',
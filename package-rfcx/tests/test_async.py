@@ -0,0 +1,130 @@
+from unittest import TestCase, skipUnless
+
+import asyncio
+import importlib.util
+
+import rfcx._async as async_api
+
+
+class FakeResponse(object):
+    def __init__(self, session, json):
+        self.session = session
+        self.status = 200
+        self._json = json
+
+    async def __aenter__(self):
+        self.session.in_flight += 1
+        self.session.max_in_flight = max(self.session.max_in_flight, self.session.in_flight)
+        await asyncio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.session.in_flight -= 1
+
+    def raise_for_status(self):
+        pass
+
+    async def json(self, content_type=None):
+        return self._json
+
+
+class FakeSession(object):
+    """Counts the requests in flight, answers every listing with no segments and every status with `status`"""
+
+    def __init__(self, status=20):
+        self.status = status
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def get(self, url, headers=None, timeout=None):
+        return FakeResponse(self, [] if '/segments' in url else {'status': self.status})
+
+
+@skipUnless(importlib.util.find_spec('aiohttp') is not None, 'aiohttp is not installed')
+class SemaphoreTests(TestCase):
+    def test_segment_listing_holds_the_semaphore(self):
+        # Arrange
+        session = FakeSession()
+
+        async def list_segments():
+            semaphore = asyncio.BoundedSemaphore(2)
+            return [segment async for segment in async_api.get_all_segments(
+                session, 'token', 'stream', '2024-01-01T00:00:00Z', '2024-01-31T00:00:00Z', semaphore)]
+
+        # Act
+        segments = asyncio.run(list_segments())
+
+        # Assert
+        self.assertEqual([], segments)
+        self.assertEqual(2, session.max_in_flight)
+
+    def test_check_ingest_waits_for_the_semaphore(self):
+        # Arrange
+        session = FakeSession()
+
+        async def check_while_held():
+            semaphore = asyncio.BoundedSemaphore(1)
+            await semaphore.acquire()
+            check = asyncio.ensure_future(async_api.check_ingest(session, 'token', 'ingest', semaphore))
+            await asyncio.sleep(0.05)
+            done_while_held = check.done()
+            semaphore.release()
+            return done_while_held, await check
+
+        # Act
+        done_while_held, result = asyncio.run(check_while_held())
+
+        # Assert
+        self.assertFalse(done_while_held)
+        self.assertEqual((20, 'INGESTED', None), result)
+
+
+class FakeTokens(object):
+    def __init__(self):
+        self.token = 'tokA'
+        self.refreshed = []
+
+    def refresh(self, stale_token=None):
+        self.refreshed.append(stale_token)
+        self.token = 'tokB'
+        return self.token
+
+
+class ExpiringSession(object):
+    """Rejects requests sent with `tokA` with 401, answers the others with a stream"""
+
+    def __init__(self):
+        self.sent = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.sent.append(headers['Authorization'])
+        response = FakeResponse(FakeSession(), {'id': 'stream', 'name': 'Stream'})
+        response.status = 401 if headers['Authorization'] == 'Bearer tokA' else 200
+        return response
+
+
+@skipUnless(importlib.util.find_spec('aiohttp') is not None, 'aiohttp is not installed')
+class TokenRefreshTests(TestCase):
+    def test_rejected_request_is_sent_again_with_a_refreshed_token(self):
+        # Arrange
+        session = ExpiringSession()
+        tokens = FakeTokens()
+
+        # Act
+        stream = asyncio.run(async_api.stream(session, tokens, 'stream'))
+
+        # Assert
+        self.assertEqual({'id': 'stream', 'name': 'Stream'}, stream)
+        self.assertEqual(['Bearer tokA', 'Bearer tokB'], session.sent)
+        self.assertEqual(['tokA'], tokens.refreshed)
+
+    def test_fixed_token_is_not_refreshed(self):
+        # Arrange
+        session = ExpiringSession()
+
+        # Act
+        stream = asyncio.run(async_api.stream(session, 'tokA', 'stream'))
+
+        # Assert
+        self.assertIsNone(stream)
+        self.assertEqual(['Bearer tokA'], session.sent)
@@ -0,0 +1,253 @@
+from unittest import TestCase
+from unittest import mock
+
+import base64
+import io
+import json
+import os
+import sqlite3
+import tempfile
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import rfcx._cache as cache
+import rfcx._http as http
+from rfcx.client import Client
+
+
+class ClientCacheTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.db')
+
+    def test_close_closes_the_cache_database_it_opened(self):
+        # Arrange
+        client = Client(cache=self.path)
+
+        # Act
+        client.close()
+
+        # Assert
+        with self.assertRaises(sqlite3.ProgrammingError):
+            client.cache.get('key')
+
+    def test_close_leaves_a_given_cache_open(self):
+        # Arrange
+        sqlite_cache = cache.SQLiteCache(self.path)
+        self.addCleanup(sqlite_cache.close)
+        client = Client(cache=sqlite_cache)
+
+        # Act
+        client.close()
+
+        # Assert
+        self.assertIsNone(sqlite_cache.get('key'))
+
+    def test_cache_ttls_are_merged_with_the_defaults(self):
+        # Arrange
+        ttls = [(r'^/streams$', 30), (r'^/detections$', 10)]
+
+        # Act
+        adapter = http.create_session(cache=cache.MemoryCache(), ttls=ttls).get_adapter('https://')
+
+        # Assert
+        self.assertEqual(30, adapter._ttl('https://api.rfcx.org/streams'))
+        self.assertEqual(10, adapter._ttl('https://api.rfcx.org/detections'))
+        self.assertEqual(60 * 60, adapter._ttl('https://api.rfcx.org/streams/abc'))
+        self.assertEqual(24 * 60 * 60, adapter._ttl('https://api.rfcx.org/classifications'))
+
+    def test_default_ttls_without_cache_ttls(self):
+        # Act
+        adapter = http.create_session(cache=cache.MemoryCache()).get_adapter('https://')
+
+        # Assert
+        self.assertEqual(5 * 60, adapter._ttl('https://api.rfcx.org/streams'))
+        self.assertIsNone(adapter._ttl('https://api.rfcx.org/detections'))
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class FakeServer(object):
+    """Answers in place of `HTTPAdapter.send`, with a 304 when the request has the current ETag"""
+
+    def __init__(self):
+        self.etag = '"v1"'
+        self.content = b'[]'
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request.headers.get('If-None-Match'))
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        response.raw = io.BytesIO()
+        if request.headers.get('If-None-Match') == self.etag:
+            response.status_code = 304
+            response._content = b''
+        else:
+            response.status_code = 200
+            response._content = self.content
+        response.headers['ETag'] = self.etag
+        return response
+
+
+def jwt(claims):
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode('utf-8')).decode('ascii').rstrip('=')
+    return f'header.{payload}.signature'
+
+
+class CachingAdapterTests(TestCase):
+    url = 'https://api.rfcx.org/streams'
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.server = FakeServer()
+        send = lambda adapter, request, **kwargs: self.server.send(request, **kwargs)
+        for patcher in [mock.patch('rfcx._cache.time', self.clock), mock.patch.object(HTTPAdapter, 'send', send)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.session = http.create_session(cache=cache.MemoryCache(), ttls=[(r'^/streams$', 60)])
+
+    def test_fresh_responses_are_served_from_the_cache(self):
+        # Act
+        first = self.session.get(self.url)
+        self.clock.now += 59
+        second = self.session.get(self.url)
+
+        # Assert
+        self.assertEqual([None], self.server.requests)
+        self.assertFalse(getattr(first, 'from_cache', False))
+        self.assertTrue(second.from_cache)
+        self.assertEqual([], second.json())
+
+    def test_expired_responses_are_revalidated_with_their_etag(self):
+        # Arrange
+        self.session.get(self.url)
+        self.clock.now += 61
+
+        # Act
+        revalidated = self.session.get(self.url)
+        self.clock.now += 59
+        fresh_again = self.session.get(self.url)
+
+        # Assert
+        self.assertEqual([None, '"v1"'], self.server.requests)
+        self.assertTrue(revalidated.from_cache)
+        self.assertEqual(200, revalidated.status_code)
+        self.assertTrue(fresh_again.from_cache)
+
+    def test_changed_responses_replace_the_cached_one(self):
+        # Arrange
+        self.session.get(self.url)
+        self.clock.now += 61
+        self.server.etag = '"v2"'
+        self.server.content = b'[1]'
+
+        # Act
+        changed = self.session.get(self.url)
+        cached = self.session.get(self.url)
+
+        # Assert
+        self.assertEqual([None, '"v1"'], self.server.requests)
+        self.assertEqual([1], changed.json())
+        self.assertEqual([1], cached.json())
+
+    def test_refreshed_token_of_the_same_user_keeps_the_cache(self):
+        # Arrange
+        self.session.get(self.url, headers={'Authorization': 'Bearer ' + jwt({'sub': 'user1', 'exp': 1})})
+
+        # Act
+        refreshed = self.session.get(self.url, headers={'Authorization': 'Bearer ' + jwt({'sub': 'user1', 'exp': 2})})
+
+        # Assert
+        self.assertEqual([None], self.server.requests)
+        self.assertTrue(refreshed.from_cache)
+
+    def test_users_do_not_share_responses(self):
+        # Act
+        self.session.get(self.url, headers={'Authorization': 'Bearer ' + jwt({'sub': 'user1'})})
+        self.session.get(self.url, headers={'Authorization': 'Bearer ' + jwt({'sub': 'user2'})})
+        self.session.get(self.url, headers={'Authorization': 'Bearer opaque1'})
+        self.session.get(self.url, headers={'Authorization': 'Bearer opaque2'})
+
+        # Assert
+        self.assertEqual([None] * 4, self.server.requests)
+
+    def test_other_requests_are_not_cached(self):
+        # Act
+        self.session.get('https://api.rfcx.org/detections')
+        self.session.get('https://api.rfcx.org/detections')
+
+        # Assert
+        self.assertEqual([None, None], self.server.requests)
+
+
+class LruTests(TestCase):
+    def entry(self, content):
+        return cache.CacheEntry(0.0, 200, {}, content)
+
+    def assert_evicts_least_recently_used(self, lru):
+        # Arrange
+        lru.set('a', self.entry(b'a'))
+        lru.set('b', self.entry(b'b'))
+        lru.get('a')
+
+        # Act
+        lru.set('c', self.entry(b'c'))
+
+        # Assert
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(b'a', lru.get('a').content)
+        self.assertEqual(b'c', lru.get('c').content)
+
+    def test_memory_cache_evicts_least_recently_used(self):
+        self.assert_evicts_least_recently_used(cache.MemoryCache(max_entries=2))
+
+    def test_sqlite_cache_evicts_least_recently_used(self):
+        # Arrange
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        sqlite_cache = cache.SQLiteCache(os.path.join(directory.name, 'cache.db'), max_entries=2)
+        self.addCleanup(sqlite_cache.close)
+        clock = FakeClock()
+
+        def tick():
+            clock.now += 1
+            return clock.now
+        clock.time = tick
+
+        # Act / Assert
+        with mock.patch('rfcx._cache.time', clock):
+            self.assert_evicts_least_recently_used(sqlite_cache)
+
+
+class PruneTests(TestCase):
+    def test_opening_the_database_removes_entries_unused_for_max_age(self):
+        # Arrange
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'cache.db')
+        clock = FakeClock()
+        with mock.patch('rfcx._cache.time', clock):
+            sqlite_cache = cache.SQLiteCache(path, max_age=100)
+            sqlite_cache.set('old', cache.CacheEntry(clock.now, 200, {}, b'old'))
+            clock.now += 60
+            sqlite_cache.set('recent', cache.CacheEntry(clock.now, 200, {}, b'recent'))
+            sqlite_cache.close()
+            clock.now += 50
+
+            # Act
+            sqlite_cache = cache.SQLiteCache(path, max_age=100)
+            self.addCleanup(sqlite_cache.close)
+
+            # Assert
+            self.assertIsNone(sqlite_cache.get('old'))
+            self.assertEqual(b'recent', sqlite_cache.get('recent').content)
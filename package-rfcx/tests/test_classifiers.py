@@ -0,0 +1,100 @@
+from unittest import TestCase
+from unittest import mock
+
+import os
+import tempfile
+
+import requests
+import urllib3
+
+import rfcx._classifiers as classifiers
+
+
+def response(status_code, headers=None):
+    resp = requests.Response()
+    resp.status_code = status_code
+    resp.headers.update(headers or {})
+    return resp
+
+
+class FakeSession(object):
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.posts = 0
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        self.posts += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def connection_refused():
+    reason = urllib3.exceptions.NewConnectionError(None, 'Connection refused')
+    return requests.exceptions.ConnectionError(urllib3.exceptions.MaxRetryError(None, '/classifiers', reason))
+
+
+@mock.patch('time.sleep', lambda seconds: None)
+class UploadTests(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self.folder.name, 'model.tar.gz')
+        with open(self.filepath, 'wb') as f:
+            f.write(b'model')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def upload(self, session):
+        return classifiers.upload('token', self.filepath, 'name', 1, ['a:b'], session=session, retries=3)
+
+    def test_retries_throttled_and_unavailable(self):
+        # Arrange
+        session = FakeSession([response(429, {'Retry-After': '0'}), response(503),
+                               response(201, {'Location': '/classifiers/42'})])
+
+        # Act
+        classifier_id = self.upload(session)
+
+        # Assert
+        self.assertEqual(42, classifier_id)
+        self.assertEqual(3, session.posts)
+
+    def test_retries_connections_that_could_not_be_established(self):
+        # Arrange
+        session = FakeSession([connection_refused(), response(201, {'Location': '/classifiers/42'})])
+
+        # Act
+        classifier_id = self.upload(session)
+
+        # Assert
+        self.assertEqual(42, classifier_id)
+        self.assertEqual(2, session.posts)
+
+    def test_raises_the_connection_error_once_retries_are_exhausted(self):
+        # Arrange
+        session = FakeSession([connection_refused() for _ in range(4)])
+
+        # Act / Assert
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.upload(session)
+        self.assertEqual(4, session.posts)
+
+    def test_does_not_retry_server_errors(self):
+        # Arrange
+        session = FakeSession([response(500), response(201, {'Location': '/classifiers/42'})])
+
+        # Act / Assert
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.upload(session)
+        self.assertEqual(1, session.posts)
+
+    def test_does_not_retry_read_timeouts(self):
+        # Arrange
+        session = FakeSession([requests.exceptions.ReadTimeout(), response(201, {'Location': '/classifiers/42'})])
+
+        # Act / Assert
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            self.upload(session)
+        self.assertEqual(1, session.posts)
@@ -0,0 +1,62 @@
+from unittest import TestCase
+from unittest import mock
+
+import io
+
+import requests
+from requests.adapters import BaseAdapter
+
+from rfcx._credentials import Credentials
+from rfcx.client import Client
+
+
+class RecordingAdapter(BaseAdapter):
+    def __init__(self):
+        super().__init__()
+        self.authorizations = []
+
+    def send(self, request, **kwargs):
+        self.authorizations.append(request.headers.get('Authorization'))
+        response = requests.Response()
+        response.status_code = 200
+        response.request = request
+        response.url = request.url
+        response.raw = io.BytesIO(b'{}')
+        return response
+
+    def close(self):
+        pass
+
+
+class FakeAuthentication(object):
+    def __init__(self, persist=True, persisted_credentials_path=None):
+        self.credentials = None
+
+    def authenticate(self):
+        self.credentials = Credentials('tokA', None)
+
+
+class CredentialsTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.addCleanup(self.client.close)
+        self.adapter = RecordingAdapter()
+        self.client.session.mount('https://', self.adapter)
+        with mock.patch('rfcx.client.Authentication', FakeAuthentication):
+            self.client.authenticate()
+
+    def test_requests_use_credentials_set_after_authenticate(self):
+        # Act
+        self.client.credentials = Credentials('tokB', None)
+        self.client.stream('s1')
+
+        # Assert
+        self.assertEqual('tokB', self.client.credentials.token)
+        self.assertEqual(['Bearer tokB'], self.adapter.authorizations)
+
+    def test_clearing_credentials_removes_the_session_auth(self):
+        # Act
+        self.client.credentials = None
+
+        # Assert
+        self.assertIsNone(self.client.session.auth)
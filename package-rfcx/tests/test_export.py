@@ -0,0 +1,66 @@
+from unittest import TestCase, skipUnless
+from unittest import mock
+
+import datetime
+import importlib.util
+import tempfile
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+if HAS_PYARROW:
+    import pyarrow.parquet as pq
+    import rfcx._export as export
+
+
+def detections(count, stream_id='s1'):
+    start = datetime.datetime(2021, 1, 1)
+    return [{'stream_id': stream_id, 'start': (start + datetime.timedelta(seconds=i)).isoformat() + 'Z',
+             'end': (start + datetime.timedelta(seconds=i + 1)).isoformat() + 'Z', 'confidence': 0.9,
+             'classification': {'value': 'orca'}} for i in range(count)]
+
+
+class FakeDetections(object):
+    """Pages of `rows`, `None` (a failed request) from offset `failing_offset`"""
+
+    def __init__(self, rows, failing_offset=None):
+        self.rows = rows
+        self.failing_offset = failing_offset
+
+    def __call__(self, token, start, end, classifications, classifiers, stream_ids, min_confidence, limit, offset,
+                 session):
+        if self.failing_offset is not None and offset >= self.failing_offset:
+            return None
+        return self.rows[offset:offset + limit]
+
+
+@skipUnless(HAS_PYARROW, 'pyarrow is not installed')
+class ExportDetectionsTests(TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.dest_path = folder.name
+
+    def export(self, fake):
+        with mock.patch.object(export.api_rfcx, 'detections', fake):
+            return export.export_detections('token', self.dest_path, '2021-01-01T00:00:00', '2021-01-02T00:00:00')
+
+    def test_export_again_replaces_rows(self):
+        # Arrange
+        self.export(FakeDetections(detections(1500)))
+
+        # Act
+        count = self.export(FakeDetections(detections(1500)))
+
+        # Assert
+        self.assertEqual(1500, count)
+        self.assertEqual(1500, pq.read_table(self.dest_path).num_rows)
+
+    def test_failed_page_leaves_earlier_export_unchanged(self):
+        # Arrange
+        self.export(FakeDetections(detections(1500)))
+
+        # Act
+        with self.assertRaises(Exception):
+            self.export(FakeDetections(detections(1500), failing_offset=1000))
+
+        # Assert
+        self.assertEqual(1500, pq.read_table(self.dest_path).num_rows)
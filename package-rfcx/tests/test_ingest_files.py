@@ -0,0 +1,94 @@
+from unittest import TestCase
+from unittest import mock
+
+import os
+import tempfile
+import threading
+
+import rfcx._ingest as ingest
+from rfcx._journal import IngestJournal
+
+
+class FakeIngestApi(object):
+    """Upload requests answered with a new upload id, uploads recorded by file"""
+
+    def __init__(self):
+        self.requested = []
+        self.uploaded = []
+        self._lock = threading.Lock()
+
+    def request_upload(self, token, stream_id, filename, timestamp, session=None, checksum=None):
+        with self._lock:
+            self.requested.append(filename)
+            upload_id = f'upload{len(self.requested)}'
+        return {'uploadId': upload_id, 'url': f'https://storage/{upload_id}'}
+
+    def upload(self, signed_url, filepath, session=None, part_size=None, timeout=None, progress=None):
+        with self._lock:
+            self.uploaded.append(os.path.basename(filepath))
+
+
+class IngestFilesTests(TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+        self.api = FakeIngestApi()
+        for patcher in [mock.patch.object(ingest, '_request_upload', self.api.request_upload),
+                        mock.patch.object(ingest, '_upload', self.api.upload)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write(self, name, content):
+        path = os.path.join(self.folder, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path, '2021-01-01T00:00:00Z'
+
+    def test_identical_files_are_uploaded_once_without_journal(self):
+        # Arrange
+        files = [self.write('a.wav', b'same' * 100), self.write('b.wav', b'same' * 100),
+                 self.write('c.wav', b'other' * 10)]
+        reports = []
+
+        # Act
+        results = ingest.ingest_files('token', 's1', files, max_workers=2, progress=reports.append)
+
+        # Assert
+        self.assertEqual(2, len(self.api.uploaded))
+        self.assertEqual(results[0].ingest_id, results[1].ingest_id)
+        self.assertNotEqual(results[0].ingest_id, results[2].ingest_id)
+        self.assertEqual([None] * 3, [result.error for result in results])
+        self.assertEqual(3, reports[-1].completed)
+        self.assertEqual(400 + 50, reports[-1].bytes_uploaded)
+
+    def test_identical_files_are_uploaded_once_with_journal(self):
+        # Arrange
+        files = [self.write('a.wav', b'same' * 100), self.write('b.wav', b'same' * 100)]
+        journal = IngestJournal(os.path.join(self.folder, 'journal.jsonl'))
+        reports = []
+
+        # Act
+        results = ingest.ingest_files('token', 's1', files, max_workers=2, progress=reports.append, journal=journal)
+
+        # Assert
+        self.assertEqual(1, len(self.api.uploaded))
+        self.assertEqual(results[0].ingest_id, results[1].ingest_id)
+        self.assertEqual(400, reports[-1].bytes_uploaded)
+
+    def test_files_uploaded_by_an_earlier_run_count_no_bytes(self):
+        # Arrange
+        files = [self.write('a.wav', b'same' * 100)]
+        journal_path = os.path.join(self.folder, 'journal.jsonl')
+        ingest.ingest_files('token', 's1', files, journal=IngestJournal(journal_path))
+        reports = []
+
+        # Act
+        results = ingest.ingest_files('token', 's1', files, progress=reports.append,
+                                      journal=IngestJournal(journal_path))
+
+        # Assert
+        self.assertEqual(1, len(self.api.uploaded))
+        self.assertIsNone(results[0].error)
+        self.assertEqual(1, reports[-1].completed)
+        self.assertEqual(0, reports[-1].bytes_uploaded)
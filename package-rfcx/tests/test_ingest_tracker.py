@@ -0,0 +1,82 @@
+from unittest import TestCase
+from unittest import mock
+
+import threading
+import time
+
+import rfcx._ingest as ingest
+
+
+class FakeStatuses(object):
+    """Status responses of each ingest in turn, the last one repeats"""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.polls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, token, ingest_id, session=None):
+        with self._lock:
+            polls = sum(1 for polled in self.polls if polled == ingest_id)
+            self.polls.append(ingest_id)
+        statuses = self.statuses[ingest_id]
+        return {'status': statuses[min(polls, len(statuses) - 1)]}
+
+
+class IngestTrackerTests(TestCase):
+    def track(self, statuses, ingest_ids, linger=0):
+        fake = FakeStatuses(statuses)
+        with mock.patch.object(ingest, '_get_status', fake):
+            with ingest.IngestTracker('token', initial_interval=0.01, max_interval=0.04, backoff=2) as tracker:
+                futures = [tracker.track(ingest_id) for ingest_id in ingest_ids]
+                results = [future.result(5) for future in futures]
+                # Give polls that should not happen a chance to run
+                time.sleep(linger)
+        return fake, futures, results
+
+    def test_tracking_the_same_ingest_twice_polls_it_once(self):
+        # Act
+        fake, futures, results = self.track({'a': [10, 20]}, ['a', 'a'])
+
+        # Assert
+        self.assertIs(futures[0], futures[1])
+        self.assertEqual(['a', 'a'], fake.polls)
+        self.assertEqual([(20, 'INGESTED', None)] * 2, results)
+
+    def test_polls_less_often_up_to_the_max_interval(self):
+        # Arrange
+        intervals = []
+        schedule = ingest.IngestTracker._schedule
+
+        def spy(tracker, ingest_id, interval):
+            intervals.append(interval)
+            schedule(tracker, ingest_id, interval)
+
+        # Act
+        with mock.patch.object(ingest.IngestTracker, '_schedule', spy):
+            self.track({'a': [0, 10, 10, 10, 10, 31]}, ['a'])
+
+        # Assert
+        self.assertEqual([0.01, 0.02, 0.04, 0.04, 0.04, 0.04], intervals)
+
+    def test_stops_polling_at_terminal_statuses(self):
+        # Act
+        fake, _, results = self.track({'a': [10, 20], 'b': [10, 10, 30], 'c': [32]}, ['a', 'b', 'c'], linger=0.1)
+
+        # Assert
+        self.assertEqual([(20, 'INGESTED', None), (30, 'FAILED', None), (32, 'CHECKSUM', None)], results)
+        self.assertEqual({'a': 2, 'b': 3, 'c': 1}, {key: fake.polls.count(key) for key in 'abc'})
+
+    def test_failed_polls_fail_the_future(self):
+        # Arrange
+        def get_status(token, ingest_id, session=None):
+            raise Exception('Not found')
+
+        # Act
+        with mock.patch.object(ingest, '_get_status', get_status):
+            with ingest.IngestTracker('token', initial_interval=0.01) as tracker:
+                future = tracker.track('a')
+                error = future.exception(5)
+
+        # Assert
+        self.assertEqual('Not found', str(error))
@@ -0,0 +1,54 @@
+from unittest import TestCase
+
+import datetime
+
+import rfcx._planner as planner
+
+
+def item(start):
+    return {'start': start.isoformat() + 'Z'}
+
+
+class PlannerTests(TestCase):
+    def setUp(self):
+        self.start = datetime.datetime(2021, 1, 1)
+        self.end = datetime.datetime(2021, 1, 4)
+
+    def test_yields_items_of_every_window_in_time_order(self):
+        # Arrange
+        def fetch_page(lower, upper, limit, offset):
+            return [item(lower + datetime.timedelta(hours=1)), item(lower)]
+
+        # Act
+        items = list(planner.iterate(fetch_page, self.start, self.end))
+
+        # Assert
+        self.assertEqual([item(self.start + datetime.timedelta(days=day, hours=hour))
+                          for day in range(3) for hour in range(2)], items)
+
+    def test_failed_middle_window_raises(self):
+        # Arrange
+        def fetch_page(lower, upper, limit, offset):
+            if lower == self.start + datetime.timedelta(days=1):
+                return None
+            return [item(lower)]
+
+        # Act
+        items = []
+        with self.assertRaises(Exception):
+            for window_item in planner.iterate(fetch_page, self.start, self.end):
+                items.append(window_item)
+
+        # Assert
+        self.assertEqual([item(self.start)], items)
+
+    def test_failed_page_of_a_dense_window_raises(self):
+        # Arrange
+        def fetch_page(lower, upper, limit, offset):
+            if offset > 0:
+                return None
+            return [item(lower)] * limit
+
+        # Act / Assert
+        with self.assertRaises(Exception):
+            list(planner.iterate(fetch_page, self.start, self.start + datetime.timedelta(minutes=1), page_size=2))
@@ -0,0 +1,231 @@
+from unittest import TestCase
+from unittest import mock
+
+import threading
+import time
+
+import requests
+
+from rfcx._scheduler import AdaptiveLimiter, FairQueue, RetryableStatusError, Scheduler
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def response(status_code, headers=None):
+    resp = requests.Response()
+    resp.status_code = status_code
+    resp.headers.update(headers or {})
+    return resp
+
+
+class AdaptiveLimiterTests(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('rfcx._scheduler.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_limit_grows_by_one_per_window_of_uncongested_requests(self):
+        # Arrange
+        limiter = AdaptiveLimiter(initial=4, maximum=10)
+
+        # Act
+        limits = []
+        for _ in range(5):
+            limiter.acquire()
+            limiter.release(latency=0.1)
+            limits.append(limiter.limit)
+
+        # Assert
+        self.assertEqual(4.25, limits[0])
+        self.assertEqual(4, int(limits[3]))
+        self.assertEqual(5, int(limits[4]))
+
+    def test_limit_never_exceeds_the_maximum(self):
+        # Arrange
+        limiter = AdaptiveLimiter(initial=4, maximum=5)
+
+        # Act
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release(latency=0.1)
+
+        # Assert
+        self.assertEqual(5, limiter.limit)
+
+    def test_limit_halves_at_most_once_per_round_trip(self):
+        # Arrange
+        limiter = AdaptiveLimiter(initial=8)
+        limiter.acquire()
+        limiter.release(latency=0.5)
+        limit = limiter.limit
+
+        # Act
+        limiter.acquire()
+        limiter.release(congested=True)
+        halved = limiter.limit
+        limiter.acquire()
+        limiter.release(congested=True)
+        same_round_trip = limiter.limit
+        self.clock.now += 1
+        limiter.acquire()
+        limiter.release(congested=True)
+
+        # Assert
+        self.assertEqual(limit / 2, halved)
+        self.assertEqual(halved, same_round_trip)
+        self.assertEqual(limit / 4, limiter.limit)
+
+    def test_throttled_and_unavailable_responses_halve_the_limit(self):
+        for status_code in [429, 503]:
+            with self.subTest(status_code=status_code):
+                # Arrange
+                scheduler = Scheduler(initial_concurrency=8)
+                self.clock.now += 10
+
+                # Act
+                with self.assertRaises(RetryableStatusError):
+                    with scheduler.slot('https://media-api.rfcx.org/a') as slot:
+                        slot.observe(response(status_code))
+                        raise RetryableStatusError(status_code)
+
+                # Assert
+                self.assertEqual(4, scheduler.limiter('https://media-api.rfcx.org/b').limit)
+
+    def test_successful_responses_do_not_halve_the_limit(self):
+        # Arrange
+        scheduler = Scheduler(initial_concurrency=8)
+
+        # Act
+        with scheduler.slot('https://media-api.rfcx.org/a') as slot:
+            slot.observe(response(200))
+
+        # Assert
+        self.assertEqual(8.125, scheduler.limiter('https://media-api.rfcx.org/a').limit)
+
+
+class RetryAfterTests(TestCase):
+    def test_retry_after_pauses_new_requests(self):
+        # Arrange
+        limiter = AdaptiveLimiter(initial=8)
+        limiter.acquire()
+        limiter.release(latency=0.01, congested=True, retry_after=0.3)
+
+        # Act
+        start = time.monotonic()
+        limiter.acquire()
+        waited = time.monotonic() - start
+
+        # Assert
+        self.assertGreaterEqual(waited, 0.29)
+
+    def test_retry_after_header_is_read_from_the_response(self):
+        # Arrange
+        scheduler = Scheduler()
+
+        # Act
+        with self.assertRaises(RetryableStatusError):
+            with scheduler.slot('https://media-api.rfcx.org/a') as slot:
+                slot.observe(response(429, {'Retry-After': '120'}))
+                raise RetryableStatusError(429)
+
+        # Assert
+        limiter = scheduler.limiter('https://media-api.rfcx.org/a')
+        self.assertGreater(limiter._paused_until - time.monotonic(), 119)
+
+
+class FairQueueTests(TestCase):
+    def test_get_takes_keys_in_turn(self):
+        # Arrange
+        queue = FairQueue(['a', 'b', 'c'])
+        for item in range(3):
+            queue.put('a', item)
+        queue.put('b', 0)
+        for item in range(2):
+            queue.put('c', item)
+        for key in ['a', 'b', 'c']:
+            queue.close(key)
+
+        # Act
+        order = list(iter(queue.get, None))
+
+        # Assert
+        self.assertEqual([('a', 0), ('b', 0), ('c', 0), ('a', 1), ('c', 1), ('a', 2)], order)
+
+    def test_get_waits_for_open_keys_and_ends_when_all_are_closed(self):
+        # Arrange
+        queue = FairQueue(['a', 'b'])
+        queue.put('a', 0)
+        queue.close('a')
+
+        # Act
+        first = queue.get()
+        thread = threading.Thread(target=lambda: (queue.put('b', 0), queue.close('b')))
+        thread.start()
+        second = queue.get()
+        thread.join()
+
+        # Assert
+        self.assertEqual(('a', 0), first)
+        self.assertEqual(('b', 0), second)
+        self.assertIsNone(queue.get())
+
+    def test_items_put_after_close_are_dropped(self):
+        # Arrange
+        queue = FairQueue(['a'])
+        queue.close('a')
+
+        # Act
+        accepted = queue.put('a', 0)
+
+        # Assert
+        self.assertFalse(accepted)
+        self.assertIsNone(queue.get())
+
+    def test_notify_when_room_waits_for_a_get(self):
+        # Arrange
+        queue = FairQueue(['a'], maxsize=2)
+        queue.put('a', 1)
+        queue.put('a', 2)
+        calls = []
+
+        # Act
+        queue.notify_when_room('a', lambda: calls.append(len(calls)))
+        called_while_full = list(calls)
+        queue.get()
+
+        # Assert
+        self.assertTrue(queue.full('a') is False)
+        self.assertEqual([], called_while_full)
+        self.assertEqual([0], calls)
+
+    def test_notify_when_room_calls_back_right_away_when_not_full(self):
+        # Arrange
+        queue = FairQueue(['a'], maxsize=2)
+        calls = []
+
+        # Act
+        queue.notify_when_room('a', lambda: calls.append(1))
+
+        # Assert
+        self.assertEqual([1], calls)
+
+    def test_notify_when_room_never_calls_back_closed_keys(self):
+        # Arrange
+        queue = FairQueue(['a', 'b'], maxsize=1)
+        queue.put('a', 1)
+        calls = []
+        queue.notify_when_room('a', lambda: calls.append(1))
+
+        # Act
+        queue.close('a')
+        queue.get()
+
+        # Assert
+        self.assertEqual([], calls)
@@ -0,0 +1,147 @@
+from unittest import TestCase
+from unittest import mock
+
+import datetime
+import os
+import tempfile
+
+import rfcx._audio as audio
+import rfcx._paging as paging
+import rfcx._util as util
+from rfcx._segment_index import SegmentIndex
+
+
+def segment(start):
+    return {'id': start.isoformat(), 'start': start.isoformat() + 'Z', 'end': start.isoformat() + 'Z'}
+
+
+class SegmentIndexTests(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.index = SegmentIndex(os.path.join(self.folder.name, 'index.sqlite'))
+        self.start = datetime.datetime(2021, 1, 1)
+        self.end = datetime.datetime(2021, 1, 2)
+
+    def tearDown(self):
+        self.index.close()
+        self.folder.cleanup()
+
+    def test_failed_listing_leaves_coverage_unchanged(self):
+        # Arrange
+        def list_segments(stream_id, lower, upper):
+            yield segment(lower)
+            raise Exception('Failed to get the page at offset 1000')
+
+        # Act
+        with self.assertRaises(Exception):
+            self.index.sync('s1', self.start, self.end, list_segments)
+
+        # Assert
+        self.assertIsNone(self.index.coverage('s1'))
+
+    def test_sync_lists_only_missing_ranges(self):
+        # Arrange
+        listed = []
+
+        def list_segments(stream_id, lower, upper):
+            listed.append((lower, upper))
+            return [segment(lower)]
+
+        # Act
+        self.index.sync('s1', self.start, self.end, list_segments)
+        self.index.sync('s1', self.start - datetime.timedelta(days=1), self.end, list_segments)
+
+        # Assert
+        self.assertEqual((self.start - datetime.timedelta(days=1), self.end), self.index.coverage('s1'))
+        self.assertEqual([(self.start, self.end), (self.start - datetime.timedelta(days=1), self.start),
+                          (self.end - self.index.overlap, self.end)], listed)
+
+
+def recorded_segments(start, count, length=datetime.timedelta(minutes=10)):
+    return [{'id': str(i), 'start': (start + i * length).isoformat() + '.000Z',
+             'end': (start + (i + 1) * length).isoformat() + '.000Z'} for i in range(count)]
+
+
+class FakeSegments(object):
+    """Answers like the API: the segments overlapping the requested range"""
+
+    def __init__(self, segments):
+        self.segments = segments
+
+    def __call__(self, token, stream_id, start, end, limit, offset, session=None):
+        start = util.parse_date(start)
+        end = util.parse_date(end)
+        overlapping = [segment for segment in self.segments
+                       if util.parse_date(segment['end']) > start and util.parse_date(segment['start']) < end]
+        return overlapping[offset:offset + limit]
+
+
+class SegmentSelectionTests(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        day = datetime.datetime(2021, 1, 1)
+        self.segments = recorded_segments(day + datetime.timedelta(minutes=5), 6 * 24)
+        self.start = day + datetime.timedelta(hours=1)
+        self.end = day + datetime.timedelta(hours=2)
+
+    def test_index_selects_the_same_segments_as_a_listing(self):
+        # Arrange
+        index = SegmentIndex(os.path.join(self.folder.name, 'index.sqlite'))
+        self.addCleanup(index.close)
+
+        # Act
+        with mock.patch.object(audio.api_rfcx, 'stream_segments', FakeSegments(self.segments)):
+            listed = list(getattr(audio, '__get_all_segments')('token', 's1', self.start, self.end))
+            synced = audio.sync_segments('token', 's1', self.start, self.end, index)
+            indexed = audio.sync_segments('token', 's1', self.start + datetime.timedelta(minutes=30), self.end,
+                                          index)
+
+        # Assert
+        self.assertEqual('2021-01-01T00:55:00.000Z', listed[0]['start'])
+        self.assertEqual(listed, synced)
+        self.assertEqual('2021-01-01T01:25:00.000Z', indexed[0]['start'])
+
+    def test_download_closes_the_index_when_a_download_fails(self):
+        # Arrange
+        closed = []
+
+        class SpyIndex(SegmentIndex):
+            def close(self):
+                closed.append(True)
+                super().close()
+
+        def failing_download(*args, **kwargs):
+            raise OSError('No space left on device')
+
+        # Act
+        with mock.patch.object(audio, 'SegmentIndex', SpyIndex), \
+                mock.patch.object(audio.api_rfcx, 'stream_segments', FakeSegments(self.segments)), \
+                mock.patch.object(audio, '__download_segment', failing_download):
+            with self.assertRaises(OSError):
+                audio.download_streams_segments('token', self.folder.name, [{'id': 's1', 'name': 'Stream'}],
+                                                self.start, self.end, parallel=False,
+                                                index_path=os.path.join(self.folder.name, 'index.sqlite'))
+
+        # Assert
+        self.assertEqual([True], closed)
+
+
+class PagingTests(TestCase):
+    def test_failed_page_ends_iteration(self):
+        # Arrange
+        pages = {0: [1, 2], 2: None}
+
+        # Act
+        items = list(paging.iterate(lambda limit, offset: pages[offset], page_size=2))
+
+        # Assert
+        self.assertEqual([1, 2], items)
+
+    def test_strict_raises_on_failed_page(self):
+        # Arrange
+        pages = {0: [1, 2], 2: None}
+
+        # Act / Assert
+        with self.assertRaises(Exception):
+            list(paging.iterate(lambda limit, offset: pages[offset], page_size=2, strict=True))
@@ -7,6 +7,10 @@ class ClassifierBase(ABC):
     def score(self, filename):
         pass
 
+    def score_batch(self, filenames):
+        # Classifiers able to score several files at once override this
+        return [self.score(filename) for filename in filenames]
+
     @property
     @abstractmethod
     def score_output(self):
@@ -1,3 +1,23 @@
-from .ClassifierTF2 import ClassifierTF2
+import importlib
 
 name = 'rfcxtf'
+
+# TensorFlow and NumPy take seconds to import, only load them when a class is used.
+# The modules are private so that importing one never binds a module in place of its class.
+_LAZY = {
+    'ClassifierTF2': '._classifier_tf2',
+    'ScoringEngine': '._scoring_engine',
+    'ScoringPool': '._scoring_pool',
+}
+
+
+def __getattr__(attr):
+    if attr in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[attr], __name__), attr)
+        globals()[attr] = value
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {attr!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
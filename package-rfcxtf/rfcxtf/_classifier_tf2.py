@@ -0,0 +1,178 @@
+import logging
+logging.getLogger("tensorflow").setLevel(logging.WARNING)
+
+import numpy as np
+import tensorflow as tf
+from .utils.io import read_wav, WavReader
+from .utils.exceptions import UnexpectedAudioFormat
+from .utils.postprocessor import map_to_classes
+from .ClassifierBase import ClassifierBase, DETECTIONS
+
+## Throw an exception if TF is less than 2
+if tf.__version__ < "2.0.0":
+    raise Exception("Incompatible TensorFlow version (need 2.0 or greater)")
+
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_CHUNK_WINDOWS = 1024
+
+class ClassifierTF2(ClassifierBase):
+
+    def __init__(self, saved_model_path, step_seconds=None):
+        self._module = tf.saved_model.load(saved_model_path)
+
+        # Gets model expectations, usually once to know if you need to resample.
+        metadata_fn = self._module.signatures["metadata"]
+        metadata = metadata_fn()
+
+        self._sample_rate = int(metadata["input_sample_rate"])
+        self._context_width_samples = int(metadata["context_width_samples"])
+        self._class_names = [name.numpy().decode("utf-8") for name in metadata["class_names"]]
+        if step_seconds is None:
+            self._step_samples = int(self._context_width_samples)
+        else:
+            self._step_samples = int(float(self._sample_rate) * step_seconds)
+        self._codec = 'pcm_s24le'
+
+        # Keeps references to input/output Tensors of scoring signature.
+        self._score_fn = self._module.signatures["score"]
+
+    @property
+    def score_output(self):
+        return DETECTIONS
+
+    @property
+    def class_names(self):
+        return self._class_names
+
+    @property
+    def sample_rate(self):
+        return self._sample_rate
+
+    @property
+    def window_duration(self):
+        return float(self._context_width_samples) / self._sample_rate
+    
+    @property
+    def window_step(self):
+        return float(self._step_samples) / self._sample_rate
+
+    @property
+    def codec(self):
+        return self._codec
+
+    def score(self, filename, as_matrix=False):
+        # Reads WAV file.
+        data, sample_rate = self._read(filename)
+
+        # Prepares feed for waveform input Tensor.
+        batch_size = 1
+        num_channels = 1
+        waveform_values = np.array(data, dtype=np.float32).reshape(
+            (batch_size, len(data), num_channels))
+
+        score_values = self._score_waveforms(waveform_values)
+        return map_to_classes(score_values, self._class_names, as_matrix)
+
+    def score_stream(self, filename, chunk_windows=DEFAULT_CHUNK_WINDOWS, as_matrix=False):
+        """Score a long WAV file chunk by chunk, reading it sequentially so that memory stays bounded
+
+        Each chunk holds the samples of `chunk_windows` consecutive windows
+        (consecutive chunks overlap by context width - step samples), the last
+        chunk runs to the end of the file, so it never holds a partial window
+        alone. Every window sees the same samples
+        as when the whole file is scored, so the chunk scores put end to end
+        are the scores of `score`.
+
+        Returns:
+            Generator of (index of the first window of the chunk, scores of the chunk as returned by `score`).
+        """
+        chunk_samples = (chunk_windows - 1) * self._step_samples + self._context_width_samples
+        advance = chunk_windows * self._step_samples
+        with WavReader(filename) as reader:
+            if reader.sample_rate != self._sample_rate:
+                raise UnexpectedAudioFormat()
+
+            data = reader.read(chunk_samples)
+            first_window = 0
+            while len(data) > 0:
+                # The chunk is the last one when the rest of the file does not hold another full window
+                if reader.remaining < advance + self._context_width_samples - len(data):
+                    data = np.concatenate([data, reader.read(reader.remaining)])
+
+                waveform_values = data.reshape((1, len(data), 1))
+                score_values = self._score_waveforms(waveform_values)
+                yield first_window, map_to_classes(score_values, self._class_names, as_matrix)
+                if reader.remaining == 0:
+                    return
+
+                # The next chunk starts `chunk_windows` steps later, keep the samples it shares with this one
+                kept = data[advance:]
+                reader.read(advance - len(data) + len(kept))  # skipped when the step is longer than the context
+                data = np.concatenate([kept, reader.read(chunk_samples - len(kept))])
+                first_window += chunk_windows
+
+    def score_batch(self, filenames, batch_size=DEFAULT_BATCH_SIZE, pad=False, as_matrix=False):
+        """Score several WAV files, running them through the model in batches
+
+        Files are read `batch_size` at a time, see `score_arrays`.
+
+        Returns:
+            List of scores (as returned by `score`) in the order of `filenames`.
+        """
+        results = []
+        for start in range(0, len(filenames), batch_size):
+            arrays = [self._read(filename)[0] for filename in filenames[start:start + batch_size]]
+            results.extend(self.score_arrays(arrays, batch_size, pad, as_matrix))
+        return results
+
+    def score_arrays(self, arrays, batch_size=DEFAULT_BATCH_SIZE, pad=False, as_matrix=False):
+        """Score several waveforms (1-dim arrays at `sample_rate`), running them through the model in batches
+
+        Waveforms of the same length are scored together, up to `batch_size`
+        per call of the model, which gives the same scores as one call per
+        waveform. With `pad` waveforms of different lengths are also batched
+        together (shortest first), zero padded to the longest of their batch;
+        their scores then only cover the windows that fit entirely in the
+        waveform. With `as_matrix` each result is a `(windows, classes)`
+        array and a dict of class name to column, see `map_to_classes`.
+
+        Returns:
+            List of scores (as returned by `score`) in the order of `arrays`.
+        """
+        groups = {}
+        for index, array in enumerate(arrays):
+            groups.setdefault(None if pad else len(array), []).append(index)
+
+        results = [None] * len(arrays)
+        for indexes in groups.values():
+            indexes.sort(key=lambda index: len(arrays[index]))
+            for start in range(0, len(indexes), batch_size):
+                batch = indexes[start:start + batch_size]
+                length = max(len(arrays[index]) for index in batch)
+                waveform_values = np.zeros((len(batch), length, 1), dtype=np.float32)
+                for row, index in enumerate(batch):
+                    waveform_values[row, :len(arrays[index]), 0] = arrays[index]
+
+                score_values = self._score_waveforms(waveform_values)
+                for row, index in enumerate(batch):
+                    windows = self._num_windows(len(arrays[index])) if pad else score_values.shape[1]
+                    results[index] = map_to_classes(score_values[row:row + 1, :windows], self._class_names, as_matrix)
+        return results
+
+    def _read(self, filename):
+        data, sample_rate = read_wav(filename)
+        if sample_rate != self._sample_rate:
+            raise UnexpectedAudioFormat()
+        return data, sample_rate
+
+    def _num_windows(self, num_samples):
+        if num_samples < self._context_width_samples:
+            return 0
+        return (num_samples - self._context_width_samples) // self._step_samples + 1
+
+    def _score_waveforms(self, waveform_values):
+        # Calls TensorFlow scoring on a (batch, samples, channels) array.
+        return next(iter(self._score_fn(
+            waveform=tf.constant(waveform_values),
+            context_step_samples=tf.constant(self._step_samples, tf.int64),
+        ).values())).numpy()
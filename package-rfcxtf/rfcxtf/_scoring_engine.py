@@ -0,0 +1,261 @@
+import collections
+import concurrent.futures
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from .utils.io import read_wav
+from .utils.exceptions import UnexpectedAudioFormat
+
+DEFAULT_BATCH_SIZE = 16
+
+ScoringStats = collections.namedtuple('ScoringStats', [
+    'files', 'failed', 'elapsed', 'files_per_second', 'decode_seconds', 'score_seconds', 'write_seconds',
+    'scorer_wait_seconds', 'decoder_wait_seconds', 'decode_files_per_second', 'score_files_per_second',
+    'write_files_per_second'])
+
+_DONE = object()
+
+
+def _decode(filename, sample_rate):
+    # Runs in a worker process: only the decoded samples travel back
+    start = time.monotonic()
+    data, file_sample_rate = read_wav(filename)
+    if file_sample_rate != sample_rate:
+        raise UnexpectedAudioFormat()
+    return data, time.monotonic() - start
+
+
+class ScoringEngine(object):
+    """Score many audio files with a pipeline keeping the decoders and the model busy at the same time
+
+    Files are read and decoded by a pool of `decode_workers` processes into a
+    queue of at most `queue_size` waveforms. `scorers` threads take up to
+    `batch_size` waveforms at a time from it and score them together (see
+    `ClassifierTF2.score_arrays`), and a writer thread hands the results to
+    the caller's `write` function.
+
+    The stats report the busy time and throughput of each stage. A stage
+    whose throughput is close to the overall throughput is the bottleneck:
+    when scorers mostly wait for waveforms the engine is I/O-bound, when
+    decoders mostly wait for room in the queue it is compute-bound.
+
+    Args:
+        classifier: `ClassifierTF2` (any classifier with `score_arrays` and `sample_rate`).
+        decode_workers: (optional, default=number of CPUs) Number of processes decoding audio.
+        scorers: (optional, default=1) Number of threads calling the model, TensorFlow runs them concurrently.
+        batch_size: (optional, default=16) Maximum number of waveforms scored per call of the model.
+        queue_size: (optional, default=4 batches) Maximum number of decoded waveforms waiting to be scored.
+        pad: (optional, default=False) Batch waveforms of different lengths together, see `ClassifierTF2.score_arrays`.
+        as_matrix: (optional, default=False) Write the scores as a matrix, see `ClassifierTF2.score_arrays`.
+    """
+
+    def __init__(self, classifier, decode_workers=None, scorers=1, batch_size=DEFAULT_BATCH_SIZE, queue_size=None,
+                 pad=False, as_matrix=False):
+        self.classifier = classifier
+        self.decode_workers = decode_workers or os.cpu_count() or 1
+        self.scorers = scorers
+        self.batch_size = batch_size
+        self.queue_size = queue_size or 4 * batch_size
+        self.pad = pad
+        self.as_matrix = as_matrix
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._started = None
+        self._finished = None
+        self._decoded = 0
+        self._scored = 0
+        self._written = 0
+        self._failed = 0
+        self._decode_seconds = 0.0
+        self._score_seconds = 0.0
+        self._write_seconds = 0.0
+        self._scorer_wait_seconds = 0.0
+        self._decoder_wait_seconds = 0.0
+
+    def _add(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self, '_' + name, getattr(self, '_' + name) + amount)
+
+    def stats(self):
+        """Progress and per-stage throughput of the current (or last) run, safe to call from another thread
+
+        Stage throughputs are files per second of busy time, per worker of the stage times its number of workers.
+        """
+        with self._lock:
+            if self._started is None:
+                elapsed = 0.0
+            else:
+                elapsed = (self._finished or time.monotonic()) - self._started
+
+            def rate(count, seconds, workers):
+                return count * workers / seconds if seconds > 0 else 0.0
+
+            return ScoringStats(self._written, self._failed, elapsed,
+                                self._written / elapsed if elapsed > 0 else 0.0,
+                                self._decode_seconds, self._score_seconds, self._write_seconds,
+                                self._scorer_wait_seconds, self._decoder_wait_seconds,
+                                rate(self._decoded, self._decode_seconds, self.decode_workers),
+                                rate(self._scored, self._score_seconds, self.scorers),
+                                rate(self._written, self._write_seconds, 1))
+
+    def run(self, filenames, write, on_error=None):
+        """Score the files, blocking until all results are written
+
+        Args:
+            filenames: Iterable of WAV files (read lazily, as decoders get ahead of the model).
+            write: Function called with `(filename, scores)` for each file, from the writer thread, in completion order.
+            on_error: (optional, default=None) Function called with `(filename, exception)` for each file that failed.
+                If None then failures are printed.
+
+        Returns:
+            `ScoringStats` of the run.
+
+        Raises:
+            Exception: raised by `filenames` while it is iterated, or by the decoders when they cannot take more files
+                (e.g. `BrokenProcessPool`), once the files submitted before are written.
+        """
+        self._reset()
+        self._feed_error = None
+        self._pool_error = None
+        self._started = time.monotonic()
+        waveforms = queue.Queue(self.queue_size)
+        results = queue.Queue(self.queue_size)
+        if on_error is None:
+            on_error = self._print_error
+
+        # Spawned processes do not inherit the state of TensorFlow, they only import the audio reader
+        executor = concurrent.futures.ProcessPoolExecutor(self.decode_workers,
+                                                          mp_context=multiprocessing.get_context('spawn'))
+        threads = [threading.Thread(target=self._feed, args=(executor, filenames, waveforms), daemon=True)]
+        threads += [threading.Thread(target=self._score, args=(waveforms, results), daemon=True)
+                    for _ in range(self.scorers)]
+        writer = threading.Thread(target=self._write, args=(results, write, on_error), daemon=True)
+        try:
+            for thread in threads + [writer]:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            results.put(_DONE)
+            writer.join()
+            if self._feed_error is not None:
+                raise self._feed_error
+            if self._pool_error is not None:
+                raise self._pool_error
+        finally:
+            executor.shutdown(cancel_futures=True)
+            self._finished = time.monotonic()
+        return self.stats()
+
+    def _feed(self, executor, filenames, waveforms):
+        # Keeps every decoder busy plus one file queued each, hands the waveforms over in order
+        pending = collections.deque()
+        sample_rate = self.classifier.sample_rate
+
+        def put(item):
+            start = time.monotonic()
+            waveforms.put(item)
+            self._add(decoder_wait_seconds=time.monotonic() - start)
+
+        def hand_over_oldest():
+            filename, future = pending.popleft()
+            try:
+                data, seconds = future.result()
+            except Exception as e:
+                put((filename, e))
+            else:
+                self._add(decoded=1, decode_seconds=seconds)
+                put((filename, data))
+
+        filenames = iter(filenames)
+        try:
+            while True:
+                try:
+                    filename = next(filenames)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    # Raised by `run` once the threads are done, the files submitted so far are still scored
+                    self._feed_error = e
+                    break
+                try:
+                    future = executor.submit(_decode, filename, sample_rate)
+                except Exception as e:
+                    # The file fails like the ones the pool breaks on, `run` raises the error once they are written
+                    self._pool_error = e
+                    future = concurrent.futures.Future()
+                    future.set_exception(e)
+                    pending.append((filename, future))
+                    break
+                pending.append((filename, future))
+                if len(pending) >= 2 * self.decode_workers:
+                    hand_over_oldest()
+            while pending:
+                hand_over_oldest()
+        finally:
+            for _ in range(self.scorers):
+                waveforms.put(_DONE)
+
+    def _score(self, waveforms, results):
+        while True:
+            start = time.monotonic()
+            item = waveforms.get()
+            self._add(scorer_wait_seconds=time.monotonic() - start)
+            if item is _DONE:
+                return
+
+            # Score what is ready, up to a full batch, rather than wait for a full batch
+            batch = [item]
+            done = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = waveforms.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    done = True
+                    break
+                batch.append(item)
+
+            failed = [(filename, data) for filename, data in batch if isinstance(data, Exception)]
+            batch = [(filename, data) for filename, data in batch if not isinstance(data, Exception)]
+            for item in failed:
+                results.put(item)
+            if batch:
+                start = time.monotonic()
+                try:
+                    scores = self.classifier.score_arrays([data for _, data in batch], self.batch_size, self.pad,
+                                                          self.as_matrix)
+                except Exception as e:
+                    scores = [e] * len(batch)
+                self._add(scored=len(batch), score_seconds=time.monotonic() - start)
+                for (filename, _), file_scores in zip(batch, scores):
+                    results.put((filename, file_scores))
+            if done:
+                return
+
+    def _write(self, results, write, on_error):
+        while True:
+            item = results.get()
+            if item is _DONE:
+                return
+            filename, scores = item
+            start = time.monotonic()
+            try:
+                if isinstance(scores, Exception):
+                    raise scores
+                write(filename, scores)
+            except Exception as e:
+                self._add(failed=1)
+                on_error(filename, e)
+            else:
+                self._add(written=1)
+            self._add(write_seconds=time.monotonic() - start)
+
+    @staticmethod
+    def _print_error(filename, e):
+        print(f'Failed to score {filename}: {e!r}')
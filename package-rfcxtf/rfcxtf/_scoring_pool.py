@@ -0,0 +1,233 @@
+import itertools
+import multiprocessing
+import os
+import queue
+
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_CORES_PER_WORKER = 4
+# Chunks queued per worker, enough to keep it busy while results travel back
+PREFETCH_CHUNKS = 4
+STEAL_INTERVAL = 0.1
+RESULT_TIMEOUT = 1.0
+
+_STOP = None
+_READY = 'ready'
+_SCORED = 'scored'
+
+
+def _available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _core_subsets(cores, workers):
+    # Contiguous subsets so that the cores of a worker share caches
+    if workers >= len(cores):
+        return [[cores[i % len(cores)]] for i in range(workers)]
+    size, extra = divmod(len(cores), workers)
+    subsets = []
+    start = 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        subsets.append(cores[start:end])
+        start = end
+    return subsets
+
+
+def _next_chunk(own, others):
+    # Own queue first, otherwise steal from the others, otherwise wait a little for new work
+    while True:
+        try:
+            return own.get_nowait()
+        except queue.Empty:
+            pass
+        for other in others:
+            try:
+                chunk = other.get_nowait()
+            except queue.Empty:
+                continue
+            if chunk is _STOP:
+                # Only the owner stops on its marker, give it back
+                other.put(_STOP)
+                continue
+            return chunk
+        try:
+            return own.get(timeout=STEAL_INTERVAL)
+        except queue.Empty:
+            pass
+
+
+def _score_chunk(classifier, chunk, batch_size, as_matrix):
+    try:
+        return list(zip(chunk, classifier.score_batch(chunk, batch_size, as_matrix=as_matrix)))
+    except Exception:
+        pass
+    # Score the files one by one to find the ones that fail
+    results = []
+    for filename in chunk:
+        try:
+            results.append((filename, classifier.score(filename, as_matrix)))
+        except Exception as e:
+            results.append((filename, e))
+    return results
+
+
+def _worker(index, saved_model_path, step_seconds, cores, intra_op_threads, inter_op_threads, batch_size,
+            as_matrix, tasks, results):
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    try:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads or len(cores))
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+        from ._classifier_tf2 import ClassifierTF2
+        classifier = ClassifierTF2(saved_model_path, step_seconds)
+    except Exception as e:
+        results.put((_READY, index, e))
+        return
+    results.put((_READY, index, None))
+
+    own = tasks[index]
+    others = tasks[index + 1:] + tasks[:index]
+    while True:
+        task = _next_chunk(own, others)
+        if task is _STOP:
+            return
+        call, chunk = task
+        results.put((_SCORED, call, _score_chunk(classifier, chunk, batch_size, as_matrix)))
+
+
+class ScoringPool(object):
+    """Score files with replicas of a model in worker processes, each pinned to its own cores
+
+    Every worker loads the model from `saved_model_path` (the files are only
+    read, the operating system shares them between replicas) and sets its own
+    TensorFlow intra and inter op thread counts. Files are sent in chunks of
+    `batch_size` to the workers' queues in turn, and a worker whose queue is
+    empty steals chunks from the others, so slow files do not leave cores idle.
+
+    Use it as a context manager (or call `close`) to stop the workers.
+
+    Args:
+        saved_model_path: Path of the SavedModel folder.
+        workers: (optional, default=one per 4 cores) Number of model replicas.
+        step_seconds: (optional, default=None) Window step, see `ClassifierTF2`.
+        batch_size: (optional, default=16) Number of files per chunk, scored in one call of the model when possible.
+        intra_op_threads: (optional, default=number of cores of the worker) TensorFlow threads per operation.
+        inter_op_threads: (optional, default=1) TensorFlow operations run concurrently by each worker.
+        as_matrix: (optional, default=False) Return the scores as a matrix, see `ClassifierTF2.score_arrays`.
+        cores: (optional, default=all the cores available to the process) Cores to split between the workers.
+
+    Raises:
+        Exception: if a worker cannot load the model.
+    """
+
+    def __init__(self, saved_model_path, workers=None, step_seconds=None, batch_size=DEFAULT_BATCH_SIZE,
+                 intra_op_threads=None, inter_op_threads=1, as_matrix=False, cores=None):
+        cores = sorted(cores) if cores is not None else _available_cores()
+        self.workers = workers or max(1, len(cores) // DEFAULT_CORES_PER_WORKER)
+        self.batch_size = batch_size
+        self.cores = _core_subsets(cores, self.workers)
+        self._calls = itertools.count()
+
+        # Spawned workers start clean, TensorFlow state cannot be forked
+        context = multiprocessing.get_context('spawn')
+        self._tasks = [context.Queue() for _ in range(self.workers)]
+        self._results = context.Queue()
+        self._processes = [context.Process(target=_worker, daemon=True,
+                                           args=(index, saved_model_path, step_seconds, self.cores[index],
+                                                 intra_op_threads, inter_op_threads, batch_size, as_matrix,
+                                                 self._tasks, self._results))
+                           for index in range(self.workers)]
+        for process in self._processes:
+            process.start()
+
+        for _ in range(self.workers):
+            _, index, error = self._receive()
+            if error is not None:
+                self.close()
+                raise Exception(f'Scoring worker {index} failed to load the model') from error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Stop the workers"""
+        for tasks in self._tasks:
+            tasks.put(_STOP)
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+    def _receive(self):
+        while True:
+            try:
+                return self._results.get(timeout=RESULT_TIMEOUT)
+            except queue.Empty:
+                if not all(process.is_alive() for process in self._processes):
+                    raise Exception('A scoring worker stopped unexpectedly')
+
+    def score(self, filenames, on_error=None):
+        """Score WAV files, yielding the results as workers complete them
+
+        Args:
+            filenames: Iterable of WAV files (read lazily, a few chunks ahead of the workers).
+            on_error: (optional, default=None) Function called with `(filename, exception)` for each file that failed.
+                If None then failures are printed.
+
+        Consume one call at a time. Leaving a generator before its end (e.g.
+        breaking out of the loop) drops the results it has not yielded yet.
+
+        Returns:
+            Generator of (filename, scores) in completion order, scores as returned by `ClassifierTF2.score`.
+        """
+        # Chunks carry the id of their call, results left over by an earlier call that was not consumed are dropped
+        call = next(self._calls)
+        filenames = iter(filenames)
+        chunks = iter(lambda: list(itertools.islice(filenames, self.batch_size)), [])
+        in_flight = 0
+        try:
+            for number, chunk in enumerate(chunks):
+                if in_flight >= PREFETCH_CHUNKS * self.workers:
+                    yield from self._scored(call, on_error)
+                    in_flight -= 1
+                self._tasks[number % self.workers].put((call, chunk))
+                in_flight += 1
+            while in_flight > 0:
+                yield from self._scored(call, on_error)
+                in_flight -= 1
+        finally:
+            if in_flight > 0:
+                self._cancel_queued()
+
+    def _cancel_queued(self):
+        # Take back the chunks of an abandoned call that no worker started, the others finish and are dropped
+        for tasks in self._tasks:
+            while True:
+                try:
+                    task = tasks.get_nowait()
+                except queue.Empty:
+                    break
+                if task is _STOP:
+                    # The pool was closed first, the worker must still stop
+                    tasks.put(_STOP)
+                    break
+
+    def _scored(self, call, on_error):
+        while True:
+            _, result_call, results = self._receive()
+            if result_call == call:
+                break
+        for filename, scores in results:
+            if isinstance(scores, Exception):
+                if on_error is None:
+                    print(f'Failed to score {filename}: {scores!r}')
+                else:
+                    on_error(filename, scores)
+            else:
+                yield filename, scores
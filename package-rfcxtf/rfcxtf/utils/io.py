@@ -1,9 +1,38 @@
 import numpy as np
-import pysndfile
 from .exceptions import UnexpectedAudioFormat
 
 def read_wav(filename):
+    import pysndfile  # loaded on first use
     data, sample_rate, _ = pysndfile.sndio.read(filename, dtype=np.float32)
     if data.ndim != 1:
         raise UnexpectedAudioFormat()
-    return data, sample_rate
\ No newline at end of file
+    return data, sample_rate
+
+class WavReader(object):
+    """Sequential reader of a mono WAV file, for files too long to load at once"""
+
+    def __init__(self, filename):
+        import pysndfile
+        self._file = pysndfile.PySndfile(filename, 'r')
+        if self._file.channels() != 1:
+            self._file.close()
+            raise UnexpectedAudioFormat()
+        self.sample_rate = self._file.samplerate()
+        self.remaining = self._file.frames()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def read(self, frames):
+        """Next `frames` samples as a float32 array, fewer at the end of the file"""
+        frames = min(frames, self.remaining)
+        self.remaining -= frames
+        if frames == 0:
+            return np.zeros(0, np.float32)
+        return self._file.read_frames(frames, dtype=np.float32)
@@ -1,9 +1,20 @@
 import numpy as np
 
-def map_to_classes(score_values, class_names):
-    results = {}
-    for i, class_name in enumerate(class_names):
-        results[class_name] = np.zeros(len(score_values[0]), np.float)
-        for k, tuple in enumerate(score_values[0]):
-            results[class_name][k] = tuple[i]
-    return results
+def map_to_classes(score_values, class_names, as_matrix=False):
+    """Split the scores of the first waveform of a `(batch, windows, classes)` model output per class
+
+    Args:
+        score_values: Model output.
+        class_names: Names of the classes, in the order of the output.
+        as_matrix: (optional, default=False) Return the `(windows, classes)` scores as is instead of a dict.
+
+    Returns:
+        Dict of class name to scores (1-dim float64 array, one value per window).
+        With `as_matrix`, the `(windows, classes)` scores and a dict of class name to column index.
+    """
+    if as_matrix:
+        return np.asarray(score_values[0]), {class_name: i for i, class_name in enumerate(class_names)}
+
+    # One copy of all the scores, transposed so that each class is a contiguous row
+    by_class = np.array(score_values[0], dtype=np.float64).T.copy()
+    return {class_name: by_class[i] for i, class_name in enumerate(class_names)}
@@ -2,7 +2,6 @@ import os
 import numpy as np
 import tarfile
 import tempfile
-import tensorflow as tf
 from typing import Optional
 from .utils.io import read_wav
 
@@ -25,7 +24,8 @@ def validate(saved_model_package_path: str, audio_file_path: str) -> Optional[st
     if not os.path.exists(saved_model_path):
         return 'Extracted package must contain a folder named model'
     
-    # Must be a saved model
+    # Must be a saved model (TensorFlow is slow to import, load it only once the package looks valid)
+    import tensorflow as tf
     try:
         model = tf.saved_model.load(saved_model_path)
     except:
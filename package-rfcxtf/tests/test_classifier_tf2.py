@@ -0,0 +1,257 @@
+from unittest import TestCase
+from unittest import mock
+
+import importlib
+import importlib.util
+import sys
+import types
+
+import numpy as np
+
+from rfcxtf.utils.postprocessor import map_to_classes
+
+
+class StubTensor(object):
+    def __init__(self, values):
+        self.values = values
+
+    def numpy(self):
+        return self.values
+
+
+def stub_tensorflow():
+    """The few attributes of TensorFlow used around the model, which the tests replace"""
+    tensorflow = types.ModuleType('tensorflow')
+    tensorflow.__version__ = '2.0.0'
+    tensorflow.int64 = np.int64
+    tensorflow.constant = lambda value, dtype=None: StubTensor(np.asarray(value, dtype))
+    return tensorflow
+
+
+def import_classifier_module():
+    if importlib.util.find_spec('tensorflow') is not None:
+        return importlib.import_module('rfcxtf._classifier_tf2')
+    # Without TensorFlow, import the module against a stub and leave no trace of either in sys.modules
+    with mock.patch.dict(sys.modules, {'tensorflow': stub_tensorflow()}):
+        return importlib.import_module('rfcxtf._classifier_tf2')
+
+
+classifier_tf2 = import_classifier_module()
+
+SAMPLE_RATE = 100
+CLASS_NAMES = ['mean', 'peak']
+
+
+class StubModel(object):
+    """Scores each window from its own samples only, like a real model, and records the input shapes"""
+
+    def __init__(self, context_width_samples):
+        self.context_width_samples = context_width_samples
+        self.calls = []
+
+    def __call__(self, waveform, context_step_samples):
+        waveform = np.asarray(waveform.numpy())[:, :, 0]
+        step = int(np.asarray(context_step_samples.numpy()))
+        self.calls.append(waveform.shape)
+        windows = max(0, (waveform.shape[1] - self.context_width_samples) // step + 1)
+        scores = np.zeros((waveform.shape[0], windows, len(CLASS_NAMES)), np.float32)
+        for k in range(windows):
+            window = waveform[:, k * step:k * step + self.context_width_samples]
+            scores[:, k, 0] = window.mean(axis=1)
+            scores[:, k, 1] = window.max(axis=1)
+        return {'scores': StubTensor(scores)}
+
+
+class StubWavReader(object):
+    files = {}
+
+    def __init__(self, filename):
+        self.data = self.files[filename]
+        self.sample_rate = SAMPLE_RATE
+        self.remaining = len(self.data)
+        self.reads = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def read(self, frames):
+        frames = min(frames, self.remaining)
+        start = len(self.data) - self.remaining
+        self.remaining -= frames
+        self.reads.append(frames)
+        return self.data[start:start + frames]
+
+
+def stub_read_wav(filename):
+    return StubWavReader.files[filename], SAMPLE_RATE
+
+
+def stub_classifier(context_width_samples, step_samples):
+    classifier = classifier_tf2.ClassifierTF2.__new__(classifier_tf2.ClassifierTF2)
+    classifier._score_fn = StubModel(context_width_samples)
+    classifier._sample_rate = SAMPLE_RATE
+    classifier._context_width_samples = context_width_samples
+    classifier._step_samples = step_samples
+    classifier._class_names = CLASS_NAMES
+    classifier._codec = 'pcm_s24le'
+    return classifier
+
+
+def waveform(length, seed=0):
+    return np.random.default_rng(seed).random(length).astype(np.float32)
+
+
+class ScoreStreamTests(TestCase):
+    def setUp(self):
+        patchers = [mock.patch.object(classifier_tf2, 'WavReader', StubWavReader),
+                    mock.patch.object(classifier_tf2, 'read_wav', stub_read_wav)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def assert_stream_matches_whole_file(self, context_width_samples, step_samples, length, chunk_windows):
+        # Arrange
+        StubWavReader.files['audio.wav'] = waveform(length)
+        classifier = stub_classifier(context_width_samples, step_samples)
+
+        # Act
+        whole = classifier.score('audio.wav')
+        chunks = list(classifier.score_stream('audio.wav', chunk_windows))
+
+        # Assert
+        self.assertEqual(list(range(0, chunk_windows * len(chunks), chunk_windows)), [first for first, _ in chunks])
+        for class_name in CLASS_NAMES:
+            streamed = np.concatenate([np.zeros(0)] + [scores[class_name] for _, scores in chunks])
+            np.testing.assert_array_equal(whole[class_name], streamed)
+
+    def test_matches_whole_file_when_step_is_shorter_than_context(self):
+        for length in [1000, 1001, 1037, 199, 250]:
+            for chunk_windows in [1, 3, 7, 100]:
+                with self.subTest(length=length, chunk_windows=chunk_windows):
+                    self.assert_stream_matches_whole_file(50, 20, length, chunk_windows)
+
+    def test_matches_whole_file_when_step_equals_context(self):
+        for length in [1000, 1001, 1049, 149, 50]:
+            for chunk_windows in [1, 3, 7, 100]:
+                with self.subTest(length=length, chunk_windows=chunk_windows):
+                    self.assert_stream_matches_whole_file(50, 50, length, chunk_windows)
+
+    def test_matches_whole_file_when_step_is_longer_than_context(self):
+        for length in [1000, 1001, 1079, 199, 51]:
+            for chunk_windows in [1, 3, 7, 100]:
+                with self.subTest(length=length, chunk_windows=chunk_windows):
+                    self.assert_stream_matches_whole_file(50, 80, length, chunk_windows)
+
+    def test_file_shorter_than_one_chunk_is_a_single_chunk(self):
+        # Arrange
+        StubWavReader.files['audio.wav'] = waveform(333)
+        classifier = stub_classifier(50, 20)
+
+        # Act
+        chunks = list(classifier.score_stream('audio.wav', chunk_windows=100))
+
+        # Assert
+        self.assertEqual(1, len(chunks))
+        self.assertEqual([(1, 333)], classifier._score_fn.calls)
+
+    def test_chunks_hold_the_samples_of_their_windows(self):
+        # Arrange
+        StubWavReader.files['audio.wav'] = waveform(1000)
+        classifier = stub_classifier(50, 20)
+
+        # Act
+        list(classifier.score_stream('audio.wav', chunk_windows=10))
+
+        # Assert
+        chunk_samples = (10 - 1) * 20 + 50
+        self.assertEqual((1, chunk_samples), classifier._score_fn.calls[0])
+        self.assertTrue(all(samples <= chunk_samples + 20 + 50 for _, samples in classifier._score_fn.calls))
+
+
+class ScoreArraysTests(TestCase):
+    def setUp(self):
+        self.lengths = [300, 500, 300, 1001, 500, 300]
+        self.arrays = [waveform(length, seed) for seed, length in enumerate(self.lengths)]
+
+    def test_groups_waveforms_of_the_same_length(self):
+        # Arrange
+        classifier = stub_classifier(50, 20)
+
+        # Act
+        classifier.score_arrays(self.arrays, batch_size=2)
+
+        # Assert
+        self.assertCountEqual([(2, 300), (1, 300), (2, 500), (1, 1001)], classifier._score_fn.calls)
+
+    def test_returns_results_in_input_order(self):
+        # Arrange
+        classifier = stub_classifier(50, 20)
+        expected = [classifier.score_arrays([array])[0] for array in self.arrays]
+
+        # Act
+        results = classifier.score_arrays(self.arrays, batch_size=4)
+
+        # Assert
+        self.assertEqual(len(expected), len(results))
+        for expected_scores, scores in zip(expected, results):
+            for class_name in CLASS_NAMES:
+                np.testing.assert_array_equal(expected_scores[class_name], scores[class_name])
+
+    def test_pad_cuts_scores_to_the_windows_of_each_waveform(self):
+        # Arrange
+        classifier = stub_classifier(50, 20)
+        expected = [classifier.score_arrays([array])[0] for array in self.arrays]
+        classifier._score_fn.calls = []
+
+        # Act
+        results = classifier.score_arrays(self.arrays, batch_size=16, pad=True)
+
+        # Assert
+        self.assertEqual([(6, 1001)], classifier._score_fn.calls)
+        for length, expected_scores, scores in zip(self.lengths, expected, results):
+            for class_name in CLASS_NAMES:
+                self.assertEqual(classifier._num_windows(length), len(scores[class_name]))
+                np.testing.assert_array_equal(expected_scores[class_name], scores[class_name])
+
+    def test_score_batch_returns_results_in_filename_order(self):
+        # Arrange
+        classifier = stub_classifier(50, 20)
+        filenames = [f'audio{index}.wav' for index in range(len(self.arrays))]
+        StubWavReader.files.update(zip(filenames, self.arrays))
+
+        # Act
+        with mock.patch.object(classifier_tf2, 'read_wav', stub_read_wav):
+            results = classifier.score_batch(filenames, batch_size=4, pad=True)
+
+        # Assert
+        for array, scores in zip(self.arrays, results):
+            self.assertEqual(classifier._num_windows(len(array)), len(scores['mean']))
+            np.testing.assert_array_almost_equal(
+                [array[k * 20:k * 20 + 50].mean() for k in range(len(scores['mean']))], scores['mean'])
+
+
+class MapToClassesTests(TestCase):
+    def setUp(self):
+        self.scores = np.arange(12, dtype=np.float32).reshape(1, 4, 3)
+
+    def test_splits_scores_per_class(self):
+        # Act
+        scores = map_to_classes(self.scores, ['a', 'b', 'c'])
+
+        # Assert
+        self.assertEqual(['a', 'b', 'c'], list(scores))
+        np.testing.assert_array_equal([1, 4, 7, 10], scores['b'])
+        self.assertEqual(np.float64, scores['b'].dtype)
+        self.assertTrue(scores['b'].flags['C_CONTIGUOUS'])
+
+    def test_as_matrix_returns_the_scores_and_the_class_columns(self):
+        # Act
+        matrix, columns = map_to_classes(self.scores, ['a', 'b', 'c'], as_matrix=True)
+
+        # Assert
+        self.assertEqual((4, 3), matrix.shape)
+        self.assertEqual({'a': 0, 'b': 1, 'c': 2}, columns)
+        np.testing.assert_array_equal(matrix[:, columns['c']], map_to_classes(self.scores, ['a', 'b', 'c'])['c'])
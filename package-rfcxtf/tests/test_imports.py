@@ -0,0 +1,37 @@
+from unittest import TestCase
+
+import importlib
+import importlib.util
+
+HAS_TENSORFLOW = importlib.util.find_spec('tensorflow') is not None
+
+
+class LazyExportTests(TestCase):
+    def assert_exports_class_after_module_import(self, name, module):
+        # Arrange
+        importlib.import_module(module)
+
+        # Act
+        exported = getattr(importlib.import_module('rfcxtf'), name)
+
+        # Assert
+        self.assertIsInstance(exported, type)
+        self.assertEqual(name, exported.__name__)
+
+    def test_scoring_engine_is_the_class_after_its_module_is_imported(self):
+        self.assert_exports_class_after_module_import('ScoringEngine', 'rfcxtf._scoring_engine')
+
+    def test_scoring_pool_is_the_class_after_its_module_is_imported(self):
+        self.assert_exports_class_after_module_import('ScoringPool', 'rfcxtf._scoring_pool')
+
+    def test_classifier_is_the_class_after_its_module_is_imported(self):
+        if not HAS_TENSORFLOW:
+            self.skipTest('tensorflow is not installed')
+        self.assert_exports_class_after_module_import('ClassifierTF2', 'rfcxtf._classifier_tf2')
+
+    def test_from_import_gives_the_class(self):
+        # Act
+        from rfcxtf import ScoringEngine
+
+        # Assert
+        self.assertIsInstance(ScoringEngine, type)
@@ -0,0 +1,83 @@
+from unittest import TestCase
+from unittest import mock
+
+import concurrent.futures
+import concurrent.futures.process
+
+from rfcxtf._scoring_engine import ScoringEngine
+
+
+class StubClassifier(object):
+    sample_rate = 100
+
+    def score_arrays(self, arrays, batch_size=16, pad=False, as_matrix=False):
+        return [{'mean': [float(array.mean())]} for array in arrays]
+
+
+def failing_listing(filenames, error):
+    yield from filenames
+    raise error
+
+
+class BreakingExecutor(concurrent.futures.ThreadPoolExecutor):
+    """Decodes in threads and breaks like a process pool after the first file"""
+
+    def __init__(self, max_workers, mp_context=None):
+        super().__init__(max_workers)
+        self.submitted = 0
+
+    def submit(self, fn, *args):
+        if self.submitted > 0:
+            raise concurrent.futures.process.BrokenProcessPool('A child process terminated abruptly')
+        self.submitted += 1
+        return super().submit(fn, *args)
+
+
+class ScoringEngineTests(TestCase):
+    def test_run_raises_the_error_of_the_filenames_iterable(self):
+        # Arrange
+        engine = ScoringEngine(StubClassifier(), decode_workers=1)
+        failed = []
+        error = ValueError('Listing failed')
+
+        # Act
+        with self.assertRaises(ValueError) as raised:
+            engine.run(failing_listing(['missing1.wav', 'missing2.wav'], error), lambda filename, scores: None,
+                       lambda filename, e: failed.append(filename))
+
+        # Assert
+        self.assertIs(error, raised.exception)
+        self.assertEqual(['missing1.wav', 'missing2.wav'], failed)
+
+    def test_run_raises_the_error_of_the_decoders_without_iterating_further(self):
+        # Arrange
+        engine = ScoringEngine(StubClassifier(), decode_workers=1)
+        failed = []
+        iterated = []
+
+        def listing():
+            for filename in ['missing1.wav', 'missing2.wav', 'missing3.wav']:
+                iterated.append(filename)
+                yield filename
+
+        # Act
+        with mock.patch('concurrent.futures.ProcessPoolExecutor', BreakingExecutor):
+            with self.assertRaises(concurrent.futures.process.BrokenProcessPool):
+                engine.run(listing(), lambda filename, scores: None, lambda filename, e: failed.append((filename, e)))
+
+        # Assert
+        self.assertEqual(['missing1.wav', 'missing2.wav'], iterated)
+        self.assertEqual(['missing1.wav', 'missing2.wav'], [filename for filename, _ in failed])
+        self.assertIsInstance(failed[1][1], concurrent.futures.process.BrokenProcessPool)
+
+    def test_run_returns_stats_when_every_file_fails(self):
+        # Arrange
+        engine = ScoringEngine(StubClassifier(), decode_workers=1)
+        failed = []
+
+        # Act
+        stats = engine.run(['missing.wav'], lambda filename, scores: None, lambda filename, e: failed.append(e))
+
+        # Assert
+        self.assertEqual(1, stats.failed)
+        self.assertEqual(1, len(failed))
@@ -1,4 +1,3 @@
-import pandas as pd
 import urllib.request
 import shutil
 import os    
@@ -7,7 +6,6 @@ import rfcx
 import math
 import json
 from operator import itemgetter
-from pydub import AudioSegment
 
 def csv_download(destination_path, csv_file_name, audio_extension='opus'):
     """ Read csv file for downloading audio from RFCx in user format supported: wav, opus, png, etc.
@@ -30,6 +28,7 @@ def csv_download(destination_path, csv_file_name, audio_extension='opus'):
     if audio_extension not in ['opus', 'wav', 'json', 'png']:
         raise Exception('Audio extension should be opus, wav, json, or png. Not accept: {}'.format(audio_extension))
 
+    import pandas as pd  # slow to import, loaded on first use
     csv_input = pd.read_csv(csv_file_name, header=None).values
     for i in csv_input:
         raw_name = ''.join(i)                         
@@ -80,6 +79,7 @@ def praat_slice_audio(praat_file_name, output_path, input_path_prefix=None, slic
     __slice_audio(audio_info_list, output_path, input_path_prefix, slice_second)
 
 def __slice_audio(audio_list, output_path, input_path_prefix, slice_second):
+    from pydub import AudioSegment  # slow to import, loaded on first use
     count = 0
 
     full_info = __get_audio_info(audio_list, input_path_prefix)
@@ -143,6 +143,7 @@ def save_audio_file(destination_path, audio_id, source_audio_extension='opus'):
     print('File {}.{} saved to {}'.format(audio_id, source_audio_extension, destination_path))
 
 def __get_environment_info(audio_annotated_info, input_path_prefix):
+    from pydub import AudioSegment
     audio_envirnoment_info = list()
     audio_id = audio_annotated_info[0][0]
 
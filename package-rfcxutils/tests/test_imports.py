@@ -0,0 +1,50 @@
+from unittest import TestCase
+
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+# Dependencies that take long to import, they must only load when a function needing them is called
+HEAVY_MODULES = ['pandas', 'pydub', 'numpy', 'scipy', 'soundfile', 'pysndfile', 'pyarrow', 'aiohttp', 'watchdog',
+                 'tensorflow']
+# Generous upper bound of the import time of each package, to catch regressions rather than benchmark
+MAX_IMPORT_SECONDS = 3.0
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {package}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'modules': sorted(set(name.split('.')[0] for name in sys.modules))}}))
+"""
+
+
+def import_in_subprocess(package):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT.format(package=package)], env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+class ImportTests(TestCase):
+    def assert_imports_fast(self, package):
+        if importlib.util.find_spec(package) is None:
+            self.skipTest(f'{package} is not installed')
+
+        # Act
+        result = import_in_subprocess(package)
+
+        # Assert
+        self.assertEqual([], [name for name in HEAVY_MODULES if name in result['modules']])
+        self.assertLess(result['elapsed'], MAX_IMPORT_SECONDS)
+
+    def test_rfcx_imports_without_heavy_dependencies(self):
+        self.assert_imports_fast('rfcx')
+
+    def test_rfcxutils_imports_without_heavy_dependencies(self):
+        self.assert_imports_fast('rfcxutils')
+
+    def test_rfcxtf_imports_without_heavy_dependencies(self):
+        self.assert_imports_fast('rfcxtf')